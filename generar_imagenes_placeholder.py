@@ -1,81 +1,241 @@
-from PIL import Image, ImageDraw, ImageFont
+"""
+Generador único de imágenes de marcador de posición (servicios y logo).
+
+- Las fuentes se cargan una sola vez por proceso.
+- Las imágenes se renderizan en paralelo con un pool de procesos.
+- Un manifiesto guarda el hash de las entradas de cada imagen (texto, tamaño
+  y versión de plantilla): si nada cambió, la imagen no se vuelve a generar.
+  Las imágenes que ya fueron reemplazadas por fotos reales nunca se pisan.
+
+Uso:
+    python generar_imagenes_placeholder.py            # solo lo que cambió
+    python generar_imagenes_placeholder.py --force    # regenerar todo
+"""
+import argparse
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Subir este número cuando cambie el dibujo de las plantillas
+TEMPLATE_VERSION = 2
+
+BASE_DIR = os.path.join('app', 'static', 'assets')
+MANIFEST_PATH = os.path.join(BASE_DIR, 'placeholders.manifest.json')
+
+FUENTES = ("arial.ttf", "DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+# Servicios y sus descripciones
+SERVICIOS = {
+    'itse': 'Certificado ITSE',
+    'pozo_tierra': 'Pozo de Tierra',
+    'mantenimiento': 'Mantenimiento Eléctrico',
+    'incendios': 'Sistema Contra Incendios',
+    'tableros': 'Diseño de Tableros',
+    'suministros': 'Suministros Eléctricos'
+}
+FOTOS_POR_SERVICIO = 3
+
+
+@lru_cache(maxsize=None)
+def cargar_fuente(tamano):
+    """Primera fuente TrueType disponible, o la predeterminada de PIL"""
+    for nombre in FUENTES:
+        try:
+            return ImageFont.truetype(nombre, tamano)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
 
 def crear_imagen_placeholder(texto, ancho=400, alto=300):
     # Crear una imagen con fondo gris claro
     img = Image.new('RGB', (ancho, alto), color=(240, 240, 240))
     d = ImageDraw.Draw(img)
-    
+
     # Dibujar un borde gris
     d.rectangle([0, 0, ancho-1, alto-1], outline=(200, 200, 200), width=2)
-    
+
     # Dibujar un icono de cámara en el centro
     d.ellipse([ancho//2-40, alto//2-60, ancho//2+40, alto//2+20], outline=(180, 180, 180), width=2)
     d.ellipse([ancho//2-20, alto//2-40, ancho//2+20, alto//2], fill=(200, 200, 200))
-    d.polygon([(ancho//2, alto//2-30), (ancho//2+15, alto//2-15), (ancho//2, alto//2-5), 
-                (ancho//2-15, alto//2-15)], fill=(150, 150, 150))
-    
-    # Agregar texto descriptivo
-    try:
-        # Intentar cargar una fuente, si no está disponible, usar la predeterminada
-        try:
-            fuente = ImageFont.truetype("arial.ttf", 16)
-        except IOError:
-            fuente = ImageFont.load_default()
-        
-        # Asegurarse de que el texto no sea demasiado ancho
-        if len(texto) > 30:
-            texto = texto[:27] + "..."
-            
-        # Calcular el ancho del texto
-        ancho_texto = d.textlength(texto, font=fuente)
-        
-        # Dibujar el texto centrado en la parte inferior
-        d.text(((ancho - ancho_texto) / 2, alto - 40), 
-               texto, fill=(100, 100, 100), font=fuente)
-    except Exception as e:
-        print(f"Error al agregar texto: {e}")
-    
+    d.polygon([(ancho//2, alto//2-30), (ancho//2+15, alto//2-15), (ancho//2, alto//2-5),
+               (ancho//2-15, alto//2-15)], fill=(150, 150, 150))
+
+    # Asegurarse de que el texto no sea demasiado ancho
+    if len(texto) > 30:
+        texto = texto[:27] + "..."
+
+    # Dibujar el texto centrado en la parte inferior
+    fuente = cargar_fuente(16)
+    ancho_texto = d.textlength(texto, font=fuente)
+    d.text(((ancho - ancho_texto) / 2, alto - 40), texto, fill=(100, 100, 100), font=fuente)
+
     return img
 
-def generar_imagenes_servicios():
-    # Directorio base para los activos estáticos
-    base_dir = os.path.join('app', 'static', 'assets', 'servicios')
-    
-    # Servicios y sus descripciones
-    servicios = {
-        'itse': 'Certificado ITSE',
-        'pozo_tierra': 'Pozo de Tierra',
-        'mantenimiento': 'Mantenimiento Eléctrico',
-        'incendios': 'Sistema Contra Incendios',
-        'tableros': 'Diseño de Tableros',
-        'suministros': 'Suministros Eléctricos'
-    }
-    
-    # Generar imágenes para cada servicio
-    for servicio, nombre in servicios.items():
-        # Crear directorio si no existe
-        servicio_dir = os.path.join(base_dir, servicio)
+
+def crear_logo_placeholder(ancho=300, alto=150):
+    # Fondo azul oscuro con borde blanco
+    img = Image.new('RGB', (ancho, alto), color=(0, 51, 102))
+    d = ImageDraw.Draw(img)
+    d.rectangle([0, 0, ancho-1, alto-1], outline='white', width=2)
+
+    fuente = cargar_fuente(40)
+    lineas = ["TESLA", "ELECTRICIDAD"]
+    cajas = [d.textbbox((0, 0), linea, font=fuente) for linea in lineas]
+    altos = [caja[3] - caja[1] for caja in cajas]
+    y = (alto - sum(altos) - 10) / 2
+    for linea, caja, alto_linea in zip(lineas, cajas, altos):
+        d.text(((ancho - (caja[2] - caja[0])) / 2, y - caja[1]), linea, fill=(255, 255, 255), font=fuente)
+        y += alto_linea + 10
+
+    return img
+
+
+def construir_trabajos():
+    """Lista de imágenes a producir con todas sus entradas"""
+    trabajos = [{
+        'tipo': 'logo',
+        'texto': 'TESLA ELECTRICIDAD',
+        'ancho': 300,
+        'alto': 150,
+        'ruta': os.path.join(BASE_DIR, 'logo', 'tesla-logo.png'),
+        'formato': 'PNG',
+    }]
+    for servicio, nombre in SERVICIOS.items():
+        for i in range(1, FOTOS_POR_SERVICIO + 1):
+            trabajos.append({
+                'tipo': 'servicio',
+                'texto': f"{nombre} - Ejemplo {i}",
+                'ancho': 400,
+                'alto': 300,
+                'ruta': os.path.join(BASE_DIR, 'servicios', servicio, f'foto{i}.jpg'),
+                'formato': 'JPEG',
+            })
+    return trabajos
+
+
+def hash_entradas(trabajo):
+    datos = {k: trabajo[k] for k in ('tipo', 'texto', 'ancho', 'alto', 'formato')}
+    datos['version'] = TEMPLATE_VERSION
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def hash_archivo(ruta):
+    with open(ruta, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def firma_archivo(ruta):
+    """Tamaño y mtime: evita releer archivos que no cambiaron"""
+    st = os.stat(ruta)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def renderizar(trabajo):
+    """Generar y guardar una imagen (se ejecuta en el pool de procesos)"""
+    if trabajo['tipo'] == 'logo':
+        img = crear_logo_placeholder(trabajo['ancho'], trabajo['alto'])
+    else:
+        img = crear_imagen_placeholder(trabajo['texto'], trabajo['ancho'], trabajo['alto'])
+
+    os.makedirs(os.path.dirname(trabajo['ruta']), exist_ok=True)
+    opciones = {'quality': 85} if trabajo['formato'] == 'JPEG' else {}
+    img.save(trabajo['ruta'], trabajo['formato'], **opciones)
+    return trabajo['ruta'], hash_archivo(trabajo['ruta']), firma_archivo(trabajo['ruta'])
+
+
+def cargar_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    temporal = MANIFEST_PATH + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporal, MANIFEST_PATH)
+
+
+def escribir_si_cambia(ruta, contenido):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            if f.read() == contenido:
+                return False
+    except OSError:
+        pass
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    return True
+
+
+def _es_reemplazo_real(ruta, entrada):
+    """True si el archivo ya no es el placeholder que generamos"""
+    if entrada is None:
+        # Existe pero no lo generó esta herramienta: tratarlo como real
+        return True
+    if firma_archivo(ruta) == entrada.get('firma'):
+        return False
+    return hash_archivo(ruta) != entrada['salida']
+
+
+def generar_imagenes_servicios(force=False, workers=None):
+    manifest = cargar_manifest()
+    pendientes = []
+    reales = 0
+
+    for trabajo in construir_trabajos():
+        clave = trabajo['ruta'].replace(os.sep, '/')
+        entrada = manifest.get(clave)
+        entradas = hash_entradas(trabajo)
+
+        if os.path.exists(trabajo['ruta']):
+            if _es_reemplazo_real(trabajo['ruta'], entrada):
+                reales += 1
+                continue
+            if not force and entrada['entradas'] == entradas:
+                continue
+        pendientes.append((clave, entradas, trabajo))
+
+    if pendientes:
+        # Pocos trabajos no justifican levantar un pool de procesos
+        if len(pendientes) < 4 or workers == 1:
+            resultados = map(renderizar, (t for _, _, t in pendientes))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                resultados = list(pool.map(renderizar, (t for _, _, t in pendientes)))
+        for (clave, entradas, _), (ruta, salida, firma) in zip(pendientes, resultados):
+            manifest[clave] = {'entradas': entradas, 'salida': salida, 'firma': firma}
+            print(f"Imagen generada: {ruta}")
+        guardar_manifest(manifest)
+
+    # Un LEEME por servicio, escrito solo si cambió
+    for servicio, nombre in SERVICIOS.items():
+        servicio_dir = os.path.join(BASE_DIR, 'servicios', servicio)
         os.makedirs(servicio_dir, exist_ok=True)
-        
-        # Generar 3 imágenes de ejemplo para cada servicio
-        for i in range(1, 4):
-            # Crear imagen de placeholder
-            img = crear_imagen_placeholder(f"{nombre} - Ejemplo {i}")
-            
-            # Guardar la imagen
-            ruta_imagen = os.path.join(servicio_dir, f'foto{i}.jpg')
-            img.save(ruta_imagen, 'JPEG', quality=85)
-            print(f"Imagen generada: {ruta_imagen}")
-            
-            # Crear un archivo LEEME en cada directorio
-            with open(os.path.join(servicio_dir, 'LEEME.txt'), 'w', encoding='utf-8') as f:
-                f.write(f"Por favor, reemplace estas imágenes de ejemplo con imágenes reales del servicio de {nombre}.\n")
-                f.write("Los nombres de archivo deben ser: foto1.jpg, foto2.jpg, foto3.jpg")
-    
-    print("\n¡Proceso completado!")
-    print("Se han generado imágenes de marcador de posición para todos los servicios.")
-    print("Por favor, reemplácelas con imágenes reales cuando estén disponibles.")
+        escribir_si_cambia(
+            os.path.join(servicio_dir, 'LEEME.txt'),
+            f"Por favor, reemplace estas imágenes de ejemplo con imágenes reales del servicio de {nombre}.\n"
+            "Los nombres de archivo deben ser: foto1.jpg, foto2.jpg, foto3.jpg"
+        )
+
+    total = len(construir_trabajos())
+    print(f"\n¡Proceso completado! {len(pendientes)} generadas, "
+          f"{total - len(pendientes) - reales} sin cambios, {reales} imágenes reales conservadas.")
+    if reales < total:
+        print("Por favor, reemplace los marcadores de posición con imágenes reales cuando estén disponibles.")
+
 
 if __name__ == "__main__":
-    generar_imagenes_servicios()
+    parser = argparse.ArgumentParser(description="Generar imágenes de marcador de posición")
+    parser.add_argument('--force', action='store_true', help="Regenerar aunque las entradas no hayan cambiado")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos para renderizar (por defecto: CPUs)")
+    args = parser.parse_args()
+    generar_imagenes_servicios(force=args.force, workers=args.workers)
@@ -0,0 +1,284 @@
+"""
+Derivados responsivos de las imágenes de servicios y del logo.
+
+Por cada imagen fuente en app/static/assets genera varios anchos en AVIF
+(si Pillow lo soporta), WebP y JPEG/PNG de respaldo, con el hash del
+contenido en el nombre (foto1-640.3f2a9c1e.webp). Así nginx puede servirlas
+con "Cache-Control: public, immutable" y reemplazar una foto cambia su URL.
+
+El resultado se describe en app/static/assets/imagenes.manifest.json, que el
+backend usa para armar src/srcset en /api/servicios y /api/services. El
+manifiesto también guarda, calculados una sola vez, el ancho/alto original,
+un BlurHash y una miniatura base64 (LQIP) para pintar algo al instante.
+
+Uso:
+    python optimizar_imagenes.py            # solo las fuentes que cambiaron
+    python optimizar_imagenes.py --force    # regenerar todo
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+STATIC_DIR = os.path.join('app', 'static')
+ASSETS_DIR = os.path.join(STATIC_DIR, 'assets')
+SALIDA_DIR = os.path.join(ASSETS_DIR, 'optimizadas')
+MANIFEST_PATH = os.path.join(ASSETS_DIR, 'imagenes.manifest.json')
+URL_STATIC = '/static/'
+
+# Subir este número cuando cambien anchos o calidades
+PIPELINE_VERSION = 2
+ANCHOS = (320, 640, 960, 1280)
+CALIDAD = {'avif': 50, 'webp': 75, 'jpeg': 80}
+EXTENSIONES_FUENTE = ('.jpg', '.jpeg', '.png')
+HASH_LARGO = 8
+
+# BlurHash: componentes horizontales x verticales y tamaño de la miniatura de trabajo
+BLURHASH_COMPONENTES = (4, 3)
+BLURHASH_ANCHO = 32
+LQIP_ANCHO = 16
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def formatos_disponibles():
+    """Formatos modernos que esta instalación de Pillow puede escribir"""
+    formatos = []
+    if features.check('avif'):
+        formatos.append('avif')
+    if features.check('webp'):
+        formatos.append('webp')
+    return formatos
+
+
+def buscar_fuentes():
+    """Imágenes originales bajo assets (se excluyen los derivados)"""
+    fuentes = []
+    for raiz, dirs, archivos in os.walk(ASSETS_DIR):
+        dirs[:] = sorted(d for d in dirs if os.path.join(raiz, d) != SALIDA_DIR)
+        for archivo in sorted(archivos):
+            if archivo.lower().endswith(EXTENSIONES_FUENTE):
+                fuentes.append(os.path.join(raiz, archivo))
+    return fuentes
+
+
+def clave_de(ruta):
+    """Ruta relativa a static con '/' (la misma que usa el backend)"""
+    return os.path.relpath(ruta, STATIC_DIR).replace(os.sep, '/')
+
+
+def hash_archivo(ruta):
+    with open(ruta, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def anchos_para(ancho_original):
+    """Anchos del catálogo que no agrandan la imagen (siempre al menos uno)"""
+    anchos = [a for a in ANCHOS if a < ancho_original]
+    anchos.append(min(ancho_original, ANCHOS[-1]))
+    return sorted(set(anchos))
+
+
+def _base83(valor, largo):
+    return "".join(BASE83[(valor // 83 ** (largo - i - 1)) % 83] for i in range(largo))
+
+
+def _srgb_a_lineal(v):
+    v = v / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _lineal_a_srgb(v):
+    v = max(0.0, min(1.0, v))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def calcular_blurhash(img, componentes=BLURHASH_COMPONENTES):
+    """Codificar una imagen RGB como BlurHash (https://blurha.sh)"""
+    cx, cy = componentes
+    ancho = min(BLURHASH_ANCHO, img.width)
+    alto = max(1, round(img.height * ancho / img.width))
+    datos = img.convert('RGB').resize((ancho, alto), Image.BILINEAR).tobytes()
+    lineales = [(_srgb_a_lineal(r), _srgb_a_lineal(g), _srgb_a_lineal(b))
+                for r, g, b in zip(datos[0::3], datos[1::3], datos[2::3])]
+
+    factores = []
+    for j in range(cy):
+        for i in range(cx):
+            normalizacion = 1 if i == j == 0 else 2
+            r = g = b = 0.0
+            for y in range(alto):
+                base_y = math.cos(math.pi * j * y / alto)
+                for x in range(ancho):
+                    base = normalizacion * math.cos(math.pi * i * x / ancho) * base_y
+                    pr, pg, pb = lineales[y * ancho + x]
+                    r += base * pr
+                    g += base * pg
+                    b += base * pb
+            escala = 1 / (ancho * alto)
+            factores.append((r * escala, g * escala, b * escala))
+
+    dc, ac = factores[0], factores[1:]
+    resultado = _base83((cx - 1) + (cy - 1) * 9, 1)
+    if ac:
+        maximo = max(abs(c) for f in ac for c in f)
+        cuantizado = int(max(0, min(82, math.floor(maximo * 166 - 0.5))))
+        maximo = (cuantizado + 1) / 166
+        resultado += _base83(cuantizado, 1)
+    else:
+        maximo = 1
+        resultado += _base83(0, 1)
+
+    resultado += _base83((_lineal_a_srgb(dc[0]) << 16) + (_lineal_a_srgb(dc[1]) << 8) + _lineal_a_srgb(dc[2]), 4)
+    for factor in ac:
+        q = [int(max(0, min(18, math.floor(math.copysign(abs(c / maximo) ** 0.5, c) * 9 + 9.5)))) for c in factor]
+        resultado += _base83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return resultado
+
+
+def calcular_lqip(img, formato):
+    """Miniatura diminuta como data URI para usar de fondo mientras carga la imagen"""
+    alto = max(1, round(img.height * LQIP_ANCHO / img.width))
+    miniatura = img.resize((LQIP_ANCHO, alto), Image.BILINEAR)
+    buffer = io.BytesIO()
+    if formato == 'webp':
+        miniatura.save(buffer, 'WEBP', quality=30)
+    else:
+        miniatura.convert('RGB').save(buffer, 'JPEG', quality=40)
+        formato = 'jpeg'
+    return f"data:image/{formato};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+
+def _guardar(img, ruta_base, formato):
+    """Guardar con el hash del contenido en el nombre; devuelve la ruta final"""
+    extension = 'jpg' if formato == 'jpeg' else formato
+    temporal = f"{ruta_base}.tmp.{extension}"
+    opciones = {'quality': CALIDAD[formato]} if formato in CALIDAD else {'optimize': True}
+    if formato == 'jpeg':
+        opciones.update(optimize=True, progressive=True)
+    img.save(temporal, formato.upper(), **opciones)
+
+    digest = hash_archivo(temporal)[:HASH_LARGO]
+    final = f"{ruta_base}.{digest}.{extension}"
+    os.replace(temporal, final)
+    return final
+
+
+def procesar(trabajo):
+    """Generar todos los derivados de una fuente (se ejecuta en el pool)"""
+    fuente, formatos = trabajo['fuente'], trabajo['formatos']
+    clave = clave_de(fuente)
+    destino = os.path.join(SALIDA_DIR, os.path.dirname(os.path.relpath(fuente, ASSETS_DIR)))
+    os.makedirs(destino, exist_ok=True)
+    nombre = os.path.splitext(os.path.basename(fuente))[0]
+
+    with Image.open(fuente) as original:
+        original = ImageOps.exif_transpose(original)
+        con_alfa = original.mode in ('RGBA', 'LA', 'P') and fuente.lower().endswith('.png')
+        original = original.convert('RGBA' if con_alfa else 'RGB')
+        ancho, alto = original.size
+        respaldo = 'png' if con_alfa else 'jpeg'
+
+        variantes = {formato: [] for formato in formatos + [respaldo]}
+        for w in anchos_para(ancho):
+            h = max(1, round(alto * w / ancho))
+            img = original if w == ancho else original.resize((w, h), Image.LANCZOS)
+            ruta_base = os.path.join(destino, f"{nombre}-{w}")
+            for formato in variantes:
+                ruta = _guardar(img, ruta_base, formato)
+                variantes[formato].append({'url': URL_STATIC + clave_de(ruta), 'ancho': w})
+
+        blurhash = calcular_blurhash(original)
+        lqip = calcular_lqip(original, 'webp' if 'webp' in formatos else 'jpeg')
+
+    return clave, {
+        'fuente': trabajo['hash'],
+        'version': PIPELINE_VERSION,
+        'ancho': ancho,
+        'alto': alto,
+        'respaldo': respaldo,
+        'variantes': variantes,
+        'blurhash': blurhash,
+        'lqip': lqip,
+    }
+
+
+def cargar_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_manifest(manifest):
+    temporal = MANIFEST_PATH + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporal, MANIFEST_PATH)
+
+
+def _borrar_derivados(entrada):
+    for variantes in entrada.get('variantes', {}).values():
+        for variante in variantes:
+            ruta = os.path.join(STATIC_DIR, *variante['url'][len(URL_STATIC):].split('/'))
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def optimizar_imagenes(force=False, workers=None):
+    manifest = cargar_manifest()
+    formatos = formatos_disponibles()
+    fuentes = buscar_fuentes()
+
+    trabajos = []
+    for fuente in fuentes:
+        entrada = manifest.get(clave_de(fuente))
+        digest = hash_archivo(fuente)
+        if (not force and entrada and entrada['fuente'] == digest
+                and entrada.get('version') == PIPELINE_VERSION
+                and all(f in entrada['variantes'] for f in formatos)):
+            continue
+        trabajos.append({'fuente': fuente, 'hash': digest, 'formatos': formatos})
+
+    if trabajos:
+        if len(trabajos) < 4 or workers == 1:
+            resultados = list(map(procesar, trabajos))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                resultados = list(pool.map(procesar, trabajos))
+        for clave, entrada in resultados:
+            anterior = manifest.get(clave)
+            manifest[clave] = entrada
+            if anterior:
+                # Los derivados viejos ya no se referencian desde el manifiesto
+                nuevas = {v['url'] for vs in entrada['variantes'].values() for v in vs}
+                _borrar_derivados({'variantes': {
+                    f: [v for v in vs if v['url'] not in nuevas] for f, vs in anterior['variantes'].items()
+                }})
+            print(f"Derivados generados: {clave}")
+
+    # Fuentes que ya no existen
+    vigentes = {clave_de(f) for f in fuentes}
+    for clave in [c for c in manifest if c not in vigentes]:
+        _borrar_derivados(manifest.pop(clave))
+        print(f"Derivados eliminados: {clave}")
+
+    guardar_manifest(manifest)
+    print(f"\n¡Proceso completado! {len(trabajos)} imágenes procesadas, "
+          f"{len(fuentes) - len(trabajos)} sin cambios. Formatos: {', '.join(formatos + ['jpeg/png'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generar derivados responsivos con hash en el nombre")
+    parser.add_argument('--force', action='store_true', help="Regenerar aunque la fuente no haya cambiado")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos para renderizar (por defecto: CPUs)")
+    args = parser.parse_args()
+    optimizar_imagenes(force=args.force, workers=args.workers)
@@ -1,28 +1,79 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, EmailStr, confloat, constr
 from typing import Optional, List, Dict, Any
 import sqlite3
 import json
 import os
+import time
 import asyncio
 import httpx
-from datetime import datetime, timedelta
+from datetime import date, datetime, time as hora_del_dia, timedelta
 import logging
 from contextlib import asynccontextmanager
 import uvicorn
 
+from archive import ArchiveScheduler, ArchivoConversaciones, filas_csv, normalizar_rango
+from backup import BackupScheduler
+from compression import DEFAULT_RESPONSE_CLASS, CompressionMiddleware
+from conversation_fsm import MaquinaConversacion
+from database import DATABASE_URL, abrir_base
+from fuzzy_match import IndiceTrigramas
+from health import (VerificadorSalud, chequear_colas, chequear_escritura, chequear_pool,
+                    chequear_proveedores, crear_tabla_latido)
+from image_manifest import image_manifest
+from lead_pipeline import LeadPipeline
+from prometheus import CONTENT_TYPE as METRICS_CONTENT_TYPE, exposicion, familia, familias_pool
+from prompt_builder import PromptBuilder, count_tokens
+from query_profiler import cliente_local, perfilador_sql
+from rate_limit import RateLimitMiddleware, SingleFlight, ip_cliente
+from response_store import AlmacenRespuestas
+from retrieval import FAQ_GENERALES, MotorFAQ, entradas_conocimiento
+from routing import EnrutadorConfianza
+from slots import extraer as extraer_slots
+from static_files import StaticFiles
+from tracing import TracingMiddleware, exportador_trazas, trazar
+from usage import ContadorUso, clave as clave_uso
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Models Pydantic
+class SlotsChat(BaseModel):
+    """Datos de cotización que devuelve el cliente; tipos validados para no llegar a las plantillas como texto"""
+    servicio: Optional[constr(max_length=40)] = None
+    metraje: Optional[confloat(gt=0, lt=1_000_000)] = None
+    sector: Optional[constr(max_length=40)] = None
+    tipo_negocio: Optional[constr(max_length=40)] = None
+    terreno: Optional[constr(max_length=40)] = None
+    distrito: Optional[constr(max_length=60)] = None
+    nombre: Optional[constr(max_length=100)] = None
+    telefono: Optional[constr(regex=r"^\d{6,15}$")] = None
+    fecha: Optional[date] = None
+    hora: Optional[hora_del_dia] = None
+    lead_id: Optional[int] = None
+    cita_id: Optional[int] = None
+
+    def valores(self) -> Dict[str, Any]:
+        """Solo los presentes, con fecha y hora en el formato de slots.extraer (YYYY-MM-DD, HH:MM)"""
+        valores = self.dict(exclude_none=True)
+        if self.fecha:
+            valores["fecha"] = self.fecha.isoformat()
+        if self.hora:
+            valores["hora"] = self.hora.strftime("%H:%M")
+        return valores
+
 class ChatMessage(BaseModel):
     message: str
     context: Optional[str] = None
     stage: Optional[str] = "greeting"
     history: Optional[List[Dict]] = []
+    # Datos de cotización de turnos anteriores (el cliente devuelve los de la última respuesta)
+    slots: Optional[SlotsChat] = None
+    # Sesión para el presupuesto de tokens; sin ella se usa la IP del cliente
+    session_id: Optional[str] = None
 
 class ContactForm(BaseModel):
     nombre: str
@@ -100,31 +151,49 @@ KNOWLEDGE_BASE = {
     }
 }
 
+# Prompt base del asistente (se compacta una sola vez en PromptBuilder)
+TESLABOT_PROMPT = """
+Eres TeslaBot, asistente especializado de Tesla Electricidad y Automatización S.A.C.
+Empresa líder en servicios eléctricos en Huancayo, Perú.
+
+SERVICIOS PRINCIPALES:
+1. ITSE (Inspección Técnica Seguridad Edificaciones)
+2. Instalaciones eléctricas completas
+3. Automatización y domótica
+4. Mantenimiento eléctrico
+
+PERSONALIDAD: Profesional, técnico, confiable, orientado a resultados.
+OBJETIVO: Convertir consultas en leads calificados para visita técnica.
+
+PRECIOS REFERENCIALES (solo mencionar si preguntan):
+"""
+
 # Configuración API Keys (variables de entorno)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-pro")
 TWILIO_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 WHATSAPP_NUMBER = os.getenv("WHATSAPP_NUMBER", "+14155238886")
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "backend/data/tesla.db"):
-        self.db_path = db_path
-        self.init_database()
+    def __init__(self, url: str = DATABASE_URL, db_path: str = "backend/data/tesla.db"):
+        # SQLite (lectores query_only y un escritor único) o PostgreSQL según DATABASE_URL
+        self.pool = abrir_base(url, db_path)
+        self.db_path = self.pool.db_path
+        # response queda NULL en los turnos nuevos: el texto va a responses
+        self.respuestas = AlmacenRespuestas(self.pool, "response")
     
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
-    
-    def init_database(self):
+    async def init_database(self):
         """Inicializar base de datos con todas las tablas"""
-        # Crear directorio de datos si no existe
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+        await self.pool.abrir()
+        # El DDL se escribe para SQLite; database.py lo adapta si DATABASE_URL es PostgreSQL
+        await self.pool.transaccion(self._create_tables)
+    
+    async def _create_tables(self, cursor):
         # Tabla conversaciones
-        cursor.execute('''
+        await cursor.ejecutar('''
             CREATE TABLE IF NOT EXISTS conversations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT,
@@ -135,9 +204,10 @@ class DatabaseManager:
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
+        await self.respuestas.init_schema(cursor)
+    
         # Tabla leads
-        cursor.execute('''
+        await cursor.ejecutar('''
             CREATE TABLE IF NOT EXISTS leads (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 nombre TEXT NOT NULL,
@@ -152,9 +222,11 @@ class DatabaseManager:
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
-        
+        # Listado de leads del dashboard (ORDER BY created_at DESC LIMIT 50)
+        await cursor.ejecutar("CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads(created_at)")
+    
         # Tabla citas
-        cursor.execute('''
+        await cursor.ejecutar('''
             CREATE TABLE IF NOT EXISTS citas (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 lead_id INTEGER,
@@ -166,9 +238,9 @@ class DatabaseManager:
                 FOREIGN KEY (lead_id) REFERENCES leads (id)
             )
         ''')
-        
+    
         # Tabla servicios (para dashboard)
-        cursor.execute('''
+        await cursor.ejecutar('''
             CREATE TABLE IF NOT EXISTS servicios_stats (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 mes INTEGER,
@@ -179,14 +251,14 @@ class DatabaseManager:
                 mantenimiento INTEGER DEFAULT 0
             )
         ''')
-        
-        # Insertar datos demo para dashboard
-        self._insert_demo_data(cursor)
-        
-        conn.commit()
-        conn.close()
     
-    def _insert_demo_data(self, cursor):
+        # Latido de /health/ready
+        await crear_tabla_latido(cursor)
+
+        # Insertar datos demo para dashboard
+        await self._insert_demo_data(cursor)
+
+    async def _insert_demo_data(self, cursor):
         """Insertar datos demo para el dashboard"""
         demo_data = [
             (1, 2024, 12, 8, 3, 5),  # Enero
@@ -199,76 +271,167 @@ class DatabaseManager:
             (8, 2024, 35, 28, 18, 25)  # Agosto
         ]
         
-        cursor.execute("SELECT COUNT(*) FROM servicios_stats")
-        if cursor.fetchone()[0] == 0:
-            cursor.executemany(
+        if (await cursor.consultar_uno("SELECT COUNT(*) FROM servicios_stats"))[0] == 0:
+            await cursor.ejecutar_varios(
                 "INSERT INTO servicios_stats (mes, año, itse, instalaciones, automatizacion, mantenimiento) VALUES (?, ?, ?, ?, ?, ?)",
                 demo_data
             )
 
+    async def guardar_conversacion(self, user_id: str, message: str, response: str, stage: Optional[str],
+                                   context: Optional[str]):
+        """Un turno del chat; el texto de la respuesta se guarda una sola vez en responses"""
+        async def guardar(tx):
+            clave = await self.respuestas.guardar(tx, response)
+            await tx.ejecutar(
+                "INSERT INTO conversations (user_id, message, response_hash, stage, context) VALUES (?, ?, ?, ?, ?)",
+                (user_id, message, clave, stage, context)
+            )
+        await self.pool.transaccion(guardar)
+
+# Palabras clave de cada respuesta local (_<intención>_response), en orden de prioridad
+PALABRAS_INTENCION = {
+    "itse": ['itse', 'certificado', 'inspección'],
+    "installation": ['instalación', 'eléctrica', 'cableado'],
+    "automation": ['automatización', 'domótica', 'smart'],
+    "maintenance": ['mantenimiento', 'reparación'],
+    "price": ['precio', 'costo', 'cotización'],
+}
+PALABRAS_SECTOR = ['restaurante', 'industria', 'vivienda', 'casa']
+# Datos que usa cada respuesta local para cotizar
+REQUERIDOS_CHAT = {"itse": ("sector", "metraje"), "installation": ("tipo_negocio",)}
+# Servicio de las FAQ de entradas_conocimiento por intención
+SERVICIOS_FAQ = {"itse": "itse", "installation": "instalaciones", "automation": "automatizacion",
+                 "maintenance": "mantenimiento"}
+
 class AIService:
-    def __init__(self):
+    def __init__(self, uso: Optional[ContadorUso] = None):
         self.openai_available = bool(OPENAI_API_KEY)
         self.gemini_available = bool(GEMINI_API_KEY)
+        self.prompt_builder = PromptBuilder(TESLABOT_PROMPT, KNOWLEDGE_BASE)
+        # Preguntas frecuentes respondidas localmente antes de pagar un round-trip al LLM
+        self.faq = MotorFAQ(FAQ_GENERALES + entradas_conocimiento(KNOWLEDGE_BASE))
+        # "matenimiento" o "instalasion" se corrigen antes de las FAQ y las reglas locales
+        self.corrector = IndiceTrigramas(
+            [palabra for palabras in PALABRAS_INTENCION.values() for palabra in palabras] + PALABRAS_SECTOR
+        )
+        # Tokens y costo por sesión; las sesiones sobre el presupuesto se responden localmente
+        self.uso = uso
+        # Con proveedores configurados, las respuestas locales confiables no escalan al LLM;
+        # el ahorro se valoriza con los precios por modelo del contador de uso
+        self.router = EnrutadorConfianza(self.faq, PALABRAS_INTENCION, REQUERIDOS_CHAT, SERVICIOS_FAQ,
+                                         costo=uso.costo if uso else None, sin_servicio=("price",))
+        # Fallos seguidos por proveedor, para el estado de /health/ready
+        self.fallos_consecutivos = {"openai": 0, "gemini": 0}
+
+    def estado_proveedores(self) -> Dict[str, Dict]:
+        return {
+            "openai": {"configurado": self.openai_available, "fallos_consecutivos": self.fallos_consecutivos["openai"]},
+            "gemini": {"configurado": self.gemini_available, "fallos_consecutivos": self.fallos_consecutivos["gemini"]},
+        }
     
-    async def get_ai_response(self, message: str, context: str = None, history: List[Dict] = None) -> Dict:
+    async def get_ai_response(self, message: str, context: str = None, history: List[Dict] = None,
+                              sesion: str = "anonimo") -> Dict:
         """Obtener respuesta de IA con fallback"""
-        
+
+        msg = self.corrector.corregir(message)
+        faq = self.faq.responder(msg)
+        if faq:
+            self.router.registrar("faq")
+            return {
+                "response": faq.entrada.respuesta,
+                "source": "faq",
+                "stage": "specification_gathering" if faq.entrada.servicio else "conversation",
+                "confidence": faq.score,
+            }
+
+        # Sin proveedores configurados no hace falta armar el prompt
+        if not (self.openai_available or self.gemini_available):
+            self.router.registrar("respaldo")
+            return self._local_response(message, context)
+
+        decision = self._enrutar(msg)
+        if decision.local:
+            self.router.registrar("local")
+            respuesta = getattr(self, f"_{decision.intencion}_response")(msg)
+            respuesta["confidence"] = decision.confianza
+            return respuesta
+
+        motivo = self.uso.excedido(sesion) if self.uso else None
+        if motivo:
+            logger.info(f"Sesión {sesion} sobre el presupuesto ({motivo}): respuesta local")
+            self.router.registrar("presupuesto")
+            return {**self._local_response(message, context), "budget_exceeded": motivo}
+
         # Preparar contexto especializado
-        specialized_context = self._build_context(context, message)
-        
+        prompt = self._build_context(context, message, history)
+
         # Intentar OpenAI primero
         if self.openai_available:
+            inicio = time.perf_counter()
             try:
-                return await self._openai_response(message, specialized_context, history)
+                respuesta = await self._openai_response(message, prompt)
             except Exception as e:
+                self.fallos_consecutivos["openai"] += 1
                 logger.error(f"OpenAI error: {e}")
+            else:
+                self.fallos_consecutivos["openai"] = 0
+                self._medir_proveedor(inicio, respuesta, sesion, OPENAI_MODEL)
+                return respuesta
         
         # Fallback a Gemini
         if self.gemini_available:
+            inicio = time.perf_counter()
             try:
-                return await self._gemini_response(message, specialized_context, history)
+                respuesta = await self._gemini_response(message, prompt)
             except Exception as e:
+                self.fallos_consecutivos["gemini"] += 1
                 logger.error(f"Gemini error: {e}")
+            else:
+                self.fallos_consecutivos["gemini"] = 0
+                self._medir_proveedor(inicio, respuesta, sesion, GEMINI_MODEL)
+                return respuesta
         
         # Fallback local
+        self.router.registrar("respaldo")
         return self._local_response(message, context)
+
+    @trazar("ai.router")
+    def _enrutar(self, msg: str):
+        """Confianza en la respuesta local; debajo de ROUTER_MIN_CONFIDENCE se escala al proveedor"""
+        return self.router.decidir(msg, extraer_slots(msg))
+
+    def _medir_proveedor(self, inicio: float, respuesta: Dict, sesion: str, modelo: str):
+        """Registrar latencia y tokens de una respuesta ya pagada; un error aquí no la descarta"""
+        try:
+            uso = respuesta["usage"]
+            self.router.registrar_proveedor(time.perf_counter() - inicio, modelo,
+                                            uso["prompt_tokens"], uso["completion_tokens"])
+            if self.uso:
+                self.uso.registrar(sesion, respuesta["source"], modelo, uso["prompt_tokens"], uso["completion_tokens"])
+        except Exception as e:
+            logger.error(f"Registro de uso del proveedor falló: {e}")
+
+    @staticmethod
+    def _uso(prompt: Dict, texto: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> Dict:
+        """Tokens informados por el proveedor; si no vienen, la estimación local"""
+        return {
+            "prompt_tokens": prompt_tokens if prompt_tokens is not None else prompt["prompt_tokens"],
+            "completion_tokens": completion_tokens if completion_tokens is not None else count_tokens(texto),
+        }
     
-    def _build_context(self, context: str, message: str) -> str:
+    @trazar("ai.prompt")
+    def _build_context(self, context: str, message: str, history: List[Dict] = None) -> Dict:
         """Construir contexto especializado para Tesla Electricidad"""
-        base_context = """
-        Eres TeslaBot, asistente especializado de Tesla Electricidad y Automatización S.A.C.
-        Empresa líder en servicios eléctricos en Huancayo, Perú.
-        
-        SERVICIOS PRINCIPALES:
-        1. ITSE (Inspección Técnica Seguridad Edificaciones)
-        2. Instalaciones eléctricas completas
-        3. Automatización y domótica
-        4. Mantenimiento eléctrico
-        
-        PERSONALIDAD: Profesional, técnico, confiable, orientado a resultados.
-        OBJETIVO: Convertir consultas en leads calificados para visita técnica.
-        
-        PRECIOS REFERENCIALES (solo mencionar si preguntan):
-        """
-        
-        # Agregar información específica del servicio si hay contexto
-        if context:
-            service_info = KNOWLEDGE_BASE["servicios"].get(context, {})
-            if service_info:
-                base_context += f"\n\nINFORMACIÓN ESPECÍFICA {context.upper()}:\n"
-                base_context += json.dumps(service_info, indent=2, ensure_ascii=False)
-        
-        return base_context
+        return self.prompt_builder.build(message, context, history)
     
-    async def _openai_response(self, message: str, context: str, history: List[Dict]) -> Dict:
+    @trazar("ai.openai")
+    async def _openai_response(self, message: str, prompt: Dict) -> Dict:
         """Respuesta usando OpenAI"""
         async with httpx.AsyncClient() as client:
-            messages = [{"role": "system", "content": context}]
+            messages = [{"role": "system", "content": prompt["system"]}]
             
-            # Agregar historial
-            if history:
-                messages.extend(history[-5:])  # Últimos 5 mensajes
+            # Agregar historial ya recortado al presupuesto de tokens
+            messages.extend(prompt["history"])
             
             messages.append({"role": "user", "content": message})
             
@@ -276,7 +439,7 @@ class AIService:
                 "https://api.openai.com/v1/chat/completions",
                 headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
                 json={
-                    "model": "gpt-3.5-turbo",
+                    "model": OPENAI_MODEL,
                     "messages": messages,
                     "max_tokens": 500,
                     "temperature": 0.7
@@ -284,22 +447,27 @@ class AIService:
             )
             
             data = response.json()
+            texto = data["choices"][0]["message"]["content"]
+            usage = data.get("usage") or {}
             return {
-                "response": data["choices"][0]["message"]["content"],
+                "response": texto,
                 "source": "openai",
-                "stage": "conversation"
+                "stage": "conversation",
+                "prompt_tokens": prompt["prompt_tokens"],
+                "usage": self._uso(prompt, texto, usage.get("prompt_tokens"), usage.get("completion_tokens"))
             }
     
-    async def _gemini_response(self, message: str, context: str, history: List[Dict]) -> Dict:
+    @trazar("ai.gemini")
+    async def _gemini_response(self, message: str, prompt: Dict) -> Dict:
         """Respuesta usando Gemini"""
         async with httpx.AsyncClient() as client:
-            prompt = f"{context}\n\nUsuario: {message}\nTeslaBot:"
+            text = f"{prompt['system']}\n\nUsuario: {message}\nTeslaBot:"
             
             response = await client.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}",
+                f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GEMINI_API_KEY}",
                 json={
                     "contents": [{
-                        "parts": [{"text": prompt}]
+                        "parts": [{"text": text}]
                     }],
                     "generationConfig": {
                         "maxOutputTokens": 500,
@@ -309,42 +477,50 @@ class AIService:
             )
             
             data = response.json()
+            texto = data["candidates"][0]["content"]["parts"][0]["text"]
+            usage = data.get("usageMetadata") or {}
             return {
-                "response": data["candidates"][0]["content"]["parts"][0]["text"],
+                "response": texto,
                 "source": "gemini", 
-                "stage": "conversation"
+                "stage": "conversation",
+                "prompt_tokens": prompt["prompt_tokens"],
+                "usage": self._uso(prompt, texto, usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
             }
     
+    @trazar("ai.local")
     def _local_response(self, message: str, context: str) -> Dict:
         """Respuesta local usando reglas"""
-        msg = message.lower()
+        msg = self.corrector.corregir(message)
         
         # Detección de intenciones
-        if any(word in msg for word in ['itse', 'certificado', 'inspección']):
-            return self._itse_response(msg)
-        elif any(word in msg for word in ['instalación', 'eléctrica', 'cableado']):
-            return self._installation_response(msg)
-        elif any(word in msg for word in ['automatización', 'domótica', 'smart']):
-            return self._automation_response(msg)
-        elif any(word in msg for word in ['mantenimiento', 'reparación']):
-            return self._maintenance_response(msg)
-        elif any(word in msg for word in ['precio', 'costo', 'cotización']):
-            return self._price_response(msg)
-        else:
-            return {
-                "response": "¡Hola! Soy TeslaBot de Tesla Electricidad. ¿En qué servicio puedo ayudarte?\n\n• ITSE (Certificados)\n• Instalaciones eléctricas\n• Automatización\n• Mantenimiento",
-                "source": "local",
-                "stage": "service_identification"
-            }
+        intencion = self._intencion(msg)
+        if intencion:
+            return getattr(self, f"_{intencion}_response")(msg)
+        return {
+            "response": "¡Hola! Soy TeslaBot de Tesla Electricidad. ¿En qué servicio puedo ayudarte?\n\n• ITSE (Certificados)\n• Instalaciones eléctricas\n• Automatización\n• Mantenimiento",
+            "source": "local",
+            "stage": "service_identification"
+        }
     
-    def _itse_response(self, message: str) -> Dict:
-        sector = "comercio"  # default
-        
-        if "restaurante" in message: sector = "restaurante"
-        elif "industria" in message: sector = "industria"
-        elif "vivienda" in message or "casa" in message: sector = "vivienda"
+    @staticmethod
+    def _intencion(msg: str) -> Optional[str]:
+        return next((intencion for intencion, palabras in PALABRAS_INTENCION.items()
+                     if any(word in msg for word in palabras)), None)
+
+    def _itse_response(self, message: str, slots: Dict[str, Any] = None) -> Dict:
+        slots = slots or extraer_slots(message)
+        sectores = KNOWLEDGE_BASE["servicios"]["itse"]["sectores"]
+        sector = slots.get("sector")
+        if sector not in sectores:
+            sector = "comercio"  # default (oficinas incluidas)
         
-        info = KNOWLEDGE_BASE["servicios"]["itse"]["sectores"][sector]
+        info = sectores[sector]
+        datos = [f"• Área: {slots['metraje']:g} m²"] if "metraje" in slots else []
+        if "distrito" in slots:
+            datos.append(f"• Ubicación: {slots['distrito']}")
+        faltantes = [texto for slot, texto in (("metraje", "• Área del local (m²)"),
+                                               ("sector", "• Tipo específico de negocio"),
+                                               ("distrito", "• Ubicación")) if slot not in slots]
         
         response = f"""🔍 **ITSE para {sector.title()}**
 
@@ -356,24 +532,23 @@ class AIService:
 • Planos arquitectónicos
 • Memoria descriptiva eléctrica
 • Certificado final ITSE
-
-🔧 **¿Necesitas más información?**
-Para cotización exacta necesito:
-• Área del local (m²)
-• Tipo específico de negocio
-• Ubicación
-
-¿Agendamos una visita técnica GRATUITA?"""
+"""
+        if datos:
+            response += "\n📐 **Tus datos:**\n" + "\n".join(datos) + "\n"
+        if faltantes:
+            response += "\n🔧 **¿Necesitas más información?**\nPara cotización exacta necesito:\n" + "\n".join(faltantes) + "\n"
+        response += "\n¿Agendamos una visita técnica GRATUITA?"
 
         return {
             "response": response,
             "source": "local",
-            "stage": "specification_gathering",
+            "stage": "specification_gathering" if faltantes else "data_collection",
             "context": "itse"
         }
     
-    def _installation_response(self, message: str) -> Dict:
-        tipo = "residencial" if "casa" in message or "vivienda" in message else "comercial"
+    def _installation_response(self, message: str, slots: Dict[str, Any] = None) -> Dict:
+        slots = slots or extraer_slots(message)
+        tipo = "residencial" if slots.get("tipo_negocio") == "residencial" else "comercial"
         precio = KNOWLEDGE_BASE["servicios"]["instalaciones"]["precios"][f"punto_{tipo}"]
         
         response = f"""⚡ **Instalación Eléctrica {tipo.title()}**
@@ -495,6 +670,7 @@ class WhatsAppService:
     def __init__(self):
         self.twilio_available = bool(TWILIO_SID and TWILIO_TOKEN)
     
+    @trazar("whatsapp.send")
     async def send_message(self, to: str, message: str) -> bool:
         """Enviar mensaje por WhatsApp"""
         if not self.twilio_available:
@@ -520,7 +696,7 @@ class WhatsAppService:
             logger.error(f"Error enviando WhatsApp: {e}")
             return False
     
-    def send_welcome_message(self, phone: str, nombre: str, servicio: str):
+    async def send_welcome_message(self, phone: str, nombre: str, servicio: str):
         """Enviar mensaje de bienvenida automático"""
         message = f"""¡Hola {nombre}! 👋
 
@@ -537,20 +713,137 @@ Gracias por contactar Tesla Electricidad desde nuestra web.
 
 *Tesla Electricidad - Energía Inteligente para Huancayo*"""
         
-        return asyncio.create_task(self.send_message(phone, message))
+        return await self.send_message(phone, message)
 
 # Inicializar servicios
 db = DatabaseManager()
-ai_service = AIService()
+# Uso de tokens por sesión y día, volcado periódico a uso_tokens
+contador_uso = ContadorUso(db.pool)
+ai_service = AIService(contador_uso)
 whatsapp_service = WhatsAppService()
+# Scoring de leads en segundo plano (el formulario no trae metraje para cotizar)
+lead_pipeline = LeadPipeline(db.pool)
+# Backups en línea y archivo mensual trabajan sobre el archivo SQLite; en
+# PostgreSQL eso queda a cargo del servidor (pg_dump, particiones)
+backup_scheduler = archivo_conversaciones = archive_scheduler = None
+if db.pool.dialecto == "sqlite":
+    # Snapshots periódicos con la API de backup en línea
+    backup_scheduler = BackupScheduler(db.db_path)
+    # Conversaciones viejas a bases mensuales; el export las lee en un hilo del threadpool
+    archivo_conversaciones = ArchivoConversaciones(
+        lambda: sqlite3.connect(db.db_path, check_same_thread=False), db.db_path,
+        escritor=db.pool.en_escritor
+    )
+    archive_scheduler = ArchiveScheduler(archivo_conversaciones)
+# Prompts idénticos concurrentes de una misma sesión (reintentos, doble envío) comparten una llamada
+chat_flight = SingleFlight()
+
+# Plantillas locales del flujo de conversación: (mensaje corregido, slots) -> respuesta
+def _plantilla_servicio(msg: str, slots: Dict[str, Any]) -> Dict:
+    intencion = slots.get("servicio")
+    if intencion in ("itse", "installation"):
+        return getattr(ai_service, f"_{intencion}_response")(msg, slots)
+    if intencion:
+        return getattr(ai_service, f"_{intencion}_response")(msg)
+    return ai_service._local_response(msg, None)
+
+def _respuesta_local(response: str) -> Dict:
+    return {"response": response, "source": "local"}
+
+def _fecha_visita(slots: Dict[str, Any]) -> str:
+    return f"{slots['fecha']} {slots.get('hora', '')}".strip()
+
+def _plantilla_lead(msg: str, slots: Dict[str, Any]) -> Dict:
+    nombre = f" {slots['nombre']}" if "nombre" in slots else ""
+    response = f"✅ ¡Gracias{nombre}! Registramos tu solicitud y te escribiremos por WhatsApp al {slots['telefono']}."
+    if "fecha" in slots:
+        return _respuesta_local(response + f"\n\n📅 Anotamos tu preferencia de visita: **{_fecha_visita(slots)}**.")
+    return _respuesta_local(response + "\n\n📅 ¿Qué día y hora te acomoda para la visita técnica GRATUITA?")
+
+PLANTILLAS_CHAT = {
+    "especificacion": _plantilla_servicio,
+    "cotizacion": _plantilla_servicio,
+    "pedir_contacto": lambda msg, slots: _respuesta_local(
+        "📞 ¡Genial! ¿A qué nombre y número de WhatsApp te contactamos para coordinar la visita?"
+    ),
+    "lead": _plantilla_lead,
+    "pedir_fecha": lambda msg, slots: _respuesta_local("📅 ¿Qué día y hora prefieres para la visita técnica?"),
+    "cita": lambda msg, slots: _respuesta_local(
+        f"📅 **Visita técnica agendada:** {_fecha_visita(slots)}\n\n"
+        f"Te confirmaremos por WhatsApp al {slots.get('telefono', 'número que nos dejaste')}. ¡Gracias!"
+    ),
+}
+# Datos para cotizar por intención (automatización, mantenimiento y precios ya responden con sus tarifas)
+flujo_chat = MaquinaConversacion(PLANTILLAS_CHAT, REQUERIDOS_CHAT)
+
+async def _lead_del_chat(slots: Dict[str, Any]) -> bool:
+    """El lead_id que devuelve el cliente es de este teléfono (los slots viajan por el cliente)"""
+    if "lead_id" not in slots:
+        return False
+    fila = await db.pool.consultar_uno("SELECT telefono FROM leads WHERE id = ?", (slots["lead_id"],))
+    return bool(fila) and fila[0] == slots.get("telefono")
+
+async def _registrar_lead(slots: Dict[str, Any], background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    if await _lead_del_chat(slots):
+        return {}
+    nombre = slots.get("nombre", "Cliente chat")
+    servicio = slots.get("servicio", "consulta")
+    datos = {k: v for k, v in slots.items() if k not in ("nombre", "telefono", "lead_id", "cita_id")}
+    lead_id = await db.pool.insertar(
+        "INSERT INTO leads (nombre, telefono, servicio, fecha_cita, notas) VALUES (?, ?, ?, ?, ?)",
+        (nombre, slots["telefono"], servicio, _fecha_visita(slots) if "fecha" in slots else None,
+         json.dumps(datos, ensure_ascii=False))
+    )
+    lead_pipeline.submit(lead_id)
+    background_tasks.add_task(whatsapp_service.send_welcome_message, slots["telefono"], nombre, servicio)
+    return {"lead_id": lead_id}
+
+async def _guardar_cita(tx, lead_id: int, cita_id: Optional[int], fecha_hora: datetime, notas: str) -> int:
+    if cita_id and await tx.consultar_uno("SELECT id FROM citas WHERE id = ? AND lead_id = ?", (cita_id, lead_id)):
+        await tx.ejecutar("UPDATE citas SET fecha_hora = ?, notas = ? WHERE id = ?", (fecha_hora, notas, cita_id))
+    else:
+        cita_id = await tx.insertar(
+            "INSERT INTO citas (lead_id, fecha_hora, notas) VALUES (?, ?, ?)", (lead_id, fecha_hora, notas)
+        )
+    await tx.ejecutar(
+        "UPDATE leads SET fecha_cita = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (fecha_hora.strftime("%Y-%m-%d %H:%M"), lead_id)
+    )
+    return cita_id
+
+async def _agendar_cita(slots: Dict[str, Any], background_tasks: BackgroundTasks) -> Dict[str, Any]:
+    if "fecha" not in slots or not await _lead_del_chat(slots):
+        return {}
+    fecha_hora = datetime.fromisoformat(f"{slots['fecha']} {slots.get('hora', '10:00')}")
+    cita_id = await db.pool.transaccion(
+        _guardar_cita, slots["lead_id"], slots.get("cita_id"), fecha_hora, "Agendada desde el chat"
+    )
+    return {"cita_id": cita_id}
+
+ACCIONES_CHAT = {"registrar_lead": _registrar_lead, "agendar_cita": _agendar_cita}
+# Readiness cacheado: base escribible, margen del pool, colas y proveedores
+health_checker = VerificadorSalud({
+    "base_de_datos": lambda: chequear_escritura(db.pool),
+    "pool": lambda: chequear_pool(db.pool),
+    "colas": lambda: chequear_colas({"leads": lead_pipeline.queue}),
+    "proveedores": lambda: chequear_proveedores(ai_service.estado_proveedores()),
+})
 
 # Crear aplicación FastAPI
 app = FastAPI(
     title="Tesla Electricidad API",
     description="API Backend para Tesla Electricidad - Sistema Inteligente",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=DEFAULT_RESPONSE_CLASS
 )
 
+# Compresión gzip/Brotli para cuando no hay nginx delante
+app.add_middleware(CompressionMiddleware)
+
+# Límite por cliente cuando el backend se expone sin nginx (CORS queda por fuera
+# para que los 429 también lleven cabeceras CORS)
+app.add_middleware(RateLimitMiddleware)
+
 # Middleware CORS
 app.add_middleware(
     CORSMiddleware,
@@ -560,31 +853,96 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Trazas muestreadas con Server-Timing; por fuera de todo para medir también la compresión
+app.add_middleware(TracingMiddleware)
+
+# /static/assets/... (imágenes, css) cuando el backend corre sin nginx
+app.mount("/static", StaticFiles(), name="static")
+
+@app.on_event("startup")
+async def startup():
+    await db.init_database()
+    await db.respuestas.start()
+    await lead_pipeline.start()
+    await contador_uso.start()
+    await exportador_trazas.start()
+    if backup_scheduler:
+        await backup_scheduler.start()
+        await archive_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if backup_scheduler:
+        await archive_scheduler.stop()
+        await backup_scheduler.stop()
+    await lead_pipeline.stop()
+    await contador_uso.stop()
+    await db.respuestas.stop()
+    await exportador_trazas.stop()
+    await db.pool.cerrar()
+
 # Endpoints principales
 @app.get("/")
 async def root():
     return {"message": "Tesla Electricidad API v2.0", "status": "running"}
 
+@app.get("/health")
+@app.get("/health/live")
+async def health_live():
+    """Liveness: el proceso responde (no toca la base)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Readiness con chequeos en caché; 503 si la instancia no debe recibir tráfico"""
+    estado = await health_checker.estado()
+    if estado["status"] != "ready":
+        response.status_code = 503
+    return estado
+
 @app.post("/api/chat")
-async def chat_endpoint(message: ChatMessage):
+async def chat_endpoint(message: ChatMessage, request: Request, background_tasks: BackgroundTasks):
     """Endpoint principal del chatbot"""
     try:
-        # Obtener respuesta de IA
-        ai_response = await ai_service.get_ai_response(
-            message.message, 
-            message.context, 
-            message.history
-        )
+        # Transición del flujo a partir del stage que devuelve el cliente
+        nuevos = extraer_slots(message.message)
+        slots = {**(message.slots.valores() if message.slots else {}), **nuevos}
+        texto = ai_service.corrector.corregir(message.message)
+        detectado = ai_service._intencion(texto)
+        servicio_previo = slots.get("servicio")
+        if detectado:
+            slots["servicio"] = detectado
+        paso = flujo_chat.paso(message.stage, flujo_chat.evento(
+            slots.get("servicio"), slots, nuevos, texto,
+            servicio_nuevo=detectado is not None and detectado != servicio_previo
+        ))
+        if paso.accion:
+            slots.update(await ACCIONES_CHAT[paso.accion](slots, background_tasks))
+
+        if paso.plantilla:
+            # Respuesta local, sin proveedor de IA
+            ai_response = dict(paso.plantilla(texto, slots))
+        else:
+            # El session_id lo elige el cliente: el presupuesto va siempre dentro del de su IP
+            sesion = clave_uso(ip_cliente(request.scope), message.session_id or "anonimo")
+            # Por sesión: cada una pasa por su presupuesto y se le cobran sus propios tokens
+            flight_key = json.dumps([sesion, message.message.strip(), message.context, message.history],
+                                    sort_keys=True, ensure_ascii=False)
+            ai_response = dict(await chat_flight.do(flight_key, lambda: ai_service.get_ai_response(
+                message.message, 
+                message.context, 
+                message.history,
+                sesion
+            )))
+        fuente = ai_response.get("source")
+        flujo_chat.registrar(paso.destino, fuente if fuente in ("local", "faq") else "proveedor")
+        ai_response["stage"] = paso.destino
+        ai_response["slots"] = slots
         
         # Guardar conversación
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO conversations (user_id, message, response, stage, context) VALUES (?, ?, ?, ?, ?)",
-            ("anonymous", message.message, ai_response["response"], ai_response.get("stage"), message.context)
+        await db.guardar_conversacion(
+            "anonymous", message.message, ai_response["response"], ai_response.get("stage"), message.context
         )
-        conn.commit()
-        conn.close()
         
         return ai_response
         
@@ -592,20 +950,32 @@ async def chat_endpoint(message: ChatMessage):
         logger.error(f"Error en chat: {e}")
         raise HTTPException(status_code=500, detail="Error procesando mensaje")
 
+@app.get("/debug/chat")
+async def chat_stats():
+    """Turnos por estado del flujo y decisiones del enrutador (fracción local y ahorro estimado)"""
+    return {**flujo_chat.metricas(), "router": ai_service.router.metricas()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas para Prometheus: tokens y costo por proveedor, enrutador, flujo del chat y pool"""
+    return PlainTextResponse(exposicion([
+        *contador_uso.familias(),
+        *ai_service.router.familias(),
+        *flujo_chat.familias(),
+        *familias_pool(db.pool.metricas()),
+        familia("tesla_leads_cola", "gauge", "Leads pendientes de scoring", [({}, lead_pipeline.queue.qsize())]),
+    ]), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/api/contact")
 async def contact_endpoint(contact: ContactForm, background_tasks: BackgroundTasks):
     """Endpoint para formulario de contacto"""
     try:
         # Guardar lead
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        lead_id = await db.pool.insertar(
             "INSERT INTO leads (nombre, telefono, email, servicio, notas) VALUES (?, ?, ?, ?, ?)",
             (contact.nombre, contact.telefono, contact.email, contact.servicio, contact.mensaje)
         )
-        lead_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        lead_pipeline.submit(lead_id)
         
         # Enviar WhatsApp en background
         background_tasks.add_task(
@@ -629,16 +999,11 @@ async def contact_endpoint(contact: ContactForm, background_tasks: BackgroundTas
 async def dashboard_stats(mes: int):
     """Endpoint para estadísticas del dashboard"""
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
+        result = await db.pool.consultar_uno(
             "SELECT itse, instalaciones, automatizacion, mantenimiento FROM servicios_stats WHERE mes = ?",
             (mes,)
         )
         
-        result = cursor.fetchone()
-        conn.close()
-        
         if result:
             return {
                 "mes": mes,
@@ -657,51 +1022,90 @@ async def dashboard_stats(mes: int):
 @app.get("/api/services")
 async def get_services():
     """Endpoint para obtener información de servicios"""
-    return {
-        "servicios": [
-            {
-                "id": "itse",
-                "nombre": "Certificado ITSE",
-                "descripcion": "Inspección Técnica de Seguridad en Edificaciones",
-                "imagen": "https://images.unsplash.com/photo-1621905251918-48416bd8575a?w=400",
-                "precio_desde": 400
-            },
-            {
-                "id": "instalaciones", 
-                "nombre": "Instalaciones Eléctricas",
-                "descripcion": "Instalaciones completas residenciales y comerciales",
-                "imagen": "https://images.unsplash.com/photo-1621905252507-b35492cc74b4?w=400",
-                "precio_desde": 85
-            },
-            {
-                "id": "automatizacion",
-                "nombre": "Automatización",
-                "descripcion": "Sistemas de domótica y control inteligente", 
-                "imagen": "https://images.unsplash.com/photo-1518709268805-4e9042af2176?w=400",
-                "precio_desde": 2500
-            },
-            {
-                "id": "mantenimiento",
-                "nombre": "Mantenimiento",
-                "descripcion": "Mantenimiento preventivo y correctivo",
-                "imagen": "https://images.unsplash.com/photo-1621905252472-e1024b75b8ae?w=400", 
-                "precio_desde": 300
-            }
-        ]
-    }
+    servicios = [
+        {
+            "id": "itse",
+            "nombre": "Certificado ITSE",
+            "descripcion": "Inspección Técnica de Seguridad en Edificaciones",
+            "imagen": "https://images.unsplash.com/photo-1621905251918-48416bd8575a?w=400",
+            "precio_desde": 400
+        },
+        {
+            "id": "instalaciones", 
+            "nombre": "Instalaciones Eléctricas",
+            "descripcion": "Instalaciones completas residenciales y comerciales",
+            "imagen": "https://images.unsplash.com/photo-1621905252507-b35492cc74b4?w=400",
+            "precio_desde": 85
+        },
+        {
+            "id": "automatizacion",
+            "nombre": "Automatización",
+            "descripcion": "Sistemas de domótica y control inteligente", 
+            "imagen": "https://images.unsplash.com/photo-1518709268805-4e9042af2176?w=400",
+            "precio_desde": 2500
+        },
+        {
+            "id": "mantenimiento",
+            "nombre": "Mantenimiento",
+            "descripcion": "Mantenimiento preventivo y correctivo",
+            "imagen": "https://images.unsplash.com/photo-1621905252472-e1024b75b8ae?w=400", 
+            "precio_desde": 300
+        }
+    ]
+
+    # Usar las fotos propias optimizadas cuando existen en el manifiesto
+    for servicio in servicios:
+        local = f"/static/assets/servicios/{servicio['id']}/foto1.jpg"
+        responsive = image_manifest.responsive(local)
+        if responsive["srcset"]:
+            servicio["imagen"] = responsive["src"]
+            servicio["imagen_responsive"] = responsive
+    return {"servicios": servicios}
+
+@app.get("/api/conversations")
+async def search_conversations(desde: Optional[str] = None, hasta: Optional[str] = None,
+                               q: Optional[str] = None, user_id: Optional[str] = None, limite: int = 100):
+    """Buscar conversaciones (admin), incluyendo los meses archivados del rango"""
+    try:
+        desde, hasta = normalizar_rango(desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas, use YYYY-MM-DD")
+    if archivo_conversaciones is None:
+        raise HTTPException(status_code=501, detail="Búsqueda de conversaciones disponible solo con SQLite")
+    conversaciones = await asyncio.to_thread(
+        archivo_conversaciones.buscar, desde=desde, hasta=hasta, texto=q,
+        sesion=user_id, limite=max(1, min(limite, 1000))
+    )
+    return {"total": len(conversaciones), "conversaciones": conversaciones}
+
+@app.get("/api/conversations/export")
+async def export_conversations(desde: Optional[str] = None, hasta: Optional[str] = None,
+                               q: Optional[str] = None, user_id: Optional[str] = None):
+    """Exportar conversaciones a CSV (admin)"""
+    try:
+        desde, hasta = normalizar_rango(desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas, use YYYY-MM-DD")
+    if archivo_conversaciones is None:
+        raise HTTPException(status_code=501, detail="Exportación de conversaciones disponible solo con SQLite")
+    filas = archivo_conversaciones.iterar(desde=desde, hasta=hasta, texto=q, sesion=user_id)
+    return StreamingResponse(
+        filas_csv(filas), media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="conversations.csv"'}
+    )
 
 @app.get("/api/leads")
 async def get_leads():
     """Endpoint para obtener leads (admin)"""
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, nombre, telefono, email, servicio, estado, created_at FROM leads ORDER BY created_at DESC LIMIT 50"
+        filas = await db.pool.consultar(
+            """SELECT l.id, l.nombre, l.telefono, l.email, l.servicio, l.estado, l.created_at, s.score, s.categoria
+               FROM leads l LEFT JOIN lead_scores s ON s.lead_id = l.id
+               ORDER BY l.created_at DESC LIMIT 50"""
         )
         
         leads = []
-        for row in cursor.fetchall():
+        for row in filas:
             leads.append({
                 "id": row[0],
                 "nombre": row[1], 
@@ -709,16 +1113,43 @@ async def get_leads():
                 "email": row[3],
                 "servicio": row[4],
                 "estado": row[5],
-                "fecha": row[6]
+                "fecha": row[6],
+                "score": row[7],
+                "categoria": row[8]
             })
         
-        conn.close()
         return {"leads": leads}
         
     except Exception as e:
         logger.error(f"Error obteniendo leads: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo leads")
 
+@app.get("/api/db/metrics")
+async def db_metrics(reset: bool = False):
+    """Esperas de lectores y escritor (admin); reset=true reinicia la ventana"""
+    metricas = db.pool.metricas()
+    if reset:
+        db.pool.reiniciar_metricas()
+    return metricas
+
+@app.get("/debug/queries")
+async def query_profile(orden: str = "total", limite: int = 50):
+    """Perfil de sentencias SQL (admin) del worker que atiende: cada worker tiene el suyo"""
+    return perfilador_sql.reporte(orden, limite)
+
+@app.post("/debug/queries")
+async def toggle_query_profile(request: Request, activar: Optional[bool] = None, reiniciar: bool = False,
+                               orden: str = "total", limite: int = 50):
+    """Prender/apagar o reiniciar el perfilador de este worker (admin), solo desde localhost"""
+    if not cliente_local(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Solo desde localhost")
+    if activar is not None:
+        perfilador_sql.activo = activar
+    reporte = perfilador_sql.reporte(orden, limite)
+    if reiniciar:
+        perfilador_sql.reiniciar()
+    return reporte
+
 @app.post("/api/whatsapp/send")
 async def send_whatsapp(message: WhatsAppMessage):
     """Endpoint para enviar WhatsApp manual"""
@@ -0,0 +1,417 @@
+"""
+Archivo frío de conversaciones en bases mensuales.
+
+La tabla conversations crece una fila por turno de chat y cada consulta y
+backup paga por todo el historial. ArchivoConversaciones mueve las filas
+más viejas que ARCHIVE_AFTER_DAYS a un archivo SQLite por mes
+(tesla-conversations-2024-01.db), opcionalmente con el texto comprimido con
+zstd, y deja la tabla caliente pequeña. Las respuestas deduplicadas
+(response_store.py) se copian con el texto resuelto, así cada mes archivado
+es autónomo, y se borran de responses las que quedan sin referencias.
+
+Cada lote se mueve en dos pasos: primero se confirma la copia en el archivo
+(INSERT OR REPLACE, idempotente) y después se borran de la tabla caliente
+solo las filas que ya están en el archivo. Una transacción sobre bases
+ATTACH en modo WAL es atómica por archivo pero no entre archivos; con dos
+pasos, un corte entre ambos deja filas duplicadas que la próxima ronda
+vuelve a copiar y borra, nunca filas perdidas. Las escrituras pasan por el
+escritor único del pool (`PoolSQLite.en_escritor`) y un cerrojo de archivo
+(file_lock.py) evita que los workers de uvicorn archiven a la vez.
+
+Las búsquedas y exportaciones consultan primero la tabla caliente y solo
+hacen ATTACH de los meses archivados que caen dentro del rango pedido.
+
+Uso:
+    python archive.py --db data/tesla.db --days 90
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from file_lock import Cerrojo
+from response_store import COLUMNA_HASH, COLUMNAS_RESPUESTA, purgar_huerfanas, texto_sql
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR")  # por defecto: <directorio de la DB>/archive
+ARCHIVE_COMPRESS = os.getenv("ARCHIVE_COMPRESS", "1") != "0"
+# Filas por transacción: acota cuánto tiempo se retiene el lock de escritura
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "5000"))
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))
+
+TABLA = "conversations"
+# Columnas de texto libre (se comprimen y se usan en la búsqueda) según el esquema
+COLUMNAS_TEXTO = ("user_message", "bot_response", "message", "response", "context")
+# Columna que identifica la conversación en cada esquema (main.py / app.py)
+COLUMNAS_SESION = ("session_id", "user_id")
+# Filas de un mes (desde, mes siguiente) anteriores al corte
+_FILTRO = "timestamp >= ? AND timestamp < ? AND timestamp < ?"
+
+_zstd_c = zstandard.ZstdCompressor(level=6) if zstandard else None
+_zstd_d = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def _comprimir(texto):
+    if texto is None:
+        return None
+    return _zstd_c.compress(str(texto).encode("utf-8"))
+
+
+def _descomprimir(valor):
+    if isinstance(valor, bytes):
+        return _zstd_d.decompress(valor).decode("utf-8")
+    return valor
+
+
+def _mes_siguiente(mes: str) -> str:
+    anio, numero = map(int, mes.split("-"))
+    return f"{anio + numero // 12}-{numero % 12 + 1:02d}"
+
+
+def normalizar_rango(desde: Optional[str], hasta: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Validar fechas YYYY-MM-DD[ HH:MM:SS]; 'hasta' sin hora incluye todo ese día"""
+    for valor in (desde, hasta):
+        if valor:
+            datetime.fromisoformat(valor)
+    if hasta and len(hasta) == 10:
+        hasta += " 23:59:59"
+    return desde, hasta
+
+
+class ArchivoConversaciones:
+    def __init__(self, connect: Callable[[], sqlite3.Connection], db_path: str,
+                 archive_dir: Optional[str] = ARCHIVE_DIR, after_days: int = ARCHIVE_AFTER_DAYS,
+                 compress: bool = ARCHIVE_COMPRESS, batch_size: int = ARCHIVE_BATCH,
+                 escritor: Optional[Callable[[Callable[[sqlite3.Connection], Any]], Any]] = None):
+        # Lecturas (búsqueda, exportación) en conexiones propias
+        self.connect = connect
+        # Corre fn(conn) sobre la conexión de escritura; la API pasa PoolSQLite.en_escritor
+        self.escritor = escritor or self._escritor_propio
+        self.db_path = db_path
+        self.archive_dir = Path(archive_dir) if archive_dir else Path(db_path).resolve().parent / "archive"
+        self.cerrojo = Cerrojo(self.archive_dir / ".archivado.lock")
+        self.after_days = after_days
+        self.compress = compress and zstandard is not None
+        self.batch_size = batch_size
+        self._columnas: Optional[List[Tuple[str, str]]] = None
+        self._deduplicada = False
+
+    # --- Esquema -----------------------------------------------------------
+
+    def columnas(self, conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+        """(nombre, definición) de las columnas de la tabla caliente, sin la huella de la respuesta"""
+        if self._columnas is None:
+            filas = conn.execute(f"PRAGMA table_info({TABLA})").fetchall()
+            self._deduplicada = any(row[1] == COLUMNA_HASH for row in filas)
+            self._columnas = [(row[1], f"{row[2]} PRIMARY KEY" if row[5] else row[2])
+                              for row in filas if row[1] != COLUMNA_HASH]
+        return self._columnas
+
+    def _valor(self, conn: sqlite3.Connection, columna: str) -> str:
+        """Columna de la tabla caliente en SQL; la respuesta se lee desde responses si está deduplicada"""
+        self.columnas(conn)
+        if self._deduplicada and columna in COLUMNAS_RESPUESTA:
+            return texto_sql(columna, esquema="main")
+        return f'{TABLA}."{columna}"'
+
+    def columna_sesion(self, conn: sqlite3.Connection) -> str:
+        nombres = [c for c, _ in self.columnas(conn)]
+        return next(c for c in COLUMNAS_SESION if c in nombres)
+
+    def columnas_texto(self, conn: sqlite3.Connection) -> List[str]:
+        return [c for c, _ in self.columnas(conn) if c in COLUMNAS_TEXTO]
+
+    def _escritor_propio(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Sin pool (línea de comandos): conexión propia en autocommit"""
+        conn = self.connect()
+        conn.isolation_level = None
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+    def init_schema(self):
+        # La selección por fecha del archivado y de las búsquedas usa este índice
+        self.escritor(lambda conn: conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{TABLA}_timestamp ON {TABLA}(timestamp)"
+        ))
+
+    def ruta_mes(self, mes: str) -> Path:
+        return self.archive_dir / f"{Path(self.db_path).stem}-{TABLA}-{mes}.db"
+
+    def meses_archivados(self) -> List[str]:
+        prefijo = f"{Path(self.db_path).stem}-{TABLA}-"
+        if not self.archive_dir.is_dir():
+            return []
+        return sorted(p.stem[len(prefijo):] for p in self.archive_dir.glob(f"{prefijo}*.db"))
+
+    def _attach(self, conn: sqlite3.Connection, mes: str, crear: bool = False) -> bool:
+        """ATTACH del archivo del mes como 'archivo'; crea su tabla si hace falta"""
+        ruta = self.ruta_mes(mes)
+        if not crear and not ruta.exists():
+            return False
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS archivo", (str(ruta),))
+        if crear:
+            definicion = ", ".join(f'"{nombre}" {tipo}' for nombre, tipo in self.columnas(conn))
+            conn.execute(f"CREATE TABLE IF NOT EXISTS archivo.{TABLA} ({definicion})")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS archivo.idx_{TABLA}_timestamp ON {TABLA}(timestamp)")
+            conn.execute("CREATE TABLE IF NOT EXISTS archivo.archivo_info (clave TEXT PRIMARY KEY, valor TEXT)")
+            conn.execute("INSERT OR IGNORE INTO archivo.archivo_info VALUES ('compresion', ?)",
+                         ("zstd" if self.compress else "ninguna",))
+        return True
+
+    def _preparar_conexion(self, conn: sqlite3.Connection):
+        if zstandard is not None:
+            conn.create_function("comprimir", 1, _comprimir, deterministic=True)
+            conn.create_function("descomprimir", 1, _descomprimir, deterministic=True)
+
+    # --- Archivado ---------------------------------------------------------
+
+    def corte(self) -> str:
+        """Fecha (UTC, formato de CURRENT_TIMESTAMP) antes de la cual se archiva"""
+        return (datetime.utcnow() - timedelta(days=self.after_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    @staticmethod
+    def _en_transaccion(conn: sqlite3.Connection, inicio: str, sql: str, parametros: tuple) -> int:
+        conn.execute(inicio)
+        try:
+            filas = conn.execute(sql, parametros).rowcount
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return filas
+
+    def _copiar_lote(self, conn: sqlite3.Connection, mes: str, corte: str) -> Optional[Tuple[int, int]]:
+        """Paso 1: copiar al archivo el próximo lote del mes y confirmarlo; (primer id, último id)"""
+        self._preparar_conexion(conn)
+        self._attach(conn, mes, crear=True)
+        try:
+            comprimido = conn.execute(
+                "SELECT valor FROM archivo.archivo_info WHERE clave = 'compresion'"
+            ).fetchall()[0][0] == "zstd"
+            if comprimido and zstandard is None:
+                raise RuntimeError(f"El archivo {mes} está comprimido con zstd y no está instalado")
+            nombres = [c for c, _ in self.columnas(conn)]
+            texto = set(self.columnas_texto(conn))
+            seleccion = ", ".join(
+                f"comprimir({self._valor(conn, c)})" if comprimido and c in texto else self._valor(conn, c)
+                for c in nombres
+            )
+            lista = ", ".join(f'"{c}"' for c in nombres)
+            rango = (mes, _mes_siguiente(mes), corte)
+            ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM main.{TABLA} WHERE {_FILTRO} ORDER BY id LIMIT ?", (*rango, self.batch_size)
+            )]
+            if not ids:
+                return None
+            # BEGIN diferido: la transacción solo escribe el archivo del mes
+            self._en_transaccion(
+                conn, "BEGIN",
+                f"INSERT OR REPLACE INTO archivo.{TABLA} ({lista}) SELECT {seleccion} FROM main.{TABLA} "
+                f"WHERE id BETWEEN ? AND ? AND {_FILTRO}", (ids[0], ids[-1], *rango)
+            )
+            return ids[0], ids[-1]
+        finally:
+            conn.execute("DETACH DATABASE archivo")
+
+    def _borrar_lote(self, conn: sqlite3.Connection, mes: str, corte: str, primero: int, ultimo: int) -> int:
+        """Paso 2: borrar de la tabla caliente las filas del lote que ya están en el archivo"""
+        self._attach(conn, mes)
+        try:
+            return self._en_transaccion(
+                conn, "BEGIN IMMEDIATE",
+                f"DELETE FROM main.{TABLA} WHERE id BETWEEN ? AND ? AND {_FILTRO} "
+                f"AND id IN (SELECT id FROM archivo.{TABLA} WHERE id BETWEEN ? AND ?)",
+                (primero, ultimo, mes, _mes_siguiente(mes), corte, primero, ultimo)
+            )
+        finally:
+            conn.execute("DETACH DATABASE archivo")
+
+    def _purgar(self, conn: sqlite3.Connection) -> int:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            purgadas = purgar_huerfanas(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return purgadas
+
+    def archivar(self, corte: Optional[str] = None) -> Dict[str, int]:
+        """Mover las conversaciones anteriores al corte a sus archivos mensuales
+
+        Cada paso es un trabajo corto del escritor: entre lotes pasan las escrituras de la API.
+        Si otro proceso está archivando no hace nada.
+        """
+        if not self.cerrojo.tomar():
+            logger.info("Archivado en curso en otro proceso: se salta esta ronda")
+            return {}
+        corte = corte or self.corte()
+        movidas: Dict[str, int] = {}
+        purgadas = 0
+        try:
+            meses = self.escritor(lambda conn: [row[0] for row in conn.execute(
+                f"SELECT DISTINCT substr(timestamp, 1, 7) FROM {TABLA} WHERE timestamp < ? ORDER BY 1", (corte,)
+            )])
+            for mes in meses:
+                total = 0
+                while True:
+                    lote = self.escritor(lambda conn: self._copiar_lote(conn, mes, corte))
+                    if lote is None:
+                        break
+                    total += self.escritor(lambda conn: self._borrar_lote(conn, mes, corte, *lote))
+                movidas[mes] = total
+            if movidas and self._deduplicada:
+                # Los meses archivados ya tienen el texto resuelto
+                purgadas = self.escritor(self._purgar)
+        finally:
+            self.cerrojo.soltar()
+        if movidas:
+            logger.info(f"Conversaciones archivadas: {sum(movidas.values())} en {len(movidas)} meses, "
+                        f"{purgadas} respuestas sin referencias borradas")
+        return movidas
+
+    # --- Búsqueda y exportación -----------------------------------------------
+
+    def _meses_en_rango(self, desde: Optional[str], hasta: Optional[str]) -> List[str]:
+        """Meses archivados que se solapan con [desde, hasta], del más nuevo al más viejo"""
+        return [
+            mes for mes in reversed(self.meses_archivados())
+            if (not desde or _mes_siguiente(mes) > desde[:7]) and (not hasta or mes <= hasta[:7])
+        ]
+
+    def _consulta(self, conn, esquema: str, desde, hasta, texto, sesion) -> Tuple[str, list]:
+        nombres = [c for c, _ in self.columnas(conn)]
+        columnas_texto = self.columnas_texto(conn)
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append("timestamp >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append("timestamp <= ?")
+            parametros.append(hasta)
+        if sesion:
+            condiciones.append(f'"{self.columna_sesion(conn)}" = ?')
+            parametros.append(sesion)
+        if texto:
+            # En archivos comprimidos el texto se descomprime antes del LIKE
+            campos = [f'descomprimir("{c}")' if esquema == "archivo" and zstandard
+                      else f'"{c}"' if esquema == "archivo" else self._valor(conn, c) for c in columnas_texto]
+            condiciones.append("(" + " OR ".join(f"{campo} LIKE ?" for campo in campos) + ")")
+            parametros.extend([f"%{texto}%"] * len(campos))
+        donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        lista = ", ".join(f'"{c}"' if esquema == "archivo" else f'{self._valor(conn, c)} AS "{c}"' for c in nombres)
+        return f"SELECT {lista} FROM {esquema}.{TABLA} {donde} ORDER BY timestamp DESC, id DESC", parametros
+
+    def iterar(self, desde: Optional[str] = None, hasta: Optional[str] = None, texto: Optional[str] = None,
+               sesion: Optional[str] = None, limite: Optional[int] = None) -> Iterator[Dict]:
+        """Conversaciones del rango, más nuevas primero; solo abre los archivos necesarios"""
+        conn = self.connect()
+        self._preparar_conexion(conn)
+        conn.row_factory = sqlite3.Row
+        restantes = limite
+        try:
+            origenes = [("main", None)] + [("archivo", mes) for mes in self._meses_en_rango(desde, hasta)]
+            for esquema, mes in origenes:
+                if mes and not self._attach(conn, mes):
+                    continue
+                try:
+                    sql, parametros = self._consulta(conn, esquema, desde, hasta, texto, sesion)
+                    if restantes is not None:
+                        sql, parametros = f"{sql} LIMIT ?", [*parametros, restantes]
+                    cursor = conn.execute(sql, parametros)
+                    try:
+                        for row in cursor:
+                            fila = {k: _descomprimir(row[k]) for k in row.keys()}
+                            fila["archivado"] = mes is not None
+                            yield fila
+                            if restantes is not None:
+                                restantes -= 1
+                    finally:
+                        cursor.close()
+                finally:
+                    if mes:
+                        conn.execute("DETACH DATABASE archivo")
+                if restantes is not None and restantes <= 0:
+                    return
+        finally:
+            conn.close()
+
+    def buscar(self, **kwargs) -> List[Dict]:
+        return list(self.iterar(**kwargs))
+
+
+def filas_csv(filas: Iterator[Dict]) -> Iterator[str]:
+    """Serializar conversaciones como CSV, una línea por fila (para StreamingResponse)"""
+    buffer = io.StringIO()
+    escritor = None
+    for fila in filas:
+        if escritor is None:
+            escritor = csv.DictWriter(buffer, fieldnames=list(fila))
+            escritor.writeheader()
+        escritor.writerow(fila)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class ArchiveScheduler:
+    """Archivado periódico en segundo plano"""
+
+    def __init__(self, archivo: ArchivoConversaciones, interval_hours: float = ARCHIVE_INTERVAL_HOURS):
+        self.archivo = archivo
+        self.interval = interval_hours * 3600
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await asyncio.to_thread(self.archivo.init_schema)
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.archivo.archivar)
+            except Exception as e:
+                logger.error(f"Archivado de conversaciones falló: {e}")
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archivar conversaciones viejas en bases mensuales")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "data/tesla.db"))
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="Antigüedad mínima en días")
+    parser.add_argument("--dir", default=ARCHIVE_DIR, help="Directorio de los archivos mensuales")
+    parser.add_argument("--no-compress", action="store_true", help="Guardar el texto sin comprimir")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    archivo = ArchivoConversaciones(lambda: sqlite3.connect(args.db), args.db, args.dir, args.days,
+                                    compress=not args.no_compress)
+    archivo.init_schema()
+    movidas = archivo.archivar()
+    for mes, total in movidas.items():
+        print(f"📦 {mes}: {total} conversaciones -> {archivo.ruta_mes(mes)}")
+    print(f"✅ {sum(movidas.values())} conversaciones archivadas")
@@ -0,0 +1,267 @@
+"""
+Backups en línea de tesla.db sin bloquear a los escritores.
+
+Copiar el archivo mientras la API escribe da una copia corrupta. Aquí se usa
+la API de backup en línea de SQLite en un solo paso: la base corre en modo
+WAL, donde la copia es un lector más y no bloquea a los escritores. Copiar
+por pasos no sirve en WAL: cada escritura de otra conexión reinicia la copia
+desde el principio, y con la API escribiendo sin parar nunca terminaría.
+Cada snapshot se verifica (quick_check) y se guarda junto a su checksum
+SHA-256 (formato sha256sum).
+
+Con `uvicorn --workers N` cada worker arranca un BackupScheduler; solo el que
+tiene el cerrojo `.backup.lock` del directorio de backups (file_lock.py) crea
+snapshots, así hay uno por intervalo y la retención cubre
+BACKUP_RETENTION intervalos.
+
+Uso:
+    python backup.py crear --db data/tesla.db
+    python backup.py listar --db data/tesla.db
+    python backup.py verificar data/backups/tesla-20240101-120000-000.db
+    python backup.py restaurar data/backups/tesla-20240101-120000-000.db --db data/tesla.db
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from file_lock import Cerrojo
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR")  # por defecto: <directorio de la DB>/backups
+BACKUP_INTERVAL_MINUTES = float(os.getenv("BACKUP_INTERVAL_MINUTES", "60"))
+BACKUP_RETENTION = int(os.getenv("BACKUP_RETENTION", "24"))
+
+
+def directorio_backups(db_path: str) -> Path:
+    return Path(BACKUP_DIR) if BACKUP_DIR else Path(db_path).resolve().parent / "backups"
+
+
+def sha256_archivo(ruta: Path) -> str:
+    digest = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+
+def firma_db(db_path: str) -> Tuple:
+    """Tamaño y mtime de la base y su WAL, para saltar snapshots sin cambios"""
+    firma = []
+    for sufijo in ("", "-wal"):
+        try:
+            st = os.stat(db_path + sufijo)
+            firma.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            firma.append(None)
+    return tuple(firma)
+
+
+def _copiar(origen: sqlite3.Connection, destino: sqlite3.Connection) -> Dict:
+    """Copiar en un solo paso; devuelve estadísticas de la copia"""
+    modo = origen.execute("PRAGMA journal_mode").fetchone()[0].lower()
+    if modo != "wal":
+        # Fuera de WAL (solo desde la CLI) la copia retiene el lock compartido hasta terminar
+        logger.warning(f"Base en modo {modo}: los escritores esperan hasta que termine la copia")
+    paginas = 0
+
+    def progreso(status, remaining, total):
+        nonlocal paginas
+        paginas = total
+
+    origen.backup(destino, pages=-1, progress=progreso)
+    return {"paginas": paginas}
+
+
+def _integridad(ruta: Path) -> Tuple[bool, str]:
+    conn = sqlite3.connect(Path(ruta).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        resultado = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    return resultado == "ok", resultado
+
+
+def verificar_backup(ruta: Path) -> Tuple[bool, str]:
+    """Comprobar checksum e integridad de un snapshot"""
+    ruta = Path(ruta)
+    checksum = ruta.with_name(ruta.name + ".sha256")
+    if not ruta.exists():
+        return False, "no existe"
+    if not checksum.exists():
+        return False, "falta el archivo .sha256"
+    esperado = checksum.read_text(encoding="utf-8").split()[0]
+    if sha256_archivo(ruta) != esperado:
+        return False, "checksum no coincide"
+
+    return _integridad(ruta)
+
+
+def crear_backup(db_path: str, destino_dir: Optional[Path] = None, etiqueta: str = "") -> Dict:
+    """Crear un snapshot verificado de la base; devuelve sus metadatos"""
+    destino_dir = Path(destino_dir or directorio_backups(db_path))
+    destino_dir.mkdir(parents=True, exist_ok=True)
+    ahora = datetime.now()
+    nombre = f"{Path(db_path).stem}-{ahora:%Y%m%d-%H%M%S}-{ahora.microsecond // 1000:03d}{etiqueta}.db"
+    final = destino_dir / nombre
+    temporal = destino_dir / (nombre + ".tmp")
+
+    inicio = time.perf_counter()
+    origen = sqlite3.connect(db_path)
+    destino = sqlite3.connect(temporal)
+    try:
+        stats = _copiar(origen, destino)
+    finally:
+        destino.close()
+        origen.close()
+
+    ok, motivo = _integridad(temporal)
+    if not ok:
+        temporal.unlink(missing_ok=True)
+        raise RuntimeError(f"Snapshot inválido de {db_path}: {motivo}")
+
+    digest = sha256_archivo(temporal)
+    os.replace(temporal, final)
+    final.with_name(final.name + ".sha256").write_text(f"{digest}  {final.name}\n", encoding="utf-8")
+
+    info = {
+        "ruta": str(final),
+        "sha256": digest,
+        "bytes": final.stat().st_size,
+        "duracion_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        **stats,
+    }
+    logger.info(f"Backup creado: {final.name} ({info['bytes']} bytes, {info['paginas']} páginas, "
+                f"{info['duracion_ms']} ms)")
+    return info
+
+
+def listar_backups(db_path: str, destino_dir: Optional[Path] = None) -> List[Path]:
+    """Snapshots de la base, del más nuevo al más viejo"""
+    destino_dir = Path(destino_dir or directorio_backups(db_path))
+    if not destino_dir.is_dir():
+        return []
+    return sorted(destino_dir.glob(f"{Path(db_path).stem}-*.db"), reverse=True)
+
+
+def aplicar_retencion(db_path: str, conservar: int = BACKUP_RETENTION,
+                      destino_dir: Optional[Path] = None) -> List[Path]:
+    """Borrar los snapshots más viejos; devuelve los eliminados"""
+    eliminados = listar_backups(db_path, destino_dir)[conservar:]
+    for ruta in eliminados:
+        ruta.unlink(missing_ok=True)
+        ruta.with_name(ruta.name + ".sha256").unlink(missing_ok=True)
+    return eliminados
+
+
+def restaurar_backup(ruta: Path, db_path: str) -> Dict:
+    """Verificar un snapshot y copiarlo sobre la base (guarda antes la base actual)"""
+    ok, motivo = verificar_backup(ruta)
+    if not ok:
+        raise RuntimeError(f"No se restaura {ruta}: {motivo}")
+
+    previo = None
+    if os.path.exists(db_path):
+        previo = crear_backup(db_path, etiqueta="-prerestore")["ruta"]
+
+    origen = sqlite3.connect(Path(ruta).resolve().as_uri() + "?mode=ro", uri=True)
+    destino = sqlite3.connect(db_path)
+    try:
+        # La API de backup toma los locks necesarios en la base viva; en un paso nadie ve una base a medias
+        origen.backup(destino)
+    finally:
+        destino.close()
+        origen.close()
+    logger.info(f"Base {db_path} restaurada desde {ruta}")
+    return {"restaurado": str(ruta), "respaldo_previo": previo}
+
+
+class BackupScheduler:
+    """Snapshots periódicos en segundo plano con retención, de un solo worker a la vez"""
+
+    def __init__(self, db_path: str, interval_minutes: float = BACKUP_INTERVAL_MINUTES,
+                 retention: int = BACKUP_RETENTION):
+        self.db_path = db_path
+        self.interval = interval_minutes * 60
+        self.retention = retention
+        self._task: Optional[asyncio.Task] = None
+        self._ultima_firma = None
+        self.ultimo: Optional[Dict] = None
+        self.fallidos = 0
+        # Elección de líder: se retiene entre rondas y el sistema lo libera si el worker muere
+        self.cerrojo = Cerrojo(directorio_backups(db_path) / ".backup.lock")
+
+    async def start(self):
+        if self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Backups de {self.db_path} cada {self.interval / 60:g} min, se conservan {self.retention}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.cerrojo.soltar()
+
+    async def run_once(self) -> Optional[Dict]:
+        """Crear un snapshot si la base cambió desde el último y este worker es el líder"""
+        lider = self.cerrojo.tomado
+        if not self.cerrojo.tomar():
+            return None
+        if not lider:
+            logger.info(f"Este worker (pid {os.getpid()}) crea los backups de {self.db_path}")
+        firma = firma_db(self.db_path)
+        if firma == self._ultima_firma or firma[0] is None:
+            return None
+        try:
+            self.ultimo = await asyncio.to_thread(crear_backup, self.db_path)
+            self._ultima_firma = firma
+            await asyncio.to_thread(aplicar_retencion, self.db_path, self.retention)
+        except Exception as e:
+            self.fallidos += 1
+            logger.error(f"Backup de {self.db_path} falló: {e}")
+            return None
+        return self.ultimo
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.run_once()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Backups en línea de la base SQLite")
+    parser.add_argument("accion", choices=("crear", "listar", "verificar", "restaurar"))
+    parser.add_argument("snapshot", nargs="?", help="Snapshot a verificar o restaurar")
+    parser.add_argument("--db", default=os.getenv("DATABASE_PATH", "data/tesla.db"))
+    parser.add_argument("--dir", type=Path, help="Directorio de backups")
+    parser.add_argument("--retention", type=int, default=BACKUP_RETENTION)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.accion == "crear":
+        info = crear_backup(args.db, args.dir)
+        borrados = aplicar_retencion(args.db, args.retention, args.dir)
+        print(f"✅ {info['ruta']} sha256={info['sha256'][:12]}… ({len(borrados)} snapshots viejos eliminados)")
+    elif args.accion == "listar":
+        for ruta in listar_backups(args.db, args.dir):
+            print(f"{ruta}  {ruta.stat().st_size} bytes")
+    elif not args.snapshot:
+        parser.error(f"'{args.accion}' necesita la ruta del snapshot")
+    elif args.accion == "verificar":
+        ok, motivo = verificar_backup(Path(args.snapshot))
+        print(f"{'✅' if ok else '❌'} {args.snapshot}: {motivo}")
+        sys.exit(0 if ok else 1)
+    else:
+        resultado = restaurar_backup(Path(args.snapshot), args.db)
+        print(f"✅ Restaurado. Copia previa: {resultado['respaldo_previo']}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Impacto de los backups en línea sobre la latencia de la API.
+
+Ejecuta el mismo escenario dos veces sobre una base con datos de relleno:
+sin backups y con backups continuos (un snapshot tras otro, el peor caso de
+BackupScheduler), y compara p50/p95/p99.
+
+Ejemplo:
+  python benchmarks/backup_impact.py --app main --scenario mixed --filler-rows 50000
+"""
+import argparse
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import (BACKEND_DIR, ESCENARIOS, cargar_app, ciclo_de_vida,  # noqa: E402
+                       crear_cliente, ejecutar_escenario, percentil)
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+import backup  # noqa: E402
+
+DB_PATHS = {"main": "data/tesla.db", "app": "backend/data/tesla.db"}
+
+
+def rellenar(db_path: str, filas: int):
+    """Agregar conversaciones de relleno para que la copia tenga un tamaño realista"""
+    conn = sqlite3.connect(db_path)
+    try:
+        columnas = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+        texto = "consulta de relleno para el benchmark de backups " * 4
+        if "session_id" in columnas:
+            sql = "INSERT INTO conversations (session_id, user_message, bot_response) VALUES (?, ?, ?)"
+        else:
+            sql = "INSERT INTO conversations (user_id, message, response) VALUES (?, ?, ?)"
+        conn.executemany(sql, ((f"relleno-{i % 500}", texto, texto) for i in range(filas)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class BackupContinuo(threading.Thread):
+    """Hilo que encadena snapshots mientras corre el escenario"""
+
+    def __init__(self, db_path: str, destino: Path):
+        super().__init__(daemon=True)
+        self.db_path, self.destino = db_path, destino
+        self.detener = threading.Event()
+        self.duraciones = []
+
+    def run(self):
+        while not self.detener.is_set():
+            info = backup.crear_backup(self.db_path, self.destino)
+            self.duraciones.append(info["duracion_ms"])
+            backup.aplicar_retencion(self.db_path, 2, self.destino)
+
+
+async def _medir(module, args, db_path: str):
+    resultados = {}
+    async with ciclo_de_vida(module), crear_cliente(module) as client:
+        rellenar(db_path, args.filler_rows)
+        tamano = Path(db_path).stat().st_size
+        print(f"Base de {tamano / 1024 / 1024:.1f} MB, escenario {args.app}:{args.scenario}, "
+              f"{args.requests} requests x {args.concurrency}\n")
+
+        for nombre, con_backup in (("sin backup", False), ("backup continuo", True)):
+            hilo = None
+            if con_backup:
+                hilo = BackupContinuo(db_path, Path(db_path).parent / "bench_backups")
+                hilo.start()
+                time.sleep(0.05)
+            resultado = await ejecutar_escenario(client, args.app, args.scenario,
+                                                 args.requests, args.concurrency, args.seed)
+            if hilo:
+                hilo.detener.set()
+                await asyncio.to_thread(hilo.join)
+                resultado["backups"] = len(hilo.duraciones)
+                resultado["backup_p50_ms"] = round(percentil(hilo.duraciones, 50), 1)
+            resultados[nombre] = resultado
+    return resultados
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Impacto de los backups en la latencia de la API")
+    parser.add_argument("--app", choices=sorted(ESCENARIOS), default="main")
+    parser.add_argument("--scenario", default="mixed")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--filler-rows", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    module = cargar_app(args.app, ai_latency_ms=-1)
+    resultados = asyncio.run(_medir(module, args, DB_PATHS[args.app]))
+
+    print(f"{'modo':<20}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'err':>6}{'backups':>9}{'dur p50':>9}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:<20}{r['rps']:>8.1f}{r['p50_ms']:>8.2f}{r['p95_ms']:>8.2f}{r['p99_ms']:>8.2f}"
+              f"{r['errores']:>6}{r.get('backups', '-'):>9}{r.get('backup_p50_ms', '-'):>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Latencia y cobertura de las respuestas de FAQ (retrieval.py).
+
+Arma el mismo corpus que cada backend, consulta mensajes de ejemplo y
+reporta p50/p99 por consulta, cuántos se responden localmente y con qué
+entrada, para ajustar FAQ_MIN_SCORE y FAQ_MIN_MARGIN.
+
+Ejemplo:
+  python benchmarks/faq_retrieval.py --app app --iterations 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import BACKEND_DIR, percentil  # noqa: E402
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from retrieval import FAQ_GENERALES, MotorFAQ, entradas_conocimiento  # noqa: E402
+
+MENSAJES = [
+    "cuánto cuesta el itse para un restaurante",
+    "que documentos piden para el certificado itse",
+    "la visita tecnica es gratis?",
+    "cuanto cobran por punto electrico residencial",
+    "precio del paquete premium de domotica",
+    "plan de mantenimiento mensual",
+    "cuanto cuesta un pozo a tierra para mi casa",
+    "cuánto demora el trámite itse",
+    "tienen plan anual de mantenimiento?",
+    "necesito instalar cables en mi oficina",
+    "itse",
+    "hola buenas tardes",
+]
+
+
+def construir_motor(app: str) -> MotorFAQ:
+    if app == "main":
+        from main import motor_faq
+        return motor_faq
+    from app import KNOWLEDGE_BASE
+    return MotorFAQ(FAQ_GENERALES + entradas_conocimiento(KNOWLEDGE_BASE))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Latencia de las respuestas de FAQ")
+    parser.add_argument("--app", choices=("main", "app"), default="app")
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    motor = construir_motor(args.app)
+    print(f"Índice: {len(motor.entradas)} respuestas, {motor.matriz.shape[0]} preguntas, "
+          f"{len(motor.vocabulario)} términos en {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+
+    print(f"{'mensaje':<48}{'entrada':<26}{'score':>7}{'margen':>8}")
+    for mensaje in MENSAJES:
+        resultado = motor.responder(mensaje)
+        if resultado:
+            print(f"{mensaje:<48}{resultado.entrada.id:<26}{resultado.score:>7.3f}{resultado.margen:>8.3f}")
+        else:
+            print(f"{mensaje:<48}{'(reglas / LLM)':<26}")
+
+    tiempos = []
+    for i in range(args.iterations):
+        mensaje = MENSAJES[i % len(MENSAJES)]
+        t = time.perf_counter()
+        motor.responder(mensaje)
+        tiempos.append((time.perf_counter() - t) * 1e6)
+    respondidos = sum(motor.responder(m) is not None for m in MENSAJES)
+    print(f"\n{respondidos}/{len(MENSAJES)} respondidos localmente; por consulta "
+          f"p50 {percentil(tiempos, 50):.1f} µs, p99 {percentil(tiempos, 99):.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Precisión y latencia de la corrección de tipeos en intenciones (fuzzy_match.py).
+
+Compara la intención que detectan las reglas de cada backend sobre el mensaje
+tal cual y sobre el mensaje corregido, para un corpus con errores de tipeo y
+otro de mensajes bien escritos que no deben cambiar de intención. Reporta
+aciertos, falsos positivos y p50/p99 de corregir() en frío (caché vacía) y
+con caché.
+
+Ejemplo:
+  python benchmarks/fuzzy_intents.py --app main --iterations 20000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import BACKEND_DIR, percentil  # noqa: E402
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+# (mensaje, intención esperada); None = saludo genérico
+TIPEOS = {
+    "main": [
+        ("necesito matenimiento para mi local", "mantenimiento"),
+        ("mantenimieto preventivo", "mantenimiento"),
+        ("reparasion de un corto", "mantenimiento"),
+        ("poso a tiera para mi casa", "pozo_tierra"),
+        ("aterramiento de equipos", "pozo_tierra"),
+        ("sertificado de defensa civil", "itse"),
+        ("necesito un certifcado", "itse"),
+        ("lisencia de funcionamiento", "itse"),
+        ("sistema contra insendios", "incendios"),
+        ("estintor para mi negocio", "incendios"),
+        ("tavlero general", "tableros"),
+        ("materales para obra", "suministros"),
+        ("sumnistro electrico", "suministros"),
+        ("presio del servicio", "precio"),
+        ("tarfa por visita", "precio"),
+    ],
+    "app": [
+        ("sertificado para restaurante", "itse"),
+        ("inspecion tecnica de mi local", "itse"),
+        ("instalacion electrica nueva", "installation"),
+        ("instalasion de tomacorrientes", "installation"),
+        ("cablado nuevo", "installation"),
+        ("domotika para mi casa", "automation"),
+        ("automatisacion del hogar", "automation"),
+        ("matenimiento de tableros", "maintenance"),
+        ("reparasion urgente", "maintenance"),
+        ("presio por punto", "price"),
+        ("cotisacion de un proyecto", "price"),
+    ],
+}
+
+CORRECTOS = [
+    ("hola buenas tardes", None),
+    ("quiero saber un poco mas", None),
+    ("en que calles atienden", None),
+    ("tienen tienda en lima", None),
+    ("cuanto tiempo demoran", None),
+    ("me pueden llamar mañana", None),
+    ("cual es su horario de atencion", None),
+    ("tengo una consulta sobre mi cuenta", None),
+    ("gracias por la informacion", None),
+    ("trabajan los sabados", None),
+]
+
+
+def detector(app: str):
+    """(corrector, función mensaje -> intención) con las reglas de cada backend"""
+    if app == "main":
+        from main import PALABRAS_PRECIO, PALABRAS_SERVICIO, corrector_intenciones
+
+        def intencion(texto: str):
+            for servicio, palabras in PALABRAS_SERVICIO.items():
+                if any(word in texto for word in palabras):
+                    return servicio.value
+            return "precio" if any(word in texto for word in PALABRAS_PRECIO) else None
+        return corrector_intenciones, intencion
+
+    from app import PALABRAS_INTENCION, ai_service
+
+    def intencion(texto: str):
+        return next((nombre for nombre, palabras in PALABRAS_INTENCION.items()
+                     if any(word in texto for word in palabras)), None)
+    return ai_service.corrector, intencion
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Corrección de tipeos en intenciones")
+    parser.add_argument("--app", choices=("main", "app"), default="main")
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    corrector, intencion = detector(args.app)
+    corpus = TIPEOS[args.app] + CORRECTOS
+    print(f"Vocabulario: {len(corrector.vocabulario)} palabras, {len(corrector.indice)} trigramas\n")
+
+    print(f"{'mensaje':<38}{'esperada':<15}{'sin corregir':<15}{'corregido':<15}")
+    antes = despues = falsos = 0
+    for mensaje, esperada in corpus:
+        original = intencion(mensaje.lower())
+        corregida = intencion(corrector.corregir(mensaje))
+        antes += original == esperada
+        despues += corregida == esperada
+        falsos += esperada is None and corregida is not None
+        marca = "" if corregida == esperada else "  ✗"
+        print(f"{mensaje:<38}{str(esperada):<15}{str(original):<15}{str(corregida):<15}{marca}")
+
+    mensajes = [mensaje for mensaje, _ in corpus]
+    frio = []
+    for i in range(min(args.iterations, 2000)):
+        corrector.palabra_clave.cache_clear()
+        t = time.perf_counter()
+        corrector.corregir(mensajes[i % len(mensajes)])
+        frio.append((time.perf_counter() - t) * 1e6)
+    cache = []
+    for i in range(args.iterations):
+        t = time.perf_counter()
+        corrector.corregir(mensajes[i % len(mensajes)])
+        cache.append((time.perf_counter() - t) * 1e6)
+
+    print(f"\nAciertos: {antes}/{len(corpus)} sin corregir, {despues}/{len(corpus)} corregido; "
+          f"falsos positivos {falsos}/{len(CORRECTOS)}")
+    print(f"corregir() por mensaje: en frío p50 {percentil(frio, 50):.1f} µs, p99 {percentil(frio, 99):.1f} µs; "
+          f"con caché p50 {percentil(cache, 50):.1f} µs, p99 {percentil(cache, 99):.1f} µs")
+    return 0 if falsos == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
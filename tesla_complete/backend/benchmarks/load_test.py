@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga para el backend de Tesla Electricidad.
+
+Modos:
+  - En proceso (por defecto): importa main.py o app.py y usa un cliente ASGI
+    con proveedores de IA y WhatsApp simulados, sin salir a la red.
+  - HTTP: apunta a un backend ya levantado con --url.
+
+Ejemplos:
+  python benchmarks/load_test.py --app main --scenario mixed
+  python benchmarks/load_test.py --app app --url http://localhost:8000
+  python benchmarks/load_test.py --app main --save-baseline
+
+Cada escenario corre --repeat veces y se reporta y compara la mediana de
+cada métrica: una sola corrida es demasiado ruidosa para el baseline.
+"""
+import argparse
+import asyncio
+import functools
+import importlib
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+CHAT_MESSAGES = [
+    "hola",
+    "necesito el certificado itse para mi restaurante",
+    "cuanto cuesta un pozo a tierra",
+    "precio itse restaurante",
+    "quiero mantenimiento preventivo para mi oficina",
+    "instalación eléctrica para una casa",
+    "automatización de luces y cámaras",
+    "tienen extintores y sistema contra incendios?",
+    "precio de tableros eléctricos",
+    "cotización para 120 m2 comercio en Huancayo",
+]
+TIPOS_NEGOCIO = ["residencial", "comercial", "industrial", "oficina", "restaurante"]
+SERVICIOS_MAIN = ["itse", "pozo_tierra", "mantenimiento", "incendios", "tableros", "suministros"]
+SERVICIOS_APP = ["itse", "instalaciones", "automatizacion", "mantenimiento"]
+# Métricas del pool de lectores/escritor (database.py) y parámetro para reiniciarlas
+METRICAS_POOL = {"main": ("/api/db/metricas", "reiniciar"), "app": ("/api/db/metrics", "reset")}
+# Métricas que se combinan por mediana entre corridas y se guardan en el baseline
+METRICAS_BASELINE = ("rps", "p50_ms", "p95_ms", "p99_ms", "errores")
+
+
+class DBStats:
+    """Tiempos de escrituras/commits SQLite (incluyen esperas por bloqueo)"""
+
+    def __init__(self):
+        self.write_ms: List[float] = []
+        self.locked = 0
+
+    def reset(self):
+        self.write_ms = []
+        self.locked = 0
+
+
+db_stats = DBStats()
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        escritura = not sql.lstrip().upper().startswith("SELECT")
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                db_stats.locked += 1
+            raise
+        finally:
+            if escritura:
+                db_stats.write_ms.append((time.perf_counter() - inicio) * 1000)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        except sqlite3.OperationalError as e:
+            if "locked" in str(e):
+                db_stats.locked += 1
+            raise
+        finally:
+            db_stats.write_ms.append((time.perf_counter() - inicio) * 1000)
+
+
+def _instalar_stubs(module, ai_latency_ms: float):
+    """Reemplazar proveedores externos por simulaciones con latencia fija"""
+    ai_service = getattr(module, "ai_service", None)
+    if ai_service is not None and ai_latency_ms >= 0:
+        async def _stub_response(message, prompt):
+            await asyncio.sleep(ai_latency_ms / 1000)
+            return {
+                "response": f"[stub] Respuesta simulada para: {message}",
+                "source": "stub",
+                "stage": "conversation",
+                "prompt_tokens": prompt["prompt_tokens"],
+                "usage": {"prompt_tokens": prompt["prompt_tokens"], "completion_tokens": 60},
+            }
+
+        ai_service.openai_available = True
+        ai_service.gemini_available = False
+        ai_service._openai_response = _stub_response
+
+    whatsapp_service = getattr(module, "whatsapp_service", None)
+    if whatsapp_service is not None:
+        whatsapp_service.twilio_available = False
+
+
+_workdir = None
+
+
+def cargar_app(nombre: str, ai_latency_ms: float = 50.0):
+    """Importar main.py/app.py en un directorio temporal con stubs instalados"""
+    global _workdir
+    # main.py y app.py usan rutas relativas: un único directorio por proceso
+    if _workdir is None:
+        _workdir = tempfile.mkdtemp(prefix="tesla_bench_")
+        os.chdir(_workdir)
+    for var in ("OPENAI_API_KEY", "GEMINI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN"):
+        os.environ.pop(var, None)
+    # Todo el tráfico sale del mismo cliente: medir sin el limitador ni el presupuesto de tokens
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    os.environ["USAGE_SESSION_DAILY_TOKENS"] = "0"
+    os.environ["USAGE_IP_DAILY_TOKENS"] = "0"
+    os.environ["USAGE_DAILY_USD"] = "0"
+
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    if not isinstance(sqlite3.connect, functools.partial):
+        sqlite3.connect = functools.partial(sqlite3.connect, factory=TimedConnection)
+
+    module = importlib.import_module(nombre)
+    # Los logs por request distorsionan la medición
+    logging.getLogger().setLevel(logging.WARNING)
+    _instalar_stubs(module, ai_latency_ms)
+    return module
+
+
+@asynccontextmanager
+async def ciclo_de_vida(module):
+    """Ejecutar los eventos startup/shutdown (init de DB, pipelines) en modo en proceso"""
+    if module is None:
+        yield
+        return
+    await module.app.router.startup()
+    try:
+        yield
+    finally:
+        await module.app.router.shutdown()
+
+
+def crear_cliente(module=None, url: Optional[str] = None) -> httpx.AsyncClient:
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=30.0,
+                                 limits=httpx.Limits(max_connections=200, max_keepalive_connections=100))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app), base_url="http://bench", timeout=30.0)
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por rango más cercano"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+
+def resumir(latencias: List[float], errores: int, duracion: float) -> Dict:
+    return {
+        "requests": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(percentil(latencias, 50), 2),
+        "p95_ms": round(percentil(latencias, 95), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Operaciones
+# ---------------------------------------------------------------------------
+
+# Los RUC son únicos en la tabla leads: el contador no se reinicia entre
+# escenarios y arranca desde la hora actual para no chocar entre corridas
+_rucs = itertools.count(20000000000 + int(time.time() * 1000) % 10**9)
+
+
+def _siguiente_ruc() -> str:
+    return str(next(_rucs))
+
+
+def _fecha_laboral(rng: random.Random) -> str:
+    fecha = date.today() + timedelta(days=rng.randint(1, 30))
+    while fecha.weekday() >= 5:
+        fecha += timedelta(days=1)
+    return fecha.isoformat()
+
+
+async def op_chat(client, rng, ctx):
+    body = {"message": rng.choice(CHAT_MESSAGES)}
+    if ctx["app"] == "main":
+        body["session_id"] = f"bench_{rng.randrange(500)}"
+    else:
+        body["context"] = rng.choice([None] + SERVICIOS_APP)
+        body["history"] = []
+    return await client.post("/api/chat", json=body), (200,)
+
+
+async def op_lead(client, rng, ctx):
+    if ctx["app"] == "main":
+        ruc = _siguiente_ruc()
+        response = await client.post("/api/lead", json={
+            "nombre": f"Empresa Bench {ruc[-5:]}",
+            "ruc": ruc,
+            "telefono": f"9{rng.randrange(10**8):08d}",
+            "email": f"contacto{ruc[-6:]}@example.com",
+            "tipo_negocio": rng.choice(TIPOS_NEGOCIO),
+            "direccion": "Av. Giráldez 123, Huancayo",
+            "metraje": round(rng.uniform(30, 800), 1),
+            "licencia_funcionamiento": rng.random() < 0.5,
+            "servicio_interes": rng.choice(SERVICIOS_MAIN),
+        })
+        if response.status_code == 200:
+            ctx["lead_ids"].append(response.json()["lead_id"])
+        return response, (200,)
+
+    return await client.post("/api/contact", json={
+        "nombre": f"Cliente Bench {rng.randrange(10**5)}",
+        "telefono": f"9{rng.randrange(10**8):08d}",
+        "email": "cliente@example.com",
+        "servicio": rng.choice(SERVICIOS_APP),
+        "mensaje": "Solicito una visita técnica",
+    }), (200,)
+
+
+async def op_cita(client, rng, ctx):
+    # Un 400 por choque de horario es un resultado válido del negocio
+    return await client.post("/api/cita", json={
+        "lead_id": rng.choice(ctx["lead_ids"]),
+        "fecha_preferida": _fecha_laboral(rng),
+        "hora_preferida": f"{rng.randint(8, 17):02d}:{rng.choice((0, 30)):02d}",
+        "tipo_visita": "tecnica",
+        "urgencia": rng.choice(["baja", "media", "alta"]),
+    }), (200, 400)
+
+
+async def op_cotizacion(client, rng, ctx):
+    return await client.post("/api/cotizacion", json={
+        "lead_id": rng.choice(ctx["lead_ids"]),
+        "servicio": rng.choice(SERVICIOS_MAIN),
+        "metraje": round(rng.uniform(30, 800), 1),
+    }), (200,)
+
+
+async def op_leads_admin(client, rng, ctx):
+    return await client.get("/api/leads"), (200,)
+
+
+OPERACIONES = {
+    "chat": op_chat,
+    "lead": op_lead,
+    "cita": op_cita,
+    "cotizacion": op_cotizacion,
+    "leads_admin": op_leads_admin,
+}
+
+# Escenario -> pesos por operación, para cada aplicación
+ESCENARIOS = {
+    "main": {
+        "chat": {"chat": 1},
+        "leads": {"lead": 1},
+        "citas": {"cita": 1},
+        "cotizaciones": {"cotizacion": 1},
+        "mixed": {"chat": 60, "lead": 15, "cita": 15, "cotizacion": 10},
+    },
+    "app": {
+        "chat": {"chat": 1},
+        "leads": {"lead": 1},
+        "mixed": {"chat": 70, "lead": 20, "leads_admin": 10},
+    },
+}
+
+
+async def _preparar(client, ctx, rng, leads_iniciales: int = 20):
+    """Crear leads previos para los escenarios que los necesitan (main.py)"""
+    if ctx["app"] != "main":
+        return
+    for _ in range(leads_iniciales):
+        await op_lead(client, rng, ctx)
+    if not ctx["lead_ids"]:
+        raise RuntimeError("No se pudieron crear leads iniciales para el benchmark")
+
+
+async def ejecutar_escenario(client: httpx.AsyncClient, app_name: str, escenario: str,
+                             total: int, concurrencia: int, seed: int = 42) -> Dict:
+    """Ejecutar un escenario y devolver métricas agregadas y por operación"""
+    rng = random.Random(seed)
+    ctx = {"app": app_name, "lead_ids": []}
+    await _preparar(client, ctx, rng)
+    db_stats.reset()
+    ruta_pool, reiniciar = METRICAS_POOL[app_name]
+    await client.get(ruta_pool, params={reiniciar: "true"})
+
+    pesos = ESCENARIOS[app_name][escenario]
+    plan = rng.choices(list(pesos), weights=list(pesos.values()), k=total)
+    latencias: Dict[str, List[float]] = {nombre: [] for nombre in pesos}
+    errores: Dict[str, int] = {nombre: 0 for nombre in pesos}
+
+    async def worker():
+        while plan:
+            nombre = plan.pop()
+            inicio = time.perf_counter()
+            try:
+                response, esperados = await OPERACIONES[nombre](client, rng, ctx)
+                ok = response.status_code in esperados
+            except httpx.HTTPError:
+                ok = False
+            latencias[nombre].append((time.perf_counter() - inicio) * 1000)
+            if not ok:
+                errores[nombre] += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    todas = [lat for valores in latencias.values() for lat in valores]
+    resultado = resumir(todas, sum(errores.values()), duracion)
+    resultado["operaciones"] = {
+        nombre: resumir(latencias[nombre], errores[nombre], duracion) for nombre in pesos if latencias[nombre]
+    }
+    resultado["db"] = {
+        "escrituras": len(db_stats.write_ms),
+        "espera_total_ms": round(sum(db_stats.write_ms), 2),
+        "espera_p95_ms": round(percentil(db_stats.write_ms, 95), 2),
+        "espera_max_ms": round(max(db_stats.write_ms, default=0.0), 2),
+        "bloqueos": db_stats.locked,
+    }
+    response = await client.get(ruta_pool)
+    if response.status_code == 200:
+        pool = response.json()
+        resultado["pool"] = {rol: pool[rol] for rol in ("lectura", "escritura")}
+    return resultado
+
+
+def medianas(corridas: List[Dict]) -> Dict:
+    """Mediana de cada métrica entre corridas del mismo escenario; db y pool de la última"""
+    def combinar(resumenes: List[Dict]) -> Dict:
+        combinado = {metrica: round(statistics.median(r[metrica] for r in resumenes), 2)
+                     for metrica in METRICAS_BASELINE}
+        combinado["requests"] = resumenes[-1]["requests"]
+        return combinado
+
+    resultado = dict(corridas[-1], **combinar(corridas))
+    resultado["corridas"] = len(corridas)
+    resultado["operaciones"] = {
+        nombre: combinar([c["operaciones"][nombre] for c in corridas if nombre in c["operaciones"]])
+        for nombre in corridas[-1]["operaciones"]
+    }
+    return resultado
+
+
+def imprimir(clave: str, resultado: Dict):
+    print(f"\n📊 {clave}: {resultado['requests']} requests, {resultado['errores']} errores "
+          f"(mediana de {resultado.get('corridas', 1)} corridas)")
+    print(f"{'operación':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>9}")
+    filas = dict(resultado["operaciones"], total=resultado)
+    for nombre, datos in filas.items():
+        print(f"{nombre:<14}{datos['rps']:>10}{datos['p50_ms']:>10}{datos['p95_ms']:>10}"
+              f"{datos['p99_ms']:>10}{datos['errores']:>9}")
+    db = resultado["db"]
+    if db["escrituras"]:
+        print(f"🗄️  SQLite: {db['escrituras']} escrituras, espera total {db['espera_total_ms']} ms, "
+              f"p95 {db['espera_p95_ms']} ms, máx {db['espera_max_ms']} ms, bloqueos {db['bloqueos']}")
+    for rol, datos in resultado.get("pool", {}).items():
+        if datos["operaciones"]:
+            print(f"   {rol:<10} {datos['operaciones']} ops, espera p50 {datos['espera_p50_ms']} ms, "
+                  f"p95 {datos['espera_p95_ms']} ms, p99 {datos['espera_p99_ms']} ms, máx {datos['espera_max_ms']} ms, "
+                  f"uso p95 {datos['uso_p95_ms']} ms")
+
+
+def comparar_baseline(clave: str, resultado: Dict, baseline: Dict, tolerancia: float,
+                      margen_ms: float = 5.0) -> List[str]:
+    """Listar regresiones de las medianas frente al baseline guardado
+
+    Las latencias deben superar la tolerancia relativa y además el margen
+    absoluto, para que el jitter de pocos ms en p99 no cuente como regresión.
+    """
+    referencia = baseline.get(clave)
+    if not referencia:
+        return []
+    regresiones = []
+    if resultado["rps"] < referencia["rps"] * (1 - tolerancia):
+        regresiones.append(f"{clave}: req/s {resultado['rps']} < baseline {referencia['rps']}")
+    for metrica in ("p95_ms", "p99_ms"):
+        limite = max(referencia[metrica] * (1 + tolerancia), referencia[metrica] + margen_ms)
+        if resultado[metrica] > limite:
+            regresiones.append(f"{clave}: {metrica} {resultado[metrica]} > baseline {referencia[metrica]}")
+    if resultado["errores"] > referencia.get("errores", 0):
+        regresiones.append(f"{clave}: errores {resultado['errores']} > baseline {referencia.get('errores', 0)}")
+    return regresiones
+
+
+async def _main(args) -> int:
+    module = None if args.url else cargar_app(args.app, args.ai_latency_ms)
+    escenarios = list(ESCENARIOS[args.app]) if args.scenario == "all" else [args.scenario]
+    # Los números en proceso y por HTTP no son comparables entre sí
+    modo = "http" if args.url else "asgi"
+
+    resultados = {}
+    async with ciclo_de_vida(module), crear_cliente(module, args.url) as client:
+        for escenario in escenarios:
+            clave = f"{modo}:{args.app}:{escenario}"
+            corridas = [
+                await ejecutar_escenario(client, args.app, escenario, args.requests, args.concurrency, args.seed)
+                for _ in range(args.repeat)
+            ]
+            resultados[clave] = medianas(corridas)
+            if not args.json:
+                imprimir(clave, resultados[clave])
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if args.save_baseline:
+        for clave, resultado in resultados.items():
+            baseline[clave] = {k: resultado[k] for k in METRICAS_BASELINE}
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\n💾 Baseline guardado en {args.baseline}")
+        return 0
+
+    regresiones = []
+    for clave, resultado in resultados.items():
+        regresiones.extend(comparar_baseline(clave, resultado, baseline, args.tolerance, args.margin_ms))
+    for regresion in regresiones:
+        print(f"❌ Regresión: {regresion}")
+    return 1 if regresiones else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga del backend Tesla")
+    parser.add_argument("--app", choices=sorted(ESCENARIOS), default="main", help="Aplicación a medir")
+    parser.add_argument("--scenario", default="mixed", help="Escenario o 'all'")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Corridas por escenario; se reporta y compara la mediana")
+    parser.add_argument("--url", help="Medir un backend HTTP ya levantado en lugar del modo en proceso")
+    parser.add_argument("--ai-latency-ms", type=float, default=50.0,
+                        help="Latencia del proveedor IA simulado (negativo: usar reglas locales)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Tolerancia relativa frente al baseline")
+    parser.add_argument("--margin-ms", type=float, default=5.0,
+                        help="Margen absoluto de latencia antes de marcar regresión")
+    parser.add_argument("--json", action="store_true", help="Imprimir resultados en JSON")
+    args = parser.parse_args(argv)
+    args.baseline = args.baseline.resolve()
+    if args.repeat < 1:
+        parser.error("--repeat debe ser al menos 1")
+    if args.scenario != "all" and args.scenario not in ESCENARIOS[args.app]:
+        parser.error(f"Escenario '{args.scenario}' no disponible para {args.app}: {', '.join(ESCENARIOS[args.app])}")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(parse_args())))
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tamaño de la base y velocidad de inserción con respuestas deduplicadas.
+
+Guarda los mismos turnos de chat en dos bases SQLite nuevas, con el texto
+de la respuesta en línea (como antes) y con response_store.py (huella en
+conversations, texto una sola vez en responses), una transacción por turno
+como en /api/chat. Las respuestas salen de las reglas locales de la app
+elegida (process_chat_avanzado o _local_response) más una fracción de
+respuestas únicas (--unique), como las cotizaciones con montos o las del
+proveedor de IA; de varias corridas alternadas se toma la mejor. Al final
+migra la base en línea con `migrar()` y la compacta.
+
+Ejemplo:
+  python benchmarks/response_dedup.py --app main --turns 20000 --unique 0.1
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import BACKEND_DIR, cargar_app  # noqa: E402
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+from database import PoolSQLite  # noqa: E402
+from response_store import AlmacenRespuestas  # noqa: E402
+
+MENSAJES = [
+    "hola", "necesito certificado itse", "instalación eléctrica para mi casa", "automatización del hogar",
+    "mantenimiento de tableros", "precio", "cuánto cuesta", "quiero una cotización", "itse para restaurante",
+    "domótica", "cableado de oficina", "reparación urgente", "gracias",
+]
+
+DDL = """
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        user_message TEXT,
+        bot_response TEXT,
+        servicio_interes TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def respuestas_locales(nombre: str):
+    module = cargar_app(nombre)
+    if nombre == "main":
+        return [module.process_chat_avanzado(mensaje)[0] for mensaje in MENSAJES]
+    return [module.ai_service._local_response(mensaje, "")["response"] for mensaje in MENSAJES]
+
+
+def turnos(plantillas, cantidad: int, unicas: float, semilla: int):
+    rng = random.Random(semilla)
+    for i in range(cantidad):
+        mensaje = rng.choice(MENSAJES)
+        respuesta = rng.choice(plantillas)
+        if rng.random() < unicas:
+            respuesta = f"Con {rng.randint(30, 400)} m² tu cotización referencial es S/{rng.randint(300, 9000)}. " \
+                        f"{respuesta[:rng.randint(200, 800)]}"
+        yield f"sess-{i // 4}", mensaje, respuesta
+
+
+def tamano(ruta: Path) -> int:
+    conn = sqlite3.connect(ruta)
+    try:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return ruta.stat().st_size
+
+
+async def insertar(ruta: Path, filas, deduplicada: bool) -> float:
+    """Turnos por segundo, una transacción por turno"""
+    pool = PoolSQLite(str(ruta))
+    await pool.abrir()
+    almacen = AlmacenRespuestas(pool, "bot_response")
+
+    async def crear(tx):
+        await tx.ejecutar(DDL)
+        if deduplicada:
+            await almacen.init_schema(tx)
+    await pool.transaccion(crear)
+
+    async def en_linea(tx, sesion, mensaje, respuesta):
+        await tx.ejecutar("INSERT INTO conversations (session_id, user_message, bot_response) VALUES (?, ?, ?)",
+                          (sesion, mensaje, respuesta))
+
+    async def con_huella(tx, sesion, mensaje, respuesta):
+        clave = await almacen.guardar(tx, respuesta)
+        await tx.ejecutar("INSERT INTO conversations (session_id, user_message, response_hash) VALUES (?, ?, ?)",
+                          (sesion, mensaje, clave))
+
+    inicio = time.perf_counter()
+    for sesion, mensaje, respuesta in filas:
+        await pool.transaccion(con_huella if deduplicada else en_linea, sesion, mensaje, respuesta)
+    duracion = time.perf_counter() - inicio
+    await pool.cerrar()
+    return len(filas) / duracion
+
+
+async def migrar(ruta: Path):
+    pool = PoolSQLite(str(ruta))
+    await pool.abrir()
+    almacen = AlmacenRespuestas(pool, "bot_response")
+    await pool.transaccion(almacen.init_schema)
+    inicio = time.perf_counter()
+    migradas = await almacen.migrar()
+    duracion = time.perf_counter() - inicio
+    await pool.cerrar()
+    conn = sqlite3.connect(ruta)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return migradas, duracion
+
+
+async def _main(args) -> int:
+    plantillas = respuestas_locales(args.app)
+    filas = list(turnos(plantillas, args.turns, args.unique, args.seed))
+    texto = sum(len(respuesta.encode("utf-8")) for _, _, respuesta in filas)
+    print(f"{len(filas)} turnos, {len(set(plantillas))} plantillas de {args.app} "
+          f"(media {texto / len(filas):.0f} bytes por respuesta), {args.unique:.0%} únicas\n")
+
+    directorio = Path(tempfile.mkdtemp(prefix="tesla_dedup_"))
+    resultados = {}
+    # Corridas alternadas y la mejor de cada una: el escritor de SQLite es ruidoso entre corridas
+    for repeticion in range(args.repeat):
+        for nombre, deduplicada in (("en línea", False), ("deduplicada", True)):
+            ruta = directorio / f"{'dedup' if deduplicada else 'inline'}-{repeticion}.db"
+            por_segundo = await insertar(ruta, filas, deduplicada)
+            anterior = resultados.get(nombre, (0, 0.0))[1]
+            resultados[nombre] = (tamano(ruta), max(anterior, por_segundo))
+
+    print(f"{'almacenamiento':<16}{'MB':>8}{'bytes/turno':>13}{'turnos/s':>10}")
+    for nombre, (bytes_, por_segundo) in resultados.items():
+        print(f"{nombre:<16}{bytes_ / 1024 / 1024:>8.2f}{bytes_ / len(filas):>13.0f}{por_segundo:>10.0f}")
+    antes, despues = resultados["en línea"][0], resultados["deduplicada"][0]
+    print(f"\nReducción: {100 * (1 - despues / antes):.1f}%")
+
+    ruta = directorio / "inline-0.db"
+    migradas, duracion = await migrar(ruta)
+    print(f"Migración de la base en línea: {migradas} filas en {duracion:.2f} s "
+          f"({migradas / duracion:.0f} filas/s), {tamano(ruta) / 1024 / 1024:.2f} MB tras VACUUM")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Tamaño y velocidad de inserción con respuestas deduplicadas")
+    parser.add_argument("--app", choices=("main", "app"), default="main")
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--unique", type=float, default=0.1, help="Fracción de respuestas únicas")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas de inserción por almacenamiento")
+    parser.add_argument("--seed", type=int, default=42)
+    return asyncio.run(_main(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
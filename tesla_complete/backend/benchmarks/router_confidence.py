@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Decisiones del enrutador por confianza de app.py (routing.py).
+
+Para un corpus de mensajes que la regla local responde bien y otro de
+mensajes que necesitan al proveedor de IA, muestra la confianza y las
+señales de cada uno, cuántos quedarían locales, los escalados por error (o
+respondidos localmente por error) y p50/p99 de la decisión. Termina con
+código 1 si algún mensaje que necesita al proveedor se respondería local.
+
+Ejemplo:
+  python benchmarks/router_confidence.py --threshold 0.6
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import BACKEND_DIR, percentil  # noqa: E402
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+LOCALES = [
+    "precio itse restaurante",
+    "cuanto cuesta el certificado itse para mi restaurante de 80 m2",
+    "necesito itse para mi industria",
+    "itse para vivienda de 120 metros",
+    "precio de instalación eléctrica para mi casa",
+    "instalación eléctrica residencial precio por punto",
+    "cuánto cuesta la automatización del hogar",
+    "precio de domótica básica",
+    "plan de mantenimiento preventivo precio",
+    "precio mantenimiento de tableros",
+    "sertificado itse para restaurante",
+]
+ESCALAR = [
+    "hola",
+    "puedo conectar un generador a mi tablero si tengo paneles solares",
+    "mi llave térmica salta cada vez que prendo la terma, qué puede ser",
+    "el inspector de itse observó mi local por falta de señalética y extintores vencidos, qué hago",
+    "instalación eléctrica y mantenimiento para un edificio de 12 pisos con ascensores",
+    "tienen experiencia con clínicas y equipos de rayos x",
+    "cuanto cuesta",
+    "trabajan los domingos en la noche",
+]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Decisiones del enrutador por confianza")
+    parser.add_argument("--threshold", type=float, default=None, help="ROUTER_MIN_CONFIDENCE a evaluar")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args(argv)
+    if args.threshold is not None:
+        os.environ["ROUTER_MIN_CONFIDENCE"] = str(args.threshold)
+
+    from app import ai_service
+    from slots import extraer
+
+    router, corrector = ai_service.router, ai_service.corrector
+    print(f"Umbral: {router.umbral}\n")
+    print(f"{'mensaje':<60}{'esperado':<11}{'conf.':>6}  int  dat  rec  cob")
+    locales = falsos_locales = falsos_escalados = 0
+    for mensaje, esperado in [(m, "local") for m in LOCALES] + [(m, "proveedor") for m in ESCALAR]:
+        texto = corrector.corregir(mensaje)
+        decision = router.decidir(texto, extraer(texto))
+        locales += decision.local
+        falsos_locales += decision.local and esperado == "proveedor"
+        falsos_escalados += not decision.local and esperado == "local"
+        senales = "  ".join(f"{decision.senales.get(nombre, 0):.2f}"[1:] if decision.senales.get(nombre, 0) < 1
+                            else "1.0" for nombre in ("intencion", "datos", "recuperacion", "cobertura"))
+        marca = "" if decision.local == (esperado == "local") else "  ✗"
+        print(f"{mensaje[:58]:<60}{esperado:<11}{decision.confianza:>6.2f}  {senales}{marca}")
+
+    mensajes = [corrector.corregir(m) for m in LOCALES + ESCALAR]
+    tiempos = []
+    for i in range(args.iterations):
+        texto = mensajes[i % len(mensajes)]
+        t = time.perf_counter()
+        router.decidir(texto, extraer(texto))
+        tiempos.append((time.perf_counter() - t) * 1e6)
+
+    total = len(LOCALES) + len(ESCALAR)
+    print(f"\nLocales: {locales}/{total}; escalados de más {falsos_escalados}/{len(LOCALES)}, "
+          f"locales por error {falsos_locales}/{len(ESCALAR)}")
+    print(f"decidir() por mensaje: p50 {percentil(tiempos, 50):.1f} µs, p99 {percentil(tiempos, 99):.1f} µs")
+    return 0 if falsos_locales == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
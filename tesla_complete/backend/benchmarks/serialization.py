@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Costo de serialización y bytes transferidos para /api/chat, /api/servicios y /api/leads.
+
+Compara el JSONResponse estándar con ORJSONResponse y mide el tamaño de
+cada payload sin comprimir, con gzip y con Brotli, además de los bytes que
+realmente salen por la red a través de CompressionMiddleware.
+
+Ejemplo:
+  python benchmarks/serialization.py --iterations 2000 --leads 50
+"""
+import argparse
+import asyncio
+import gzip
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from load_test import BACKEND_DIR, cargar_app, ciclo_de_vida, crear_cliente  # noqa: E402
+
+sys.path.insert(0, str(BACKEND_DIR))
+
+import compression  # noqa: E402
+
+
+def _medir_render(response_class, contenido, iteraciones: int) -> float:
+    """Microsegundos por serialización"""
+    inicio = time.perf_counter()
+    for _ in range(iteraciones):
+        response_class(contenido)
+    return (time.perf_counter() - inicio) / iteraciones * 1e6
+
+
+async def _obtener_payloads(leads: int):
+    """Levantar ambas apps en proceso y capturar los payloads reales"""
+    app_module = cargar_app("app", ai_latency_ms=-1)
+    main_module = cargar_app("main")
+    payloads = {}
+
+    async with ciclo_de_vida(main_module), crear_cliente(main_module) as client:
+        payloads["/api/servicios (main)"] = (await client.get("/api/servicios")).json()
+        payloads["/api/chat (main)"] = (await client.post("/api/chat", json={"message": "precio"})).json()
+
+    async with ciclo_de_vida(app_module), crear_cliente(app_module) as client:
+        payloads["/api/chat (app)"] = (await client.post(
+            "/api/chat", json={"message": "precio itse restaurante", "history": []}
+        )).json()
+        for i in range(leads):
+            await client.post("/api/contact", json={
+                "nombre": f"Cliente Ñandú {i}", "telefono": f"9{i:08d}",
+                "email": "cliente@example.com", "servicio": "itse",
+                "mensaje": "Necesito certificado ITSE para mi restaurante ⚡",
+            })
+        payloads["/api/leads (app)"] = (await client.get("/api/leads")).json()
+
+        # Bytes en la red a través del middleware para cada codificación
+        wire = {}
+        for encoding in ("identity", "gzip", "br"):
+            response = await client.get("/api/leads", headers={"Accept-Encoding": encoding})
+            wire[encoding] = (response.num_bytes_downloaded, response.headers.get("content-encoding", "-"))
+    return payloads, wire
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de serialización y compresión")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--leads", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    from fastapi.responses import JSONResponse
+
+    try:
+        from fastapi.responses import ORJSONResponse
+        import orjson  # noqa: F401
+    except ImportError:
+        ORJSONResponse = None
+
+    payloads, wire = asyncio.run(_obtener_payloads(args.leads))
+
+    print(f"{'endpoint':<24}{'json µs':>10}{'orjson µs':>11}{'bytes':>9}{'gzip':>8}{'br':>8}")
+    for nombre, contenido in payloads.items():
+        json_us = _medir_render(JSONResponse, contenido, args.iterations)
+        orjson_us = _medir_render(ORJSONResponse, contenido, args.iterations) if ORJSONResponse else float("nan")
+        cuerpo = JSONResponse(contenido).body
+        gzip_len = len(gzip.compress(cuerpo, compression.GZIP_LEVEL))
+        br_len = len(compression.brotli.compress(cuerpo, quality=compression.BROTLI_QUALITY)) \
+            if compression.brotli else "n/d"
+        print(f"{nombre:<24}{json_us:>10.1f}{orjson_us:>11.1f}{len(cuerpo):>9}{gzip_len:>8}{br_len:>8}")
+
+    print("\nBytes en la red para /api/leads (vía CompressionMiddleware):")
+    for encoding, (bytes_red, content_encoding) in wire.items():
+        print(f"  Accept-Encoding: {encoding:<9} -> {bytes_red} bytes (content-encoding: {content_encoding})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
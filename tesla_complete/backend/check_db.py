@@ -1,47 +1,185 @@
+"""
+Database diagnostics for the Tesla SQLite database.
+
+Reports page/freelist counts, WAL size, per-table and per-index sizes
+(dbstat), and EXPLAIN QUERY PLAN for the hot queries used by the API,
+flagging full table scans and temp B-trees together with the index that
+would fix them. Run it before deploys to catch slow-query regressions:
+
+    python check_db.py --db data/tesla.db
+    python check_db.py --db backend/data/tesla.db --analyze --strict
+"""
+import argparse
 import os
 import sqlite3
+import sys
 from pathlib import Path
 
-def check_database():
-    db_path = Path("e:/WEB_TESLA_ITSE0003/tesla_complete/backend/data/tesla.db")
-    
+from query_plan import is_full_scan, plan_sqlite, usa_btree_temporal
+
+DEFAULT_DB_PATH = os.getenv("DATABASE_PATH", "data/tesla.db")
+
+# Hot queries per schema: (name, sql, number of parameters, index that avoids the scan).
+# A None fix means no index helps (primary key lookups, startup batch scans), so it is not flagged.
+# main.py schema (leads.ruc) and app.py schema (leads.servicio) share the file name
+HOT_QUERIES = {
+    "main": [
+        ("cita conflict check",
+         """SELECT id FROM citas
+            WHERE fecha = ? AND
+            (hora BETWEEN ? AND ?)
+            AND estado = 'pendiente'""", 3,
+         "CREATE INDEX idx_citas_fecha_estado ON citas(fecha, estado)"),
+        ("lead by RUC", "SELECT id FROM leads WHERE ruc = ?", 1,
+         "CREATE UNIQUE INDEX idx_leads_ruc ON leads(ruc)"),
+        ("lead by id", "SELECT * FROM leads WHERE id = ?", 1, None),
+        ("session history",
+         "SELECT session_id, user_message FROM conversations WHERE session_id IN (?, ?) "
+         "ORDER BY session_id DESC, id DESC", 2,
+         "CREATE INDEX idx_conversations_session ON conversations(session_id, id)"),
+        ("unscored leads",
+         "SELECT id FROM leads WHERE id NOT IN (SELECT lead_id FROM lead_scores) ORDER BY id", 0, None),
+    ],
+    "app": [
+        ("leads listing",
+         """SELECT l.id, l.nombre, l.telefono, l.email, l.servicio, l.estado, l.created_at, s.score, s.categoria
+            FROM leads l LEFT JOIN lead_scores s ON s.lead_id = l.id
+            ORDER BY l.created_at DESC LIMIT 50""", 0,
+         "CREATE INDEX idx_leads_created_at ON leads(created_at)"),
+        # servicios_stats holds one row per month: a scan is cheaper than an index lookup
+        ("dashboard stats",
+         "SELECT itse, instalaciones, automatizacion, mantenimiento FROM servicios_stats WHERE mes = ?", 1, None),
+        ("unscored leads",
+         "SELECT id FROM leads WHERE id NOT IN (SELECT lead_id FROM lead_scores) ORDER BY id", 0, None),
+    ],
+}
+
+
+def detect_schema(conn):
+    """'main' or 'app' depending on which backend created the leads table"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(leads)")}
+    if "ruc" in columns:
+        return "main"
+    if "servicio" in columns:
+        return "app"
+    return None
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.2f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GB"
+
+
+def report_storage(conn, db_path):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    wal_path = Path(str(db_path) + "-wal")
+
+    print("\n📋 Storage:")
+    print(f"📂 Database path: {db_path}")
+    print(f"🔢 File size: {format_size(db_path.stat().st_size)}")
+    print(f"📄 Pages: {page_count} x {page_size} B, freelist: {freelist} "
+          f"({freelist / page_count * 100 if page_count else 0:.1f}% reclaimable with VACUUM)")
+    print(f"📝 Journal mode: {journal}, WAL: {format_size(wal_path.stat().st_size) if wal_path.exists() else 'none'}")
+
+
+def report_objects(conn):
+    print("\n📊 Tables and indexes:")
+    objects = conn.execute(
+        "SELECT name, type, tbl_name FROM sqlite_master WHERE type IN ('table', 'index') ORDER BY tbl_name, type DESC, name"
+    ).fetchall()
+    try:
+        sizes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.OperationalError:
+        # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        sizes = None
+        print("  (dbstat not available in this SQLite build, sizes omitted)")
+
+    for name, kind, table in objects:
+        size = format_size(sizes.get(name, 0)) if sizes is not None else "-"
+        if kind == "table":
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            print(f"  🗂️  {name:<28} {rows:>9} rows {size:>12}")
+        else:
+            print(f"     ↳ {name:<26} {'index':>14} {size:>12}")
+
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN detail lines, or None if the query does not apply to this DB"""
+    try:
+        return plan_sqlite(conn, sql, [None] * params)
+    except sqlite3.OperationalError:
+        return None
+
+
+def report_queries(conn, schema):
+    print(f"\n🔍 Hot query plans ({schema} schema):")
+    problems = 0
+    for name, sql, params, fix in HOT_QUERIES[schema]:
+        plan = explain(conn, sql, params)
+        if plan is None:
+            print(f"  ⏭️  {name}: skipped (tables not present)")
+            continue
+
+        full_scans = [d for d in plan if is_full_scan(d)] if fix else []
+        temp_btree = [d for d in plan if usa_btree_temporal(d)] if fix else []
+        status = "❌" if full_scans else "⚠️ " if temp_btree else "✅"
+        print(f"  {status} {name}")
+        for detail in plan:
+            print(f"       {detail}")
+        if full_scans or temp_btree:
+            problems += 1
+            print(f"       💡 Missing index? {fix}")
+    return problems
+
+
+def check_database(db_path=DEFAULT_DB_PATH, analyze=False, schema=None):
+    """Print the diagnostics report; returns the number of flagged queries or None on error"""
+    db_path = Path(db_path)
     if not db_path.exists():
         print(f"❌ Database not found at {db_path}")
-        return False
-    
+        return None
+
+    conn = None
     try:
         conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-        
-        # Check tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        print("\n📋 Database Status:")
-        print(f"📂 Database path: {db_path}")
-        print(f"🔢 Size: {db_path.stat().st_size / 1024:.2f} KB")
-        print(f"📊 Tables found: {', '.join(tables) if tables else 'None'}")
-        
-        # Check services count if table exists
-        if 'servicios' in tables:
-            cursor.execute("SELECT COUNT(*) FROM servicios")
-            count = cursor.fetchone()[0]
-            print(f"\n🛠️  Services in database: {count}")
-            
-            # Show first 3 services as sample
-            cursor.execute("SELECT id, nombre, categoria FROM servicios LIMIT 3")
-            print("\n🔍 Sample services:")
-            for row in cursor.fetchall():
-                print(f"- {row[0]}: {row[1]} ({row[2]})")
-        
-        return True
-        
+        if analyze:
+            conn.execute("ANALYZE")
+            conn.commit()
+            print("📈 ANALYZE completed, planner statistics updated")
+
+        report_storage(conn, db_path)
+        report_objects(conn)
+
+        schema = schema or detect_schema(conn)
+        if schema is None:
+            print("\n⚠️  No leads table found, hot query plans skipped")
+            return 0
+        problems = report_queries(conn, schema)
+        print(f"\n{'✅ No full scans in hot queries' if not problems else f'❌ {problems} hot queries need attention'}")
+        return problems
+
     except sqlite3.Error as e:
         print(f"❌ Error checking database: {e}")
-        return False
+        return None
     finally:
-        if 'conn' in locals():
+        if conn:
             conn.close()
 
+
 if __name__ == "__main__":
-    check_database()
+    parser = argparse.ArgumentParser(description="SQLite diagnostics for the Tesla backend")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Path to the SQLite database")
+    parser.add_argument("--schema", choices=sorted(HOT_QUERIES), help="Hot query set (auto-detected by default)")
+    parser.add_argument("--analyze", action="store_true", help="Run ANALYZE before reporting")
+    parser.add_argument("--strict", action="store_true", help="Exit with status 1 if any hot query is flagged")
+    args = parser.parse_args()
+
+    result = check_database(args.db, analyze=args.analyze, schema=args.schema)
+    if result is None or (args.strict and result):
+        sys.exit(1)
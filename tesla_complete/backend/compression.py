@@ -0,0 +1,166 @@
+"""
+Serialización JSON rápida y compresión de respuestas.
+
+Cuando el backend se usa sin nginx las respuestas salían sin comprimir y
+serializadas con el encoder JSON estándar. Aquí se define:
+- DEFAULT_RESPONSE_CLASS: ORJSONResponse si orjson está instalado.
+- CompressionMiddleware: Brotli (si está instalado) o gzip según
+  Accept-Encoding, a partir de un tamaño mínimo.
+"""
+import os
+import zlib
+
+from fastapi.responses import JSONResponse
+
+from tracing import span
+
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _JSONBase
+except ImportError:
+    _JSONBase = JSONResponse
+
+
+class DEFAULT_RESPONSE_CLASS(_JSONBase):
+    """Respuesta JSON por defecto; la serialización cuenta como etapa en las trazas"""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "5"))
+# Calidad baja de Brotli: buena relación para contenido dinámico sin costar CPU
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"text/",
+    b"application/javascript",
+    b"image/svg+xml",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> dict:
+    """Codificaciones aceptadas con su calidad q según Accept-Encoding"""
+    aceptadas = {}
+    for item in accept_encoding.split(","):
+        nombre, _, params = item.strip().partition(";")
+        calidad = 1.0
+        if params.strip().startswith("q="):
+            try:
+                calidad = float(params.strip()[2:])
+            except ValueError:
+                calidad = 0.0
+        aceptadas[nombre.strip().lower()] = calidad
+    return aceptadas
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Elegir 'br', 'gzip' o '' según la cabecera Accept-Encoding"""
+    aceptadas = accepted_encodings(accept_encoding)
+    if brotli is not None and aceptadas.get("br", 0) > 0:
+        return "br"
+    if aceptadas.get("gzip", 0) > 0:
+        return "gzip"
+    return ""
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress, self.finish = self._compressor.process, self._compressor.finish
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+            self.compress, self.finish = self._compressor.compress, self._compressor.flush
+
+
+class CompressionMiddleware:
+    """Middleware ASGI de compresión gzip/Brotli con umbral de tamaño"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if not encoding:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, encoder, passthrough
+
+            if message["type"] == "http.response.start":
+                response_headers = dict(message.get("headers") or [])
+                content_type = response_headers.get(b"content-type", b"")
+                passthrough = (
+                    message["status"] in (204, 206, 304)
+                    or b"content-encoding" in response_headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                # pathsend/zerocopy: el cuerpo no pasa por aquí, se envía tal cual
+                if start_message is not None and encoder is None and not passthrough:
+                    passthrough = True
+                    await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = _Encoder(encoding)
+                vary = b""
+                response_headers = []
+                for k, v in start_message.get("headers", []):
+                    if k == b"vary":
+                        vary = v
+                    elif k != b"content-length":
+                        response_headers.append((k, v))
+                response_headers.append((b"content-encoding", encoding.encode()))
+                response_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+
+                if not more_body:
+                    with span("compress", encoding=encoding):
+                        compressed = encoder.compress(body) + encoder.finish()
+                    response_headers.append((b"content-length", str(len(compressed)).encode()))
+                    await send({**start_message, "headers": response_headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                await send({**start_message, "headers": response_headers})
+
+            chunk = encoder.compress(body)
+            if not more_body:
+                chunk += encoder.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
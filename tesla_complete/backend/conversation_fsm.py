@@ -0,0 +1,158 @@
+"""
+Máquina de estados de la conversación del chat.
+
+El flujo se declara como datos (FLUJO_CHAT): por estado, qué evento lleva a
+qué estado, con qué plantilla local se responde y qué acción se ejecuta al
+entrar (registrar el lead, agendar la cita). `MaquinaConversacion` lo
+compila al arrancar en una tabla (estado, evento) -> Paso con todas las
+combinaciones resueltas, validando que los estados y plantillas existan, así
+cada turno es una búsqueda en un dict.
+
+El evento de cada turno sale de los datos ya extraídos (slots.py) y de la
+intención detectada, en este orden: contacto (teléfono), fecha, completo
+(el servicio ya tiene los datos para cotizar), datos, servicio, afirmación
+("sí", "dale") y otro. Las transiciones sin plantilla (None) dejan la
+respuesta al camino de siempre: FAQ, proveedor de IA o reglas.
+
+`registrar()` cuenta los turnos respondidos localmente, por FAQ o por un
+proveedor, por estado, para /debug/chat y /metrics.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from prometheus import familia
+
+EVENTOS = ("contacto", "fecha", "completo", "datos", "servicio", "afirmacion", "otro")
+ESTADO_INICIAL = "greeting"
+
+_AFIRMACION_RE = re.compile(
+    r"^\W*(?:si|sí|ok|okay|dale|claro|de acuerdo|perfecto|listo|bueno|agendemos|agenda|me interesa)\b",
+    re.IGNORECASE,
+)
+
+# Datos que no cuentan como "datos de especificación" al clasificar el turno
+_SLOTS_CONTACTO = frozenset(("telefono", "nombre", "fecha", "hora", "lead_id", "cita_id"))
+
+# estado: {"accion": al entrar, "transiciones": {evento: (destino, plantilla)}}; "*" = cualquier otro evento
+_DESDE_CUALQUIERA = {
+    "servicio": ("specification_gathering", "especificacion"),
+    "datos": ("specification_gathering", "especificacion"),
+    "completo": ("data_collection", "cotizacion"),
+    "contacto": ("lead_registered", "lead"),
+}
+FLUJO_CHAT = {
+    "greeting": {"transiciones": {**_DESDE_CUALQUIERA, "*": ("service_identification", None)}},
+    "service_identification": {"transiciones": {**_DESDE_CUALQUIERA, "*": ("service_identification", None)}},
+    "specification_gathering": {"transiciones": {**_DESDE_CUALQUIERA, "*": ("conversation", None)}},
+    "data_collection": {"transiciones": {
+        **_DESDE_CUALQUIERA,
+        "afirmacion": ("data_collection", "pedir_contacto"),
+        "*": ("conversation", None),
+    }},
+    "lead_registered": {"accion": "registrar_lead", "transiciones": {
+        **_DESDE_CUALQUIERA,
+        "contacto": ("lead_registered", "lead"),
+        "fecha": ("scheduled", "cita"),
+        "afirmacion": ("lead_registered", "pedir_fecha"),
+        "*": ("conversation", None),
+    }},
+    "scheduled": {"accion": "agendar_cita", "transiciones": {
+        **_DESDE_CUALQUIERA,
+        "contacto": ("scheduled", "cita"),
+        "fecha": ("scheduled", "cita"),
+        "*": ("conversation", None),
+    }},
+    "conversation": {"transiciones": {**_DESDE_CUALQUIERA, "*": ("conversation", None)}},
+}
+
+
+class Paso(NamedTuple):
+    origen: str
+    evento: str
+    destino: str
+    plantilla: Optional[Callable[..., Any]]
+    accion: Optional[str]
+
+
+class MaquinaConversacion:
+    """Flujo compilado en una tabla (estado, evento) -> Paso"""
+
+    def __init__(self, plantillas: Dict[str, Callable[..., Any]], requeridos: Dict[Any, Tuple[str, ...]],
+                 requeridos_default: Tuple[str, ...] = (), flujo: Dict[str, Dict] = FLUJO_CHAT):
+        self.requeridos = requeridos
+        self.requeridos_default = requeridos_default
+        self.tabla: Dict[Tuple[str, str], Paso] = {}
+        for estado, definicion in flujo.items():
+            transiciones = definicion["transiciones"]
+            for evento in transiciones:
+                if evento != "*" and evento not in EVENTOS:
+                    raise ValueError(f"Evento desconocido '{evento}' en el estado '{estado}'")
+            for evento in EVENTOS:
+                destino, plantilla = transiciones.get(evento, transiciones.get("*", (estado, None)))
+                if destino not in flujo:
+                    raise ValueError(f"Estado destino desconocido '{destino}' desde '{estado}'")
+                if plantilla is not None and plantilla not in plantillas:
+                    raise ValueError(f"Plantilla sin registrar '{plantilla}' en '{estado}' -> '{destino}'")
+                # La acción corre al entrar al estado, o al recibir de nuevo contacto/fecha (actualiza)
+                accion = flujo[destino].get("accion") if destino != estado or evento in ("contacto", "fecha") else None
+                self.tabla[(estado, evento)] = Paso(
+                    estado, evento, destino, plantillas[plantilla] if plantilla else None, accion
+                )
+        self.estados = frozenset(flujo)
+        self._lock = threading.Lock()
+        self.turnos: Counter = Counter()
+
+    def faltantes(self, servicio: Any, slots: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(slot for slot in self.requeridos.get(servicio, self.requeridos_default) if slot not in slots)
+
+    def evento(self, servicio: Any, slots: Dict[str, Any], nuevos: Dict[str, Any], mensaje: str,
+               servicio_nuevo: bool = False) -> str:
+        if "telefono" in nuevos:
+            return "contacto"
+        if "fecha" in nuevos or "hora" in nuevos:
+            return "fecha"
+        especificacion = any(slot not in _SLOTS_CONTACTO for slot in nuevos)
+        if servicio is not None and (especificacion or servicio_nuevo) and not self.faltantes(servicio, slots):
+            return "completo"
+        if especificacion:
+            return "datos"
+        if servicio_nuevo:
+            return "servicio"
+        if _AFIRMACION_RE.match(mensaje):
+            return "afirmacion"
+        return "otro"
+
+    def paso(self, estado: Optional[str], evento: str) -> Paso:
+        """Transición del turno; estados desconocidos (o ninguno) parten del inicial"""
+        if estado not in self.estados:
+            estado = ESTADO_INICIAL
+        return self.tabla[(estado, evento)]
+
+    def registrar(self, estado: str, origen: str):
+        """Contar quién respondió el turno: local, faq o proveedor"""
+        with self._lock:
+            self.turnos[(estado, origen)] += 1
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            turnos = dict(self.turnos)
+        por_origen: Counter = Counter()
+        por_estado: Dict[str, Dict[str, int]] = {}
+        for (estado, origen), n in turnos.items():
+            por_origen[origen] += n
+            por_estado.setdefault(estado, {})[origen] = n
+        total = sum(por_origen.values())
+        return {
+            "turnos": total,
+            "por_origen": dict(por_origen),
+            "locales_pct": round(100 * (total - por_origen["proveedor"]) / total, 1) if total else None,
+            "por_estado": por_estado,
+        }
+
+    def familias(self) -> List[str]:
+        with self._lock:
+            turnos = dict(self.turnos)
+        return [familia("tesla_chat_turnos_total", "counter", "Turnos del chat por estado y origen",
+                        [({"estado": estado, "origen": origen}, n) for (estado, origen), n in turnos.items()])]
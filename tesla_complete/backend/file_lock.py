@@ -0,0 +1,55 @@
+"""
+Cerrojo entre procesos para las tareas de mantenimiento de la base SQLite.
+
+Con `uvicorn --workers 4` cada worker arranca sus propios schedulers
+(backups, archivado). Un `flock` sobre un archivo junto a la base deja que
+uno solo trabaje: `tomar()` no espera y devuelve False si otro proceso ya lo
+tiene. Quien lo toma puede retenerlo entre rondas (elección de líder: los
+backups) o soltarlo al terminar (el archivado). El sistema lo libera solo si
+el proceso muere, así otro worker toma el relevo en su próxima ronda.
+
+Sin fcntl (Windows) no hay exclusión y `tomar()` siempre devuelve True.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class Cerrojo:
+    def __init__(self, ruta: Union[str, Path]):
+        self.ruta = Path(ruta)
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tomado(self) -> bool:
+        return self._fd is not None
+
+    def tomar(self) -> bool:
+        """True si este proceso tiene el cerrojo (ya lo tenía o acaba de tomarlo)"""
+        if fcntl is None:
+            return True
+        with self._lock:
+            if self._fd is not None:
+                return True
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.ruta, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            self._fd = fd
+            return True
+
+    def soltar(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
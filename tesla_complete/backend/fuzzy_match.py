@@ -0,0 +1,116 @@
+"""
+Corrección de errores de tipeo en las palabras clave de intención.
+
+"matenimiento", "pozo a tiera" o "sertificado" no contienen ninguna palabra
+clave y el chat terminaba en el saludo genérico (un turno más, y en app.py
+una llamada más al LLM). `IndiceTrigramas` indexa una sola vez el vocabulario
+de palabras clave por trigramas; para cada palabra desconocida del mensaje
+busca candidatas que compartan trigramas y verifica la distancia de edición
+(con transposiciones) acotada a FUZZY_MAX_DISTANCE. `corregir()` devuelve el
+mensaje con esas palabras reemplazadas por la palabra clave, así la detección
+por reglas existente (`any(word in lower ...)`) funciona sin cambios.
+
+Las palabras cortas (menos de FUZZY_MIN_LENGTH letras) y las de uso común
+(PALABRAS_COMUNES) no se corrigen: a distancia 1 "poco" sería "pozo".
+"""
+import os
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from retrieval import STOPWORDS, normalizar
+
+FUZZY_MAX_DISTANCE = int(os.getenv("FUZZY_MAX_DISTANCE", "2"))
+FUZZY_MIN_LENGTH = int(os.getenv("FUZZY_MIN_LENGTH", "5"))
+
+_PALABRA_RE = re.compile(r"[a-záéíóúüñ]+")
+
+# Palabras correctas a un error de distancia de alguna palabra clave
+PALABRAS_COMUNES = STOPWORDS | frozenset("""
+calles costa cuenta sierra
+""".split())
+
+
+def _trigramas(palabra: str) -> List[str]:
+    relleno = f"${palabra}$"
+    return [relleno[i:i + 3] for i in range(len(relleno) - 2)]
+
+
+def distancia_acotada(a: str, b: str, maximo: int) -> int:
+    """Distancia de edición con transposiciones; maximo + 1 si la supera"""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2: List[int] = []
+    anterior = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        actual = [i] + [0] * len(b)
+        minimo_fila = i
+        for j in range(1, len(b) + 1):
+            costo = a[i - 1] != b[j - 1]
+            valor = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                valor = min(valor, anterior2[j - 2] + 1)
+            actual[j] = valor
+            minimo_fila = min(minimo_fila, valor)
+        if minimo_fila > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, actual
+    return min(anterior[-1], maximo + 1)
+
+
+class IndiceTrigramas:
+    """Vocabulario de palabras clave indexado por trigramas para corregir tipeos"""
+
+    def __init__(self, palabras: Iterable[str], max_distancia: int = FUZZY_MAX_DISTANCE,
+                 min_largo: int = FUZZY_MIN_LENGTH, cache: int = 4096):
+        self.max_distancia = max_distancia
+        self.min_largo = min_largo
+        # Forma normalizada (sin tildes) -> palabra clave tal como la buscan las reglas
+        self.formas: Dict[str, str] = {}
+        for palabra in palabras:
+            for parte in palabra.lower().split():
+                self.formas.setdefault(normalizar(parte), parte)
+        self.vocabulario = list(self.formas)
+        self.indice: Dict[str, List[int]] = defaultdict(list)
+        for posicion, forma in enumerate(self.vocabulario):
+            for trigrama in set(_trigramas(forma)):
+                self.indice[trigrama].append(posicion)
+        self.indice = dict(self.indice)
+        # Los mensajes repiten las mismas palabras: la búsqueda se cachea por palabra
+        self.palabra_clave = lru_cache(maxsize=cache)(self._palabra_clave)
+
+    def _maximo(self, largo: int) -> int:
+        """Errores tolerados según el largo: 1 hasta 8 letras, 2 desde 9"""
+        return min(self.max_distancia, (largo - 1) // 4)
+
+    def _palabra_clave(self, palabra: str) -> Optional[str]:
+        """Palabra clave que corresponde a `palabra` (exacta o a distancia acotada), o None"""
+        forma = normalizar(palabra)
+        if forma in self.formas:
+            return self.formas[forma]
+        if len(forma) < self.min_largo or forma in PALABRAS_COMUNES:
+            return None
+        maximo = self._maximo(len(forma))
+        trigramas = set(_trigramas(forma))
+        compartidos: Dict[int, int] = defaultdict(int)
+        for trigrama in trigramas:
+            for posicion in self.indice.get(trigrama, ()):
+                compartidos[posicion] += 1
+        # Cada edición destruye a lo sumo 3 trigramas: las demás candidatas no pueden estar a distancia <= maximo
+        minimo = max(1, len(trigramas) - 3 * maximo)
+        mejor, mejor_distancia = None, maximo + 1
+        for posicion, n in sorted(compartidos.items(), key=lambda item: -item[1]):
+            if n < minimo:
+                break
+            distancia = distancia_acotada(forma, self.vocabulario[posicion], mejor_distancia - 1)
+            if distancia < mejor_distancia:
+                mejor, mejor_distancia = posicion, distancia
+        return self.formas[self.vocabulario[mejor]] if mejor is not None else None
+
+    def corregir(self, texto: str) -> str:
+        """Texto en minúsculas con las palabras clave mal escritas corregidas"""
+        def reemplazo(coincidencia):
+            palabra = coincidencia.group(0)
+            return self.palabra_clave(palabra) or palabra
+        return _PALABRA_RE.sub(reemplazo, texto.lower())
@@ -0,0 +1,146 @@
+"""
+Liveness y readiness con resultado en caché.
+
+- /health/live: constante, solo confirma que el proceso atiende requests.
+- /health/ready: verifica que la base acepte escrituras y lecturas, que el
+  pool tenga margen (esperas p95 bajo HEALTH_MAX_DB_WAIT_MS), que las colas
+  en segundo plano no estén llenas y el estado de los proveedores de IA.
+  El resultado se guarda HEALTH_CACHE_SECONDS y las sondas concurrentes
+  comparten una sola verificación, así compose, nginx y Prometheus pueden
+  consultar seguido sin tocar la base en cada llamada.
+
+Cada chequeo devuelve {"ok": bool, ...}; los marcados "critico": False
+(p. ej. proveedores de IA, que tienen respuesta local de respaldo) se
+informan pero no sacan a la instancia de servicio.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from rate_limit import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+HEALTH_MAX_DB_WAIT_MS = float(os.getenv("HEALTH_MAX_DB_WAIT_MS", "1000"))
+# Fracción de una cola a partir de la cual la instancia deja de estar lista
+HEALTH_MAX_QUEUE_FILL = float(os.getenv("HEALTH_MAX_QUEUE_FILL", "0.9"))
+# Fallos seguidos de un proveedor para considerarlo abierto (se usa la respuesta local)
+HEALTH_PROVIDER_FAILURES = int(os.getenv("HEALTH_PROVIDER_FAILURES", "3"))
+
+Chequeo = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+async def crear_tabla_latido(tx):
+    """Tabla que escribe chequear_escritura; se llama dentro de la transacción del DDL de arranque"""
+    await tx.ejecutar("CREATE TABLE IF NOT EXISTS health_checks (id INTEGER PRIMARY KEY, verificado_at TEXT)")
+
+
+async def chequear_escritura(base) -> Dict[str, Any]:
+    """Escritura real (upsert de una fila) y lectura desde el pool de lectores"""
+
+    async def latido(tx, ahora: str):
+        await tx.ejecutar(
+            "INSERT INTO health_checks (id, verificado_at) VALUES (1, ?) "
+            "ON CONFLICT (id) DO UPDATE SET verificado_at = excluded.verificado_at",
+            (ahora,),
+        )
+
+    inicio = time.perf_counter()
+    await base.transaccion(latido, datetime.now().isoformat(timespec="seconds"))
+    escritura_ms = (time.perf_counter() - inicio) * 1000
+    inicio = time.perf_counter()
+    await base.consultar("SELECT verificado_at FROM health_checks WHERE id = 1")
+    return {
+        "ok": True,
+        "motor": base.dialecto,
+        "escritura_ms": round(escritura_ms, 2),
+        "lectura_ms": round((time.perf_counter() - inicio) * 1000, 2),
+    }
+
+
+async def chequear_pool(base, max_espera_ms: float = HEALTH_MAX_DB_WAIT_MS) -> Dict[str, Any]:
+    """Margen del pool a partir de las métricas ya acumuladas (no consulta la base)"""
+    metricas = base.metricas()
+    esperas = {rol: metricas[rol]["espera_p95_ms"] for rol in ("lectura", "escritura")}
+    resultado = {"ok": max(esperas.values()) < max_espera_ms, "espera_p95_ms": esperas}
+    for clave in ("lectores", "lectores_libres", "conexiones", "conexiones_libres"):
+        if clave in metricas:
+            resultado[clave] = metricas[clave]
+    return resultado
+
+
+async def chequear_colas(colas: Dict[str, Optional[asyncio.Queue]],
+                         max_llenado: float = HEALTH_MAX_QUEUE_FILL) -> Dict[str, Any]:
+    """Profundidad de las colas en segundo plano; falla si alguna está casi llena"""
+    resultado = {"ok": True}
+    for nombre, cola in colas.items():
+        if cola is None:
+            continue
+        resultado[nombre] = {"pendientes": cola.qsize(), "capacidad": cola.maxsize or None}
+        if cola.maxsize and cola.qsize() >= cola.maxsize * max_llenado:
+            resultado["ok"] = False
+    return resultado
+
+
+async def chequear_proveedores(proveedores: Dict[str, Dict[str, Any]],
+                               max_fallos: int = HEALTH_PROVIDER_FAILURES) -> Dict[str, Any]:
+    """Estado por proveedor: sin configurar, cerrado (sano) o abierto (fallando seguido)"""
+    estados = {}
+    for nombre, info in proveedores.items():
+        if not info.get("configurado"):
+            estados[nombre] = "sin_configurar"
+        elif info.get("fallos_consecutivos", 0) >= max_fallos:
+            estados[nombre] = "abierto"
+        else:
+            estados[nombre] = "cerrado"
+    return {"ok": "abierto" not in estados.values(), "critico": False, **estados}
+
+
+class VerificadorSalud:
+    """Corre los chequeos de readiness con timeout y cachea el resultado"""
+
+    def __init__(self, chequeos: Dict[str, Chequeo], ttl: float = HEALTH_CACHE_SECONDS,
+                 timeout: float = HEALTH_CHECK_TIMEOUT):
+        self.chequeos = chequeos
+        self.ttl = ttl
+        self.timeout = timeout
+        self._flight = SingleFlight()
+        self._ultimo: Optional[Dict[str, Any]] = None
+        self._vence = 0.0
+
+    async def _correr(self, nombre: str, chequeo: Chequeo) -> Dict[str, Any]:
+        try:
+            return await asyncio.wait_for(chequeo(), self.timeout)
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"sin respuesta en {self.timeout:g}s"}
+        except Exception as e:
+            logger.warning(f"Chequeo de salud '{nombre}' falló: {e}")
+            return {"ok": False, "error": str(e)}
+
+    async def _verificar(self) -> Dict[str, Any]:
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(self._correr(n, c) for n, c in self.chequeos.items()))
+        chequeos = dict(zip(self.chequeos, resultados))
+        listo = all(r["ok"] for r in chequeos.values() if r.get("critico", True))
+        if not listo and (self._ultimo is None or self._ultimo["status"] == "ready"):
+            fallidos = [n for n, r in chequeos.items() if not r["ok"] and r.get("critico", True)]
+            logger.error(f"Instancia no lista: {', '.join(fallidos)}")
+        self._ultimo = {
+            "status": "ready" if listo else "not_ready",
+            "checked_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_ms": round((time.perf_counter() - inicio) * 1000, 2),
+            "checks": chequeos,
+        }
+        self._vence = time.monotonic() + self.ttl
+        return self._ultimo
+
+    async def estado(self) -> Dict[str, Any]:
+        """Último resultado si sigue vigente; si no, una verificación compartida"""
+        if self._ultimo is not None and time.monotonic() < self._vence:
+            return {**self._ultimo, "cached": True}
+        return {**await self._flight.do("ready", self._verificar), "cached": False}
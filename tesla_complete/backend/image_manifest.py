@@ -0,0 +1,84 @@
+"""
+Lectura del manifiesto de imágenes responsivas (generado por optimizar_imagenes.py).
+
+Convierte una ruta como "/static/assets/servicios/itse/foto1.jpg" en las
+URLs con hash de sus derivados, listas para <img srcset> o <picture>. Si la
+imagen no está en el manifiesto se devuelve la URL original sin cambios.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _static_por_defecto() -> Path:
+    """app/static del repositorio; en el contenedor (/app/image_manifest.py) no hay padres suficientes"""
+    padres = Path(__file__).resolve().parents
+    return padres[2] / "app" / "static" if len(padres) > 2 else padres[0] / "static"
+
+
+STATIC_ROOT = Path(os.getenv("STATIC_ROOT") or _static_por_defecto())
+IMAGE_MANIFEST_PATH = Path(os.getenv("IMAGE_MANIFEST_PATH", STATIC_ROOT / "assets" / "imagenes.manifest.json"))
+STATIC_URL = "/static/"
+# Tamaño de presentación por defecto para el atributo sizes
+DEFAULT_SIZES = "(max-width: 640px) 100vw, 400px"
+
+# Orden de preferencia para <picture>: el navegador toma el primer <source> que soporte
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+
+
+class ImageManifest:
+    def __init__(self, path: Path = IMAGE_MANIFEST_PATH):
+        self.path = Path(path)
+        self._mtime: Optional[float] = None
+        self._entries: Dict[str, Dict] = {}
+
+    def _reload(self):
+        """Releer el manifiesto solo si cambió en disco"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            self._mtime, self._entries = None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            self._mtime = mtime
+        except ValueError as e:
+            logger.error(f"Manifiesto de imágenes inválido {self.path}: {e}")
+
+    def get(self, url: str) -> Optional[Dict]:
+        self._reload()
+        if not url.startswith(STATIC_URL):
+            return None
+        return self._entries.get(url[len(STATIC_URL):])
+
+    def responsive(self, url: str, sizes: str = DEFAULT_SIZES) -> Dict:
+        """src, srcset por formato y dimensiones de una imagen"""
+        entrada = self.get(url)
+        if entrada is None:
+            return {"src": url, "srcset": {}, "sizes": sizes}
+
+        variantes = entrada["variantes"]
+        respaldo = variantes[entrada["respaldo"]]
+        return {
+            # El respaldo más grande sirve para navegadores sin srcset
+            "src": respaldo[-1]["url"],
+            "srcset": {
+                MIME_TYPES.get(formato, formato): ", ".join(f"{v['url']} {v['ancho']}w" for v in lista)
+                for formato, lista in sorted(variantes.items(), key=lambda item: list(MIME_TYPES).index(item[0]))
+            },
+            "sizes": sizes,
+            "width": entrada["ancho"],
+            "height": entrada["alto"],
+            # Marcadores de baja calidad para pintar antes de que llegue la imagen
+            "blurhash": entrada.get("blurhash"),
+            "lqip": entrada.get("lqip"),
+        }
+
+
+image_manifest = ImageManifest()
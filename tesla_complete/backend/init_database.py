@@ -1,16 +1,22 @@
 import os
 import sqlite3
+import sys
 from pathlib import Path
 
+from database import DATABASE_URL, ruta_sqlite
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
 def init_database():
     # Ensure the data directory exists
-    db_dir = Path("e:/WEB_TESLA_ITSE0003/tesla_complete/backend/data")
-    db_dir.mkdir(parents=True, exist_ok=True)
-    
-    db_path = db_dir / "tesla.db"
+    db_path = ruta_sqlite(DATABASE_URL, str(BACKEND_DIR / "data" / "tesla.db"))
+    if db_path is None:
+        print("❌ DATABASE_URL is not SQLite; the API creates its PostgreSQL tables on startup")
+        sys.exit(1)
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
     
     # Read the SQL file
-    sql_path = Path("e:/WEB_TESLA_ITSE0003/tesla_complete/backend/init_db.sql")
+    sql_path = BACKEND_DIR / "init_db.sql"
     with open(sql_path, 'r', encoding='utf-8') as f:
         sql_script = f.read()
     
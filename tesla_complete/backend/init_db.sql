@@ -56,6 +56,18 @@ CREATE TABLE servicios (
     foto1_url TEXT, -- ruta a foto local
     foto2_url TEXT,
     foto3_url TEXT,
+    foto1_ancho INTEGER, -- dimensiones intrínsecas (evitan saltos de layout)
+    foto1_alto INTEGER,
+    foto1_blurhash TEXT,
+    foto1_lqip TEXT, -- miniatura base64 (data URI)
+    foto2_ancho INTEGER,
+    foto2_alto INTEGER,
+    foto2_blurhash TEXT,
+    foto2_lqip TEXT,
+    foto3_ancho INTEGER,
+    foto3_alto INTEGER,
+    foto3_blurhash TEXT,
+    foto3_lqip TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
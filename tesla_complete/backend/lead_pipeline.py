@@ -0,0 +1,215 @@
+"""
+Pipeline asíncrono de scoring y enriquecimiento de leads.
+
+Los endpoints solo encolan el id del lead recién insertado (O(1)), así la
+latencia del registro no cambia. Un pool de workers toma los ids por lotes,
+calcula el score, pre-genera la cotización y guarda todo en lead_scores en
+una sola transacción por lote. Trabaja sobre la capa de database.py, así que
+sirve igual con SQLite o PostgreSQL.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LEAD_PIPELINE_WORKERS = int(os.getenv("LEAD_PIPELINE_WORKERS", "2"))
+LEAD_PIPELINE_BATCH = int(os.getenv("LEAD_PIPELINE_BATCH", "50"))
+LEAD_PIPELINE_QUEUE = int(os.getenv("LEAD_PIPELINE_QUEUE", "10000"))
+# Tiempo máximo esperando a completar un lote antes de procesarlo
+LEAD_PIPELINE_BATCH_WAIT = float(os.getenv("LEAD_PIPELINE_BATCH_WAIT", "0.2"))
+# Mensajes más recientes de cada sesión que cuentan para el score
+LEAD_PIPELINE_HISTORY = int(os.getenv("LEAD_PIPELINE_HISTORY", "50"))
+
+PUNTOS_NEGOCIO = {
+    "industrial": 20, "industria": 20,
+    "comercial": 15, "comercio": 15, "restaurante": 15,
+    "oficina": 10,
+    "residencial": 5, "vivienda": 5,
+}
+PUNTOS_SERVICIO = {
+    "incendios": 20,
+    "itse": 15, "pozo_tierra": 15, "tableros": 15, "instalaciones": 15, "automatizacion": 15,
+    "mantenimiento": 10,
+    "suministros": 5,
+}
+PALABRAS_COMPRA = ("precio", "costo", "cuanto", "cuánto", "cotiza", "visita", "agendar")
+
+
+def calcular_score(lead: Dict, mensajes: List[str]) -> Tuple[int, str]:
+    """Score 0-100 del lead y su categoría (caliente, tibio, frio)"""
+    score = 0
+
+    metraje = lead.get("metraje") or 0
+    if metraje >= 500:
+        score += 25
+    elif metraje >= 150:
+        score += 18
+    elif metraje >= 50:
+        score += 10
+    elif metraje > 0:
+        score += 5
+
+    score += PUNTOS_NEGOCIO.get(str(lead.get("tipo_negocio") or "").lower(), 0)
+    score += PUNTOS_SERVICIO.get(lead.get("servicio_interes") or lead.get("servicio") or "", 0)
+
+    # Sin licencia de funcionamiento el ITSE es urgente para el cliente
+    licencia = lead.get("licencia_funcionamiento")
+    if licencia is not None:
+        score += 5 if licencia else 15
+
+    if len(mensajes) >= 3:
+        score += 10
+    if any(palabra in mensaje.lower() for mensaje in mensajes for palabra in PALABRAS_COMPRA):
+        score += 10
+
+    score = min(score, 100)
+    categoria = "caliente" if score >= 70 else "tibio" if score >= 40 else "frio"
+    return score, categoria
+
+
+class LeadPipeline:
+    def __init__(self, base,
+                 quote_fn: Optional[Callable[[Dict], Optional[Dict]]] = None,
+                 historial_sql: Optional[str] = None,
+                 workers: int = LEAD_PIPELINE_WORKERS, batch_size: int = LEAD_PIPELINE_BATCH,
+                 batch_wait: float = LEAD_PIPELINE_BATCH_WAIT, max_queue: int = LEAD_PIPELINE_QUEUE):
+        # PoolSQLite o PoolPostgres (database.py)
+        self.base = base
+        self.quote_fn = quote_fn
+        # SELECT con los session_id del lote en IN ({marcadores}) que devuelve (session_id, mensaje),
+        # ordenado por sesión y del más reciente al más antiguo
+        self.historial_sql = historial_sql
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.queue: "asyncio.Queue[Tuple[int, Optional[str]]]" = asyncio.Queue(max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    async def init_schema(self):
+        await self.base.ejecutar("""
+            CREATE TABLE IF NOT EXISTS lead_scores (
+                lead_id INTEGER PRIMARY KEY,
+                score INTEGER NOT NULL,
+                categoria TEXT NOT NULL,
+                monto_estimado REAL,
+                cotizacion TEXT,
+                session_id TEXT,
+                procesado_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (lead_id) REFERENCES leads (id)
+            )
+        """)
+
+    def submit(self, lead_id: int, session_id: Optional[str] = None):
+        """Encolar un lead recién creado sin bloquear el request"""
+        try:
+            self.queue.put_nowait((lead_id, session_id))
+        except asyncio.QueueFull:
+            # Queda sin score; start() lo retoma en el próximo arranque
+            self.dropped += 1
+            logger.warning(f"Cola de leads llena, lead {lead_id} se procesará al reiniciar")
+
+    async def start(self):
+        await self.init_schema()
+        pendientes = await self.pending_ids()
+        for lead_id in pendientes:
+            self.submit(lead_id)
+        if pendientes:
+            logger.info(f"Pipeline de leads: {len(pendientes)} leads pendientes reencolados")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 5.0):
+        """Drenar la cola pendiente y detener los workers"""
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Se detiene el pipeline con {self.queue.qsize()} leads pendientes")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def pending_ids(self) -> List[int]:
+        """Leads que quedaron sin score (caídas o cola llena)"""
+        rows = await self.base.consultar(
+            "SELECT id FROM leads WHERE id NOT IN (SELECT lead_id FROM lead_scores) ORDER BY id"
+        )
+        return [row[0] for row in rows]
+
+    async def _worker(self, numero: int):
+        while True:
+            lote = [await self.queue.get()]
+            loop = asyncio.get_running_loop()
+            limite = loop.time() + self.batch_wait
+            while len(lote) < self.batch_size:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.queue.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self.process_batch(lote)
+                self.processed += len(lote)
+            except Exception as e:
+                self.failed += len(lote)
+                logger.error(f"Worker {numero} de leads falló con lote de {len(lote)}: {e}")
+            finally:
+                for _ in lote:
+                    self.queue.task_done()
+
+    async def process_batch(self, lote: List[Tuple[int, Optional[str]]]):
+        """Calcular score y cotización de un lote y guardarlo en una transacción"""
+        sesiones = dict(lote)
+        marcadores = ",".join("?" * len(sesiones))
+        leads = await self.base.consultar(f"SELECT * FROM leads WHERE id IN ({marcadores})", list(sesiones))
+
+        # Historial de todas las sesiones del lote en una sola consulta
+        historiales: Dict[str, List[str]] = {}
+        ids_sesion = sorted({session_id for session_id in sesiones.values() if session_id})
+        if self.historial_sql and ids_sesion:
+            sql = self.historial_sql.format(marcadores=",".join("?" * len(ids_sesion)))
+            for session_id, mensaje in await self.base.consultar(sql, ids_sesion):
+                mensajes = historiales.setdefault(session_id, [])
+                if len(mensajes) < LEAD_PIPELINE_HISTORY:
+                    mensajes.append(mensaje or "")
+
+        resultados = []
+        for row in leads:
+            lead = dict(row)
+            session_id = sesiones[lead["id"]]
+            score, categoria = calcular_score(lead, historiales.get(session_id, []))
+            cotizacion = None
+            if self.quote_fn:
+                try:
+                    cotizacion = self.quote_fn(lead)
+                except Exception as e:
+                    logger.warning(f"No se pudo pre-cotizar el lead {lead['id']}: {e}")
+
+            resultados.append((
+                lead["id"], score, categoria,
+                cotizacion["monto_total"] if cotizacion else None,
+                json.dumps(cotizacion, ensure_ascii=False) if cotizacion else None,
+                session_id,
+            ))
+
+        if not resultados:
+            return
+        # Upsert con la sintaxis común a SQLite (>= 3.24) y PostgreSQL
+        await self.base.transaccion(lambda tx: tx.ejecutar_varios(
+            """INSERT INTO lead_scores
+               (lead_id, score, categoria, monto_estimado, cotizacion, session_id)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (lead_id) DO UPDATE SET
+                   score = excluded.score, categoria = excluded.categoria,
+                   monto_estimado = excluded.monto_estimado, cotizacion = excluded.cotizacion,
+                   session_id = excluded.session_id, procesado_at = CURRENT_TIMESTAMP""",
+            resultados
+        ))
@@ -1,15 +1,42 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator, EmailStr
 from typing import List, Optional, Dict, Any
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import sqlite3
+import asyncio
+import json
 import os
 import re
 import uvicorn
 from enum import Enum
 
-app = FastAPI(title="Tesla Electricidad API")
+from archive import ArchiveScheduler, ArchivoConversaciones, filas_csv, normalizar_rango
+from backup import BackupScheduler
+from compression import DEFAULT_RESPONSE_CLASS, CompressionMiddleware
+from conversation_fsm import MaquinaConversacion
+from database import DATABASE_URL, abrir_base
+from fuzzy_match import IndiceTrigramas
+from health import VerificadorSalud, chequear_colas, chequear_escritura, chequear_pool, crear_tabla_latido
+from image_manifest import image_manifest
+from lead_pipeline import LeadPipeline
+from prometheus import CONTENT_TYPE as METRICS_CONTENT_TYPE, exposicion, familia, familias_pool
+from query_profiler import cliente_local, perfilador_sql
+from rate_limit import RateLimitMiddleware
+from response_store import AlmacenRespuestas
+from retrieval import FAQ_GENERALES, EntradaFAQ, MotorFAQ
+from slots import extraer as extraer_slots
+from static_files import StaticFiles
+from tracing import TracingMiddleware, exportador_trazas, trazar
+
+app = FastAPI(title="Tesla Electricidad API", default_response_class=DEFAULT_RESPONSE_CLASS)
+
+# Compresión gzip/Brotli para cuando no hay nginx delante
+app.add_middleware(CompressionMiddleware)
+
+# Límite por cliente cuando el backend se expone sin nginx
+app.add_middleware(RateLimitMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +46,12 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Trazas muestreadas con Server-Timing; por fuera de todo para medir también la compresión
+app.add_middleware(TracingMiddleware)
+
+# /static/assets/... (imágenes, css) cuando el backend corre sin nginx
+app.mount("/static", StaticFiles(), name="static")
+
 class ServicioEnum(str, Enum):
     ITSE = "itse"
     POZO_TIERRA = "pozo_tierra"
@@ -42,6 +75,7 @@ class Lead(BaseModel):
     metraje: float
     licencia_funcionamiento: bool
     servicio_interes: ServicioEnum
+    session_id: Optional[str] = None  # sesión del chat, usada para el scoring
 
     @validator('ruc')
     def validate_ruc(cls, v):
@@ -63,13 +97,9 @@ class CotizacionRequest(BaseModel):
     metraje: float
     detalles_adicionales: Optional[Dict[str, Any]] = None
 
-def init_db():
-    os.makedirs("data", exist_ok=True)
-    conn = sqlite3.connect("data/tesla.db")
-    cursor = conn.cursor()
-    
+async def _crear_tablas(tx):
     # Tabla de conversaciones
-    cursor.execute("""
+    await tx.ejecutar("""
         CREATE TABLE IF NOT EXISTS conversations (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             session_id TEXT,
@@ -79,9 +109,24 @@ def init_db():
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
+    # Historial por sesión del pipeline de leads
+    await tx.ejecutar("CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id, id)")
+    # Respuestas del bot una sola vez (responses) referenciadas por response_hash
+    await almacen_respuestas.init_schema(tx)
+
+    # Datos de cotización reunidos en el chat (metraje, sector, distrito...) por sesión
+    await tx.ejecutar("""
+        CREATE TABLE IF NOT EXISTS chat_context (
+            session_id TEXT PRIMARY KEY,
+            estado TEXT,
+            servicio_interes TEXT,
+            slots TEXT,
+            actualizado_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     # Tabla de leads (clientes potenciales)
-    cursor.execute("""
+    await tx.ejecutar("""
         CREATE TABLE IF NOT EXISTS leads (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             nombre TEXT NOT NULL,
@@ -96,9 +141,9 @@ def init_db():
             fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    
+
     # Tabla de citas
-    cursor.execute("""
+    await tx.ejecutar("""
         CREATE TABLE IF NOT EXISTS citas (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             lead_id INTEGER NOT NULL,
@@ -112,9 +157,11 @@ def init_db():
             FOREIGN KEY (lead_id) REFERENCES leads (id)
         )
     """)
-    
+    # Verificación de choques de horario al agendar (_insertar_cita)
+    await tx.ejecutar("CREATE INDEX IF NOT EXISTS idx_citas_fecha_estado ON citas(fecha, estado)")
+
     # Tabla de cotizaciones
-    cursor.execute("""
+    await tx.ejecutar("""
         CREATE TABLE IF NOT EXISTS cotizaciones (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             lead_id INTEGER NOT NULL,
@@ -126,15 +173,71 @@ def init_db():
             FOREIGN KEY (lead_id) REFERENCES leads (id)
         )
     """)
-    
-    conn.commit()
-    conn.close()
+
+    # Latido de /health/ready
+    await crear_tabla_latido(tx)
+
+async def init_db():
+    # El DDL se escribe para SQLite; database.py lo adapta si DATABASE_URL es PostgreSQL
+    await pool_db.transaccion(_crear_tablas)
+
+def _precotizar_lead(lead: dict) -> dict:
+    return calcular_cotizacion(ServicioEnum(lead["servicio_interes"]), lead["metraje"], lead["tipo_negocio"])
+
+# SQLite (data/tesla.db) o PostgreSQL según DATABASE_URL; con SQLite, lectores
+# query_only para los GET y un escritor único para los inserts de la API
+pool_db = abrir_base(DATABASE_URL, "data/tesla.db")
+# Scoring y pre-cotización de leads fuera del request
+lead_pipeline = LeadPipeline(
+    pool_db,
+    quote_fn=_precotizar_lead,
+    # Historial de las sesiones del lote, recorrido en orden por idx_conversations_session
+    historial_sql="SELECT session_id, user_message FROM conversations WHERE session_id IN ({marcadores}) "
+                  "ORDER BY session_id DESC, id DESC"
+)
+# bot_response queda NULL en los turnos nuevos: el texto va a responses
+almacen_respuestas = AlmacenRespuestas(pool_db, "bot_response")
+# Backups en línea y archivo mensual trabajan sobre el archivo SQLite; en
+# PostgreSQL eso queda a cargo del servidor (pg_dump, particiones)
+backup_scheduler = archivo_conversaciones = archive_scheduler = None
+if pool_db.dialecto == "sqlite":
+    # Snapshots periódicos con la API de backup en línea
+    backup_scheduler = BackupScheduler(pool_db.db_path)
+    # Conversaciones viejas a bases mensuales; el export las lee en un hilo del threadpool
+    archivo_conversaciones = ArchivoConversaciones(
+        lambda: sqlite3.connect(pool_db.db_path, check_same_thread=False), pool_db.db_path, escritor=pool_db.en_escritor
+    )
+    archive_scheduler = ArchiveScheduler(archivo_conversaciones)
+
+# Readiness cacheado: base escribible, margen del pool y cola de leads
+verificador_salud = VerificadorSalud({
+    "base_de_datos": lambda: chequear_escritura(pool_db),
+    "pool": lambda: chequear_pool(pool_db),
+    "colas": lambda: chequear_colas({"leads": lead_pipeline.queue}),
+})
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    await pool_db.abrir()
+    await init_db()
+    await almacen_respuestas.start()
+    await lead_pipeline.start()
+    await exportador_trazas.start()
+    if backup_scheduler:
+        await backup_scheduler.start()
+        await archive_scheduler.start()
     print("Tesla API iniciada en http://localhost:8000")
 
+@app.on_event("shutdown")
+async def shutdown():
+    if backup_scheduler:
+        await archive_scheduler.stop()
+        await backup_scheduler.stop()
+    await lead_pipeline.stop()
+    await almacen_respuestas.stop()
+    await exportador_trazas.stop()
+    await pool_db.cerrar()
+
 @app.get("/")
 async def root():
     return {"message": "Tesla Electricidad API", "status": "online"}
@@ -143,63 +246,138 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: el proceso responde (no toca la base)"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Readiness con chequeos en caché; 503 si la instancia no debe recibir tráfico"""
+    estado = await verificador_salud.estado()
+    if estado["status"] != "ready":
+        response.status_code = 503
+    return estado
+
+async def _guardar_turno(tx, session_id: str, mensaje: str, respuesta: str, estado: str,
+                         servicio: Optional[str], slots: Dict[str, Any]):
+    clave = await almacen_respuestas.guardar(tx, respuesta)
+    await tx.ejecutar(
+        """INSERT INTO conversations 
+           (session_id, user_message, response_hash, servicio_interes) 
+           VALUES (?, ?, ?, ?)""",
+        (session_id, mensaje, clave, servicio)
+    )
+    await tx.ejecutar(
+        """INSERT INTO chat_context (session_id, estado, servicio_interes, slots, actualizado_at)
+           VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+           ON CONFLICT (session_id) DO UPDATE SET estado = excluded.estado,
+               servicio_interes = excluded.servicio_interes, slots = excluded.slots,
+               actualizado_at = excluded.actualizado_at""",
+        (session_id, estado, servicio, json.dumps(slots, ensure_ascii=False))
+    )
+
 @app.post("/api/chat")
 async def chat(message_data: ChatMessage):
     try:
-        # Procesar el mensaje con lógica de chatbot mejorada
-        response, servicio_interes = process_chat_avanzado(message_data.message, message_data.servicio_interes)
+        # Contexto de la sesión: estado, servicio y datos de cotización de turnos anteriores
+        estado, servicio_previo, slots = None, message_data.servicio_interes, {}
+        if message_data.session_id:
+            contexto = await pool_db.consultar_uno(
+                "SELECT estado, servicio_interes, slots FROM chat_context WHERE session_id = ?",
+                (message_data.session_id,)
+            )
+            if contexto:
+                estado = contexto[0]
+                servicio_previo = servicio_previo or (ServicioEnum(contexto[1]) if contexto[1] else None)
+                slots = json.loads(contexto[2] or "{}")
+        texto = corrector_intenciones.corregir(message_data.message)
+        nuevos = extraer_slots(message_data.message)
+        slots.update(nuevos)
+        detectado = detectar_servicio(texto)
+        servicio_interes = detectado or servicio_previo
+
+        # Transición del flujo; con plantilla se responde localmente
+        paso = flujo_chat.paso(estado, flujo_chat.evento(
+            servicio_interes, slots, nuevos, texto, servicio_nuevo=detectado is not None and detectado != servicio_previo
+        ))
+        cotizacion = None
+        if servicio_interes and not flujo_chat.faltantes(servicio_interes, slots):
+            cotizacion = calcular_cotizacion(servicio_interes, slots.get("metraje", 0.0), slots["tipo_negocio"])
+        faq = None
+        if paso.plantilla:
+            response = paso.plantilla(servicio_interes, slots, cotizacion)
+            origen = "local"
+        else:
+            # Pregunta frecuente con respuesta conocida; si no, lógica de chatbot por reglas
+            faq = motor_faq.responder(texto)
+            if faq:
+                response = faq.entrada.respuesta
+                servicio_interes = ServicioEnum(faq.entrada.servicio) if faq.entrada.servicio else servicio_interes
+                origen = "faq"
+            else:
+                response, servicio_interes = process_chat_avanzado(message_data.message, servicio_interes)
+                origen = "local"
+        flujo_chat.registrar(paso.destino, origen)
         
         # Generar un ID de sesión si no existe
         session_id = message_data.session_id or f"sess_{os.urandom(8).hex()}"
         
         # Guardar en la base de datos
-        conn = sqlite3.connect("data/tesla.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO conversations 
-               (session_id, user_message, bot_response, servicio_interes) 
-               VALUES (?, ?, ?, ?)""",
-            (session_id, message_data.message, response, 
-             servicio_interes.value if servicio_interes else None)
+        await pool_db.transaccion(
+            _guardar_turno, session_id, message_data.message, response, paso.destino,
+            servicio_interes.value if servicio_interes else None, slots
         )
-        conn.commit()
-        conn.close()
         
         return {
             "success": True, 
             "response": response,
             "session_id": session_id,
-            "servicio_interes": servicio_interes
+            "servicio_interes": servicio_interes,
+            "stage": paso.destino,
+            "confianza": faq.score if faq else None,
+            "slots": slots,
+            "cotizacion": cotizacion
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/debug/chat")
+async def estadisticas_chat():
+    """Turnos por estado del flujo y quién los respondió (plantilla local, FAQ o reglas)"""
+    return {"success": True, **flujo_chat.metricas()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metricas_prometheus():
+    """Métricas para Prometheus: flujo del chat, pool y cola de leads"""
+    return PlainTextResponse(exposicion([
+        *flujo_chat.familias(),
+        *familias_pool(pool_db.metricas()),
+        familia("tesla_leads_cola", "gauge", "Leads pendientes de scoring", [({}, lead_pipeline.queue.qsize())]),
+    ]), media_type=METRICS_CONTENT_TYPE)
+
+async def _insertar_lead(tx, lead: Lead) -> int:
+    # Verificar si el RUC ya existe (en la misma transacción que el insert)
+    if await tx.consultar_uno("SELECT id FROM leads WHERE ruc = ?", (lead.ruc,)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El RUC ya está registrado"
+        )
+    
+    # Insertar nuevo lead
+    return await tx.insertar(
+        """INSERT INTO leads 
+           (nombre, ruc, telefono, email, tipo_negocio, direccion, metraje, licencia_funcionamiento, servicio_interes)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (lead.nombre, lead.ruc, lead.telefono, lead.email, lead.tipo_negocio, 
+         lead.direccion, lead.metraje, lead.licencia_funcionamiento, lead.servicio_interes.value)
+    )
+
 @app.post("/api/lead")
 async def crear_lead(lead: Lead):
     try:
-        conn = sqlite3.connect("data/tesla.db")
-        cursor = conn.cursor()
-        
-        # Verificar si el RUC ya existe
-        cursor.execute("SELECT id FROM leads WHERE ruc = ?", (lead.ruc,))
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="El RUC ya está registrado"
-            )
-        
-        # Insertar nuevo lead
-        cursor.execute(
-            """INSERT INTO leads 
-               (nombre, ruc, telefono, email, tipo_negocio, direccion, metraje, licencia_funcionamiento, servicio_interes)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (lead.nombre, lead.ruc, lead.telefono, lead.email, lead.tipo_negocio, 
-             lead.direccion, lead.metraje, lead.licencia_funcionamiento, lead.servicio_interes.value)
-        )
-        
-        lead_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        lead_id = await pool_db.transaccion(_insertar_lead, lead)
+        lead_pipeline.submit(lead_id, lead.session_id)
         
         return {
             "success": True, 
@@ -208,9 +386,38 @@ async def crear_lead(lead: Lead):
         }
     except HTTPException as he:
         raise he
+    except pool_db.ErrorIntegridad:
+        # Otra réplica registró el mismo RUC entre la verificación y el insert
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El RUC ya está registrado")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _insertar_cita(tx, cita: Cita, fecha: str, hora: datetime) -> int:
+    # Verificar si hay citas en la misma hora (margen de 1 hora); las horas se guardan
+    # como HH:MM, así la comparación de texto funciona igual en SQLite y PostgreSQL
+    conflicto = await tx.consultar_uno(
+        """SELECT id FROM citas 
+           WHERE fecha = ? AND 
+           (hora BETWEEN ? AND ?)
+           AND estado = 'pendiente'""",
+        (fecha, (hora - timedelta(minutes=30)).strftime("%H:%M"), (hora + timedelta(minutes=30)).strftime("%H:%M"))
+    )
+    
+    if conflicto:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ya existe una cita programada en ese horario. Por favor, seleccione otro horario."
+        )
+    
+    # Insertar la cita
+    return await tx.insertar(
+        """INSERT INTO citas 
+           (lead_id, fecha, hora, tipo_visita, urgencia, notas)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (cita.lead_id, fecha, hora.strftime("%H:%M"), 
+         cita.tipo_visita, cita.urgencia, cita.notas)
+    )
+
 @app.post("/api/cita")
 async def agendar_cita(cita: Cita):
     try:
@@ -230,37 +437,8 @@ async def agendar_cita(cita: Cita):
         except ValueError as ve:
             raise HTTPException(status_code=400, detail=str(ve))
         
-        # Verificar disponibilidad
-        conn = sqlite3.connect("data/tesla.db")
-        cursor = conn.cursor()
-        
-        # Verificar si hay citas en la misma hora (margen de 1 hora)
-        cursor.execute(
-            """SELECT id FROM citas 
-               WHERE fecha = ? AND 
-               (time(hora) BETWEEN time(?, '-30 minutes') AND time(?, '+30 minutes'))
-               AND estado = 'pendiente'""",
-            (cita.fecha_preferida, cita.hora_preferida, cita.hora_preferida)
-        )
-        
-        if cursor.fetchone():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Ya existe una cita programada en ese horario. Por favor, seleccione otro horario."
-            )
-        
-        # Insertar la cita
-        cursor.execute(
-            """INSERT INTO citas 
-               (lead_id, fecha, hora, tipo_visita, urgencia, notas)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (cita.lead_id, cita.fecha_preferida, cita.hora_preferida, 
-             cita.tipo_visita, cita.urgencia, cita.notas)
-        )
-        
-        cita_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # Verificar disponibilidad e insertar en una sola transacción
+        cita_id = await pool_db.transaccion(_insertar_cita, cita, fecha.isoformat(), datetime.combine(fecha, hora))
         
         return {
             "success": True, 
@@ -274,6 +452,23 @@ async def agendar_cita(cita: Cita):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _placeholders_servicios() -> Dict[str, Dict[str, Any]]:
+    """Dimensiones, BlurHash y LQIP por URL guardados en la tabla servicios (setup_database.py)"""
+    columnas = ", ".join(f"foto{i}_url, foto{i}_ancho, foto{i}_alto, foto{i}_blurhash, foto{i}_lqip" for i in (1, 2, 3))
+    try:
+        filas = await pool_db.consultar(f"SELECT {columnas} FROM servicios")
+    except pool_db.errores:
+        # Base creada solo por init_db(): sin catálogo en la base
+        return {}
+
+    placeholders = {}
+    for fila in filas:
+        for i in range(0, len(fila), 5):
+            url, ancho, alto, blurhash, lqip = fila[i:i + 5]
+            if url and blurhash:
+                placeholders[url] = {"width": ancho, "height": alto, "blurhash": blurhash, "lqip": lqip}
+    return placeholders
+
 @app.get("/api/servicios")
 async def listar_servicios():
     try:
@@ -360,62 +555,122 @@ async def listar_servicios():
                 ]
             }
         ]
+
+        # URLs con hash (cacheables para siempre) y srcset por formato si existe el manifiesto,
+        # más los marcadores precalculados (BlurHash/LQIP) para pintar sin esperar la foto
+        placeholders = await _placeholders_servicios()
+        for servicio in servicios:
+            responsivas = [{**image_manifest.responsive(url), **placeholders.get(url, {})}
+                           for url in servicio["imagenes"]]
+            servicio["imagenes"] = [r["src"] for r in responsivas]
+            servicio["imagenes_responsive"] = responsivas
         
         return {"success": True, "servicios": servicios}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/cotizacion")
-async def generar_cotizacion(cotizacion: CotizacionRequest):
+@app.get("/api/conversaciones")
+async def buscar_conversaciones(desde: Optional[str] = None, hasta: Optional[str] = None,
+                                q: Optional[str] = None, session_id: Optional[str] = None, limite: int = 100):
     try:
-        conn = sqlite3.connect("data/tesla.db")
-        cursor = conn.cursor()
-        
-        # Obtener información del lead
-        cursor.execute("SELECT * FROM leads WHERE id = ?", (cotizacion.lead_id,))
-        lead = cursor.fetchone()
-        
-        if not lead:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Lead no encontrado"
-            )
-        
-        # Calcular cotización según el servicio y metraje
-        cotizacion_info = calcular_cotizacion(
-            cotizacion.servicio, 
-            cotizacion.metraje, 
-            lead[5]  # tipo_negocio
+        desde, hasta = normalizar_rango(desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas, use YYYY-MM-DD")
+    if archivo_conversaciones is None:
+        raise HTTPException(status_code=501, detail="Búsqueda de conversaciones disponible solo con SQLite")
+    conversaciones = await asyncio.to_thread(
+        archivo_conversaciones.buscar, desde=desde, hasta=hasta, texto=q,
+        sesion=session_id, limite=max(1, min(limite, 1000))
+    )
+    return {"success": True, "total": len(conversaciones), "conversaciones": conversaciones}
+
+@app.get("/api/conversaciones/exportar")
+async def exportar_conversaciones(desde: Optional[str] = None, hasta: Optional[str] = None,
+                                  q: Optional[str] = None, session_id: Optional[str] = None):
+    try:
+        desde, hasta = normalizar_rango(desde, hasta)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fechas inválidas, use YYYY-MM-DD")
+    if archivo_conversaciones is None:
+        raise HTTPException(status_code=501, detail="Exportación de conversaciones disponible solo con SQLite")
+    filas = archivo_conversaciones.iterar(desde=desde, hasta=hasta, texto=q, sesion=session_id)
+    return StreamingResponse(
+        filas_csv(filas), media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="conversaciones.csv"'}
+    )
+
+async def _insertar_cotizacion(tx, cotizacion: CotizacionRequest) -> dict:
+    # Obtener información del lead
+    lead = await tx.consultar_uno("SELECT * FROM leads WHERE id = ?", (cotizacion.lead_id,))
+    
+    if not lead:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Lead no encontrado"
         )
-        
-        # Guardar la cotización en la base de datos
-        cursor.execute(
-            """INSERT INTO cotizaciones 
-               (lead_id, servicio, metraje, monto_total, detalles)
-               VALUES (?, ?, ?, ?, ?)""",
-            (
-                cotizacion.lead_id,
-                cotizacion.servicio.value,
-                cotizacion.metraje,
-                cotizacion_info["monto_total"],
-                str(cotizacion.detalles_adicionales) if cotizacion.detalles_adicionales else None
-            )
+    
+    # Calcular cotización según el servicio y metraje
+    cotizacion_info = calcular_cotizacion(
+        cotizacion.servicio, 
+        cotizacion.metraje, 
+        lead[5]  # tipo_negocio
+    )
+    
+    # Guardar la cotización en la base de datos
+    cotizacion_id = await tx.insertar(
+        """INSERT INTO cotizaciones 
+           (lead_id, servicio, metraje, monto_total, detalles)
+           VALUES (?, ?, ?, ?, ?)""",
+        (
+            cotizacion.lead_id,
+            cotizacion.servicio.value,
+            cotizacion.metraje,
+            cotizacion_info["monto_total"],
+            str(cotizacion.detalles_adicionales) if cotizacion.detalles_adicionales else None
         )
-        
-        cotizacion_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return {
-            "success": True,
-            "cotizacion_id": cotizacion_id,
-            **cotizacion_info
-        }
+    )
+    
+    return {
+        "success": True,
+        "cotizacion_id": cotizacion_id,
+        **cotizacion_info
+    }
+
+@app.post("/api/cotizacion")
+async def generar_cotizacion(cotizacion: CotizacionRequest):
+    try:
+        return await pool_db.transaccion(_insertar_cotizacion, cotizacion)
     except HTTPException as he:
         raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/db/metricas")
+async def metricas_db(reiniciar: bool = False):
+    """Esperas de lectores y escritor; reiniciar=true reinicia la ventana"""
+    metricas = pool_db.metricas()
+    if reiniciar:
+        pool_db.reiniciar_metricas()
+    return {"success": True, **metricas}
+
+@app.get("/debug/queries")
+async def perfil_consultas(orden: str = "total", limite: int = 50):
+    """Perfil de sentencias SQL del worker que atiende (cada worker tiene el suyo)"""
+    return {"success": True, **perfilador_sql.reporte(orden, limite)}
+
+@app.post("/debug/queries")
+async def cambiar_perfil_consultas(request: Request, activar: Optional[bool] = None, reiniciar: bool = False,
+                                   orden: str = "total", limite: int = 50):
+    """Prender/apagar o reiniciar el perfilador de este worker, solo desde localhost"""
+    if not cliente_local(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Solo desde localhost")
+    if activar is not None:
+        perfilador_sql.activo = activar
+    reporte = perfilador_sql.reporte(orden, limite)
+    if reiniciar:
+        perfilador_sql.reiniciar()
+    return {"success": True, **reporte}
+
 def calcular_cotizacion(servicio: ServicioEnum, metraje: float, tipo_negocio: str) -> dict:
     """Calcula el monto de la cotización según el servicio y metraje"""
     # Factores de ajuste según tipo de negocio
@@ -471,6 +726,70 @@ def calcular_cotizacion(servicio: ServicioEnum, metraje: float, tipo_negocio: st
         "condiciones": "Precio sujeto a verificación técnica in situ"
     }
 
+# Datos que necesita calcular_cotizacion por servicio (el ITSE no depende del área)
+SLOTS_COTIZACION = {ServicioEnum.ITSE: ("tipo_negocio",)}
+NOMBRES_SLOTS = {"metraje": "el área en m²", "tipo_negocio": "el tipo de local (casa, tienda, oficina, restaurante, industria)"}
+
+def _resumen_slots(slots: Dict[str, Any]) -> List[str]:
+    lineas = []
+    if "sector" in slots:
+        lineas.append(f"• Local: {slots['sector']} ({slots['tipo_negocio']})")
+    if "metraje" in slots:
+        lineas.append(f"• Área: {slots['metraje']:g} m²")
+    if "terreno" in slots:
+        lineas.append(f"• Terreno: {slots['terreno']}")
+    if "distrito" in slots:
+        lineas.append(f"• Distrito: {slots['distrito']}")
+    return lineas
+
+def texto_cotizacion(cotizacion: dict, slots: Dict[str, Any]) -> str:
+    lineas = [f"💰 COTIZACIÓN ESTIMADA\n\n{cotizacion['descripcion']}\n", *_resumen_slots(slots)]
+    lineas.append(f"\nMonto estimado: S/ {cotizacion['monto_total']:,.2f}")
+    lineas.append(f"Válida por {cotizacion['validez']} días. {cotizacion['condiciones']}.")
+    lineas.append("\n¿Agendamos la visita técnica sin costo?")
+    return "\n".join(lineas)
+
+def texto_faltantes(slots: Dict[str, Any], faltantes: List[str]) -> str:
+    lineas = ["📝 Anotado:", *_resumen_slots(slots)]
+    lineas.append("\nPara cotizar solo me falta " + " y ".join(NOMBRES_SLOTS[s] for s in faltantes) + ".")
+    return "\n".join(lineas)
+
+# Plantillas locales del flujo de conversación: (servicio, slots, cotizacion) -> respuesta
+def _plantilla_especificacion(servicio, slots, cotizacion):
+    faltantes = flujo_chat.faltantes(servicio, slots) if servicio else ()
+    if servicio and _resumen_slots(slots) and faltantes:
+        return texto_faltantes(slots, list(faltantes))
+    if not servicio and _resumen_slots(slots):
+        return "\n".join(["📝 Anotado:", *_resumen_slots(slots)]) + "\n\n" + process_chat_avanzado("")[0]
+    return process_chat_avanzado("", servicio)[0]
+
+def _fecha_visita(slots: Dict[str, Any]) -> str:
+    return f"{slots['fecha']} {slots.get('hora', '')}".strip() if "fecha" in slots else ""
+
+def _plantilla_lead(servicio, slots, cotizacion):
+    nombre = f", {slots['nombre']}" if "nombre" in slots else ""
+    texto = f"✅ ¡Gracias{nombre}! Un asesor te llamará al {slots['telefono']} para confirmar la visita técnica."
+    if "fecha" in slots:
+        return texto + f"\n\n📅 Anotamos tu preferencia: {_fecha_visita(slots)}."
+    return texto + "\n\n📅 ¿Qué día y hora te acomoda para la visita?"
+
+PLANTILLAS_CHAT = {
+    "especificacion": _plantilla_especificacion,
+    "cotizacion": lambda servicio, slots, cotizacion: texto_cotizacion(cotizacion, slots),
+    "pedir_contacto": lambda servicio, slots, cotizacion: (
+        "📞 ¡Perfecto! Déjame tu nombre y número de celular y un asesor te contactará para coordinar la visita."
+    ),
+    "lead": _plantilla_lead,
+    "pedir_fecha": lambda servicio, slots, cotizacion: "📅 ¿Qué día y hora prefieres para la visita técnica?",
+    "cita": lambda servicio, slots, cotizacion: (
+        f"📅 Visita técnica solicitada para el {_fecha_visita(slots)}. "
+        f"Te confirmaremos al {slots.get('telefono', 'número que nos dejaste')}."
+    ),
+}
+# Sin acciones registradas: los leads de main.py necesitan RUC y email (/api/lead), el
+# contacto y la fecha pedida quedan en chat_context para el asesor
+flujo_chat = MaquinaConversacion(PLANTILLAS_CHAT, SLOTS_COTIZACION, ("metraje", "tipo_negocio"))
+
 @app.get("/dashboard")
 async def get_dashboard(month: int = 8):
     data = {
@@ -486,27 +805,75 @@ async def get_dashboard(month: int = 8):
     
     return {"success": True, "data": data.get(month, data[8])}
 
+# Preguntas concretas con respuesta conocida (mismos precios que la lista de process_chat_avanzado)
+FAQ_SERVICIOS = [
+    EntradaFAQ("itse_costos",
+               ["cuánto cuesta el certificado ITSE", "cuánto es el pago municipal del ITSE",
+                "precio del trámite ITSE", "cuánto demora el ITSE"],
+               "📋 CERTIFICADO ITSE\n\n• Pago municipal: S/ 218.00\n• Nuestro servicio: S/ 300.00 - S/ 500.00\n"
+               "• Total aproximado: S/ 518.00 - S/ 718.00\n\nTiempo estimado: 5-10 días hábiles.\n\n"
+               "¿Qué tipo de local tienes y cuántos m² tiene?", "itse"),
+    EntradaFAQ("itse_restaurante",
+               ["ITSE para restaurante precio", "cuánto cuesta el ITSE para un restaurante",
+                "cuánto cuesta el ITSE de un bar", "certificado ITSE restaurante"],
+               "📋 ITSE para restaurante/bar: S/ 718 - 1,218 en total (incluye el pago municipal).\n\n"
+               "¿Cuál es el área del local en m²?", "itse"),
+    EntradaFAQ("itse_industrial",
+               ["ITSE industrial precio", "cuánto cuesta el ITSE para una fábrica o industria",
+                "certificado ITSE industria"],
+               "📋 ITSE industrial: S/ 1,218 - 2,218 en total, según el área y el nivel de riesgo.\n\n"
+               "¿Cuál es el área de la planta en m²?", "itse"),
+    EntradaFAQ("pozo_tierra_precios",
+               ["cuánto cuesta un pozo a tierra", "precio pozo de tierra residencial",
+                "pozo a tierra para industria precio", "costo de pozo a tierra comercial"],
+               "⚡ POZO DE TIERRA\n\n• Residencial: S/ 1,200 - 1,800\n• Comercial: S/ 1,500 - 2,500\n"
+               "• Industrial: S/ 2,500 - 4,500\n\nEl precio final depende del terreno y la resistividad "
+               "del suelo. ¿Agendamos una visita técnica sin costo?", "pozo_tierra"),
+    EntradaFAQ("mantenimiento_precios",
+               ["cuánto cuesta el mantenimiento preventivo", "precio mantenimiento correctivo",
+                "tienen plan anual de mantenimiento", "descuento en mantenimiento"],
+               "🔧 MANTENIMIENTO\n\n• Preventivo: S/ 200 - 400\n• Correctivo: S/ 500 - 1,200\n"
+               "• Plan anual: 15% de descuento", "mantenimiento"),
+    EntradaFAQ("incendios_precios",
+               ["cuánto cuesta un sistema contra incendios", "precio detección de incendios",
+                "sistema de alarma contra incendio costo"],
+               "🚒 SISTEMA CONTRA INCENDIOS\n\n• Detección básica: desde S/ 1,500\n"
+               "• Sistema completo: cotización personalizada según el área", "incendios"),
+]
+motor_faq = MotorFAQ(FAQ_GENERALES + FAQ_SERVICIOS)
+
+# Palabras clave por servicio, en orden de prioridad
+PALABRAS_SERVICIO = {
+    ServicioEnum.ITSE: ['itse', 'certificado', 'licencia'],
+    ServicioEnum.POZO_TIERRA: ['pozo', 'tierra', 'aterramiento'],
+    ServicioEnum.MANTENIMIENTO: ['mantenimiento', 'reparacion', 'reparación'],
+    ServicioEnum.INCENDIOS: ['incendio', 'extintor', 'sprinkler'],
+    ServicioEnum.TABLEROS: ['tablero', 'tableros', 'cuadro electrico'],
+    ServicioEnum.SUMINISTROS: ['suministro', 'materiales', 'cables', 'cableado'],
+}
+PALABRAS_PRECIO = ['precio', 'costo', 'cuanto cuesta', 'tarifa']
+# "matenimiento" o "sertificado" se corrigen antes de aplicar las reglas
+corrector_intenciones = IndiceTrigramas(
+    [palabra for palabras in PALABRAS_SERVICIO.values() for palabra in palabras] + PALABRAS_PRECIO
+)
+
+def detectar_servicio(lower: str) -> Optional[ServicioEnum]:
+    return next(
+        (servicio for servicio, palabras in PALABRAS_SERVICIO.items() if any(word in lower for word in palabras)),
+        None,
+    )
+
+@trazar("ai.local")
 def process_chat_avanzado(message: str, servicio_interes: Optional[ServicioEnum] = None) -> tuple[str, Optional[ServicioEnum]]:
     """
     Procesa el mensaje del usuario y devuelve una respuesta del chatbot.
     Retorna una tupla con (respuesta, servicio_interes)
     """
-    lower = message.lower()
+    lower = corrector_intenciones.corregir(message)
     
     # Detectar servicio de interés si no está definido
     if not servicio_interes:
-        if any(word in lower for word in ['itse', 'certificado', 'licencia']):
-            servicio_interes = ServicioEnum.ITSE
-        elif any(word in lower for word in ['pozo', 'tierra', 'aterramiento']):
-            servicio_interes = ServicioEnum.POZO_TIERRA
-        elif any(word in lower for word in ['mantenimiento', 'reparacion', 'reparación']):
-            servicio_interes = ServicioEnum.MANTENIMIENTO
-        elif any(word in lower for word in ['incendio', 'extintor', 'sprinkler']):
-            servicio_interes = ServicioEnum.INCENDIOS
-        elif any(word in lower for word in ['tablero', 'tableros', 'cuadro electrico']):
-            servicio_interes = ServicioEnum.TABLEROS
-        elif any(word in lower for word in ['suministro', 'materiales', 'cables', 'cableado']):
-            servicio_interes = ServicioEnum.SUMINISTROS
+        servicio_interes = detectar_servicio(lower)
     
     # Generar respuesta basada en el servicio de interés
     if servicio_interes == ServicioEnum.ITSE:
@@ -583,7 +950,7 @@ Nuestro equipo se pondrá en contacto contigo para ofrecerte una cotización per
 
 ¿Podrías proporcionarme estos datos?"""
 
-    elif any(word in lower for word in ['precio', 'costo', 'cuanto cuesta', 'tarifa']):
+    elif any(word in lower for word in PALABRAS_PRECIO):
         response = """💰 LISTA DE PRECIOS REFERENCIALES 2024
 
 CERTIFICADO ITSE:
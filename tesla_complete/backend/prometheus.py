@@ -0,0 +1,42 @@
+"""
+Formato de texto de Prometheus para GET /metrics, sin prometheus_client.
+
+Cada componente arma sus familias con `familia()` a partir de los contadores
+que ya lleva (uso de tokens, enrutador, flujo del chat, pool) y el endpoint
+las concatena; no hay un registro global que mantener en paralelo.
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def familia(nombre: str, tipo: str, ayuda: str, muestras: Iterable[Tuple[Dict[str, Any], float]]) -> str:
+    """Bloque # HELP / # TYPE y una línea por muestra (etiquetas, valor)"""
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    for etiquetas, valor in muestras:
+        texto = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas.items())
+        lineas.append(f"{nombre}{{{texto}}} {_numero(valor)}" if texto else f"{nombre} {_numero(valor)}")
+    return "\n".join(lineas)
+
+
+def exposicion(familias: Iterable[str]) -> str:
+    return "\n".join(familias) + "\n"
+
+
+def familias_pool(metricas: Dict[str, Any]) -> List[str]:
+    """Pool de database.py; /api/db/metrics?reset reinicia los contadores, así que son gauges"""
+    tipos = ("lectura", "escritura")
+    return [
+        familia("tesla_db_operaciones", "gauge", "Operaciones del pool desde el último reinicio de métricas",
+                [({"tipo": tipo}, metricas[tipo]["operaciones"]) for tipo in tipos]),
+        familia("tesla_db_espera_p95_ms", "gauge", "Espera p95 por una conexión del pool",
+                [({"tipo": tipo}, metricas[tipo]["espera_p95_ms"]) for tipo in tipos]),
+    ]
@@ -0,0 +1,102 @@
+"""
+Construcción de prompts con presupuesto de tokens para AIService.
+
+Los fragmentos de la base de conocimiento se serializan una sola vez al
+arrancar (JSON compacto) y el historial se recorta para que el prompt
+completo no supere PROMPT_TOKEN_BUDGET tokens.
+"""
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+HISTORY_MAX_MESSAGES = int(os.getenv("PROMPT_HISTORY_MAX_MESSAGES", "5"))
+
+# Tokens extra que el formato chat de OpenAI agrega por cada mensaje
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Aproximación local de BPE: trozos de hasta 4 caracteres alfanuméricos
+# y cada signo/emoji como un token
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Contar tokens localmente (tiktoken si está instalado, si no aproximado)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(_TOKEN_RE.findall(text))
+
+
+def _compact_prompt(text: str) -> str:
+    """Quitar la indentación y las líneas vacías repetidas del prompt base"""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    compact = []
+    for line in lines:
+        if not line and compact and not compact[-1]:
+            continue
+        compact.append(line)
+    return "\n".join(compact)
+
+
+class PromptBuilder:
+    def __init__(self, base_prompt: str, knowledge_base: Dict, token_budget: int = PROMPT_TOKEN_BUDGET,
+                 max_history: int = HISTORY_MAX_MESSAGES):
+        self.token_budget = token_budget
+        self.max_history = max_history
+        self.base_prompt = _compact_prompt(base_prompt)
+        self.base_tokens = count_tokens(self.base_prompt)
+
+        # Precalcular un fragmento compacto por cada contexto de servicio
+        self.slices: Dict[str, Tuple[str, int]] = {}
+        for nombre, info in knowledge_base.get("servicios", {}).items():
+            texto = f"\n\nINFORMACIÓN ESPECÍFICA {nombre.upper()}:\n"
+            texto += json.dumps(info, ensure_ascii=False, separators=(",", ":"))
+            self.slices[nombre] = (texto, count_tokens(texto))
+
+    def system_prompt(self, context: Optional[str]) -> Tuple[str, int]:
+        """Prompt de sistema para un contexto y su tamaño en tokens"""
+        if context and context in self.slices:
+            texto, tokens = self.slices[context]
+            return self.base_prompt + texto, self.base_tokens + tokens
+        return self.base_prompt, self.base_tokens
+
+    def build(self, message: str, context: Optional[str] = None, history: Optional[List[Dict]] = None) -> Dict:
+        """Armar el prompt completo recortando el historial al presupuesto"""
+        system, system_tokens = self.system_prompt(context)
+        message_tokens = count_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+        used = system_tokens + MESSAGE_OVERHEAD_TOKENS + message_tokens
+
+        # Conservar los mensajes más recientes que quepan en el presupuesto
+        candidates = (history or [])[-self.max_history:] if self.max_history else []
+        kept: List[Dict] = []
+        for item in reversed(candidates):
+            tokens = count_tokens(str(item.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > self.token_budget:
+                break
+            kept.append(item)
+            used += tokens
+        kept.reverse()
+
+        prompt = {
+            "system": system,
+            "history": kept,
+            "prompt_tokens": used,
+            "history_dropped": len(history or []) - len(kept),
+        }
+        logger.info(
+            f"Prompt {context or 'general'}: {used} tokens "
+            f"(sistema {system_tokens}, historial {len(kept)}/{len(history or [])})"
+        )
+        return prompt
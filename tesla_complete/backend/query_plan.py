@@ -0,0 +1,37 @@
+"""
+Lectura de planes de consulta, compartida por check_db.py (diagnóstico de las
+consultas calientes antes de un deploy) y query_profiler.py / database.py
+(plan de las sentencias lentas en producción).
+
+SQLite describe el plan con EXPLAIN QUERY PLAN ("SCAN t", "SEARCH t USING
+INDEX ...", "USE TEMP B-TREE FOR ORDER BY"); PostgreSQL con EXPLAIN ("Seq
+Scan on t", "Index Scan using ..."). Sin dependencias del resto del backend,
+así check_db.py sigue corriendo como script suelto.
+"""
+import sqlite3
+from typing import List, Sequence
+
+
+def tiene_plan(sql: str) -> bool:
+    """Solo las sentencias DML tienen plan (EXPLAIN sobre DDL falla en PostgreSQL)"""
+    return sql.lstrip()[:6].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def plan_sqlite(conn: sqlite3.Connection, sql: str, parametros: Sequence) -> List[str]:
+    """Líneas de detalle de EXPLAIN QUERY PLAN; propaga sqlite3.Error si la sentencia no aplica"""
+    return [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros)]
+
+
+def is_full_scan(detail: str) -> bool:
+    # "SCAN t USING INDEX ..." walks an index in order; plain "SCAN t" reads the whole table
+    return detail.startswith("SCAN ") and " USING " not in detail
+
+
+def usa_btree_temporal(detalle: str) -> bool:
+    """Orden o agrupación resueltos con un B-tree temporal en vez de un índice"""
+    return "TEMP B-TREE" in detalle
+
+
+def escaneo_completo(plan: List[str]) -> bool:
+    """Recorre una tabla entera (SCAN de SQLite sin índice o Seq Scan de PostgreSQL)"""
+    return any(is_full_scan(d) or "Seq Scan" in d for d in plan)
@@ -0,0 +1,141 @@
+"""
+Perfilador de sentencias SQL de la capa de datos.
+
+Agrupa cada sentencia por su SQL normalizado (espacios colapsados, literales
+reemplazados por ?) y acumula llamadas, duración total y máxima y filas
+devueltas o afectadas. Las sentencias que superan DB_SLOW_QUERY_MS se
+registran en el log junto con su plan (EXPLAIN QUERY PLAN en SQLite, EXPLAIN
+en PostgreSQL), calculado una sola vez por sentencia.
+
+Se prende al arrancar con DB_PROFILE=1 o en caliente con
+`POST /debug/queries?activar=true`, aceptado solo desde la misma máquina
+(`cliente_local`). Cada worker de uvicorn tiene su perfilador: el POST y el
+reporte (`GET /debug/queries`, con el pid) son los del worker que atiende.
+Apagado, database.py solo consulta `perfilador_sql.activo` antes de ejecutar.
+"""
+import ipaddress
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from query_plan import escaneo_completo
+
+logger = logging.getLogger(__name__)
+
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "50"))
+# Tope de sentencias distintas (SQL armado con f-strings podría crecer sin límite)
+DB_PROFILE_MAX_STATEMENTS = int(os.getenv("DB_PROFILE_MAX_STATEMENTS", "500"))
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql: str) -> str:
+    return _ESPACIOS.sub(" ", _LITERALES.sub("?", sql)).strip()
+
+
+class EstadisticaSentencia:
+    __slots__ = ("llamadas", "total", "maximo", "filas", "lentas", "plan")
+
+    def __init__(self):
+        self.llamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.filas = 0
+        self.lentas = 0
+        self.plan: Optional[List[str]] = None
+
+
+class PerfiladorSQL:
+    """Estadísticas por sentencia normalizada y log de sentencias lentas"""
+
+    def __init__(self, activo: bool = DB_PROFILE, umbral_ms: float = DB_SLOW_QUERY_MS,
+                 max_sentencias: int = DB_PROFILE_MAX_STATEMENTS):
+        self.activo = activo
+        self.umbral_ms = umbral_ms
+        self.max_sentencias = max_sentencias
+        # Lectores y escritor SQLite registran desde sus propios hilos
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.sentencias: Dict[str, EstadisticaSentencia] = {}
+            self.descartadas = 0
+
+    def registrar(self, sql: str, duracion: float, filas: int) -> bool:
+        """Sumar una ejecución; True si fue lenta y todavía falta su plan (guardar_plan)"""
+        clave = normalizar_sql(sql)
+        ms = duracion * 1000
+        with self._lock:
+            estadistica = self.sentencias.get(clave)
+            if estadistica is None:
+                if len(self.sentencias) >= self.max_sentencias:
+                    self.descartadas += 1
+                    return False
+                estadistica = self.sentencias[clave] = EstadisticaSentencia()
+            estadistica.llamadas += 1
+            estadistica.total += ms
+            estadistica.maximo = max(estadistica.maximo, ms)
+            estadistica.filas += max(filas, 0)
+            if ms < self.umbral_ms:
+                return False
+            estadistica.lentas += 1
+            plan = estadistica.plan
+        if plan is None:
+            return True
+        logger.warning(f"Sentencia lenta ({ms:.1f} ms, {filas} filas): {clave} | plan: {' / '.join(plan)}")
+        return False
+
+    def guardar_plan(self, sql: str, plan: List[str]):
+        clave = normalizar_sql(sql)
+        with self._lock:
+            estadistica = self.sentencias.get(clave)
+            if estadistica is not None:
+                estadistica.plan = plan
+        logger.warning(f"Sentencia lenta: {clave} | plan: {' / '.join(plan) or '-'}")
+
+    def reporte(self, orden: str = "total", limite: int = 50) -> Dict[str, Any]:
+        with self._lock:
+            filas = [
+                {
+                    "sql": clave,
+                    "llamadas": e.llamadas,
+                    "total_ms": round(e.total, 2),
+                    "promedio_ms": round(e.total / e.llamadas, 3),
+                    "maximo_ms": round(e.maximo, 2),
+                    "filas": e.filas,
+                    "lentas": e.lentas,
+                    "plan": e.plan,
+                    "escaneo_completo": escaneo_completo(e.plan) if e.plan else None,
+                }
+                for clave, e in self.sentencias.items()
+            ]
+            descartadas = self.descartadas
+        clave_orden = {"total": "total_ms", "maximo": "maximo_ms", "promedio": "promedio_ms",
+                       "llamadas": "llamadas"}.get(orden, "total_ms")
+        filas.sort(key=lambda f: f[clave_orden], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "activo": self.activo,
+            "umbral_ms": self.umbral_ms,
+            "sentencias": len(filas),
+            "descartadas": descartadas,
+            "consultas": filas[:limite],
+        }
+
+
+def cliente_local(host: Optional[str]) -> bool:
+    """Solo loopback: /debug no pasa por nginx y el puerto 8000 puede quedar expuesto"""
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+
+perfilador_sql = PerfiladorSQL()
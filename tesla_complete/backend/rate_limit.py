@@ -0,0 +1,233 @@
+"""
+Limitación de tasa por cliente y coalescencia de requests idénticos.
+
+- RateLimitMiddleware: token bucket por (ruta, cliente) con cuotas por ruta,
+  equivalente en proceso al limit_req de nginx para cuando el backend se
+  expone directamente en el puerto 8000. El cliente es siempre su IP (la
+  real detrás de proxies de confianza); con RATE_LIMIT_KEY=session cada
+  X-Session-ID tiene además su propio cupo dentro del de la IP. Los buckets
+  viven en cada worker de uvicorn, así que las cuotas se reparten entre
+  RATE_LIMIT_WORKERS (por defecto WEB_CONCURRENCY, que usa --workers).
+- SingleFlight: requests concurrentes con la misma clave comparten una sola
+  ejecución (p. ej. una única llamada al proveedor de IA).
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+# Solo con el puerto 8000 cerrado al exterior: la IP sale de las cabeceras del proxy
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY") == "1"
+# Proxies intermedios de confianza además del par directo (IPs o redes separadas por coma)
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "")
+# Procesos que atienden requests, cada uno con sus buckets: la cuota se divide entre ellos
+RATE_LIMIT_WORKERS = max(1, int(os.getenv("RATE_LIMIT_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1"))
+# Con RATE_LIMIT_KEY=session: cupo de la IP como múltiplo del de una sesión (oficinas detrás de NAT)
+RATE_LIMIT_SESSIONS_PER_IP = float(os.getenv("RATE_LIMIT_SESSIONS_PER_IP", "5"))
+
+# ruta -> "N/periodo" (s, m, h); la ráfaga permitida es N
+DEFAULT_QUOTAS = {
+    "/api/chat": "20/m",
+    "/api/whatsapp/send": "5/m",
+    "/api/lead": "10/m",
+    "/api/contact": "10/m",
+    "/api/cita": "10/m",
+    "/api/": "600/m",  # resto de la API, como zone=api de nginx (10r/s)
+}
+
+_PERIODOS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_quota(spec: str) -> Tuple[float, float]:
+    """Convertir "20/m" en (tokens por segundo, capacidad)"""
+    cantidad, _, periodo = spec.strip().partition("/")
+    capacidad = float(cantidad)
+    segundos = _PERIODOS.get(periodo.strip().lower()[:1] or "s")
+    if not capacidad or segundos is None:
+        raise ValueError(f"Cuota inválida: {spec}")
+    return capacidad / segundos, capacidad
+
+
+def load_quotas(workers: int = RATE_LIMIT_WORKERS) -> Dict[str, Tuple[float, float]]:
+    """Cuotas por defecto más overrides de RATE_LIMITS ("/api/chat=30/m;/api/=20/s"), por worker"""
+    specs = dict(DEFAULT_QUOTAS)
+    for item in filter(None, os.getenv("RATE_LIMITS", "").split(";")):
+        ruta, _, spec = item.partition("=")
+        specs[ruta.strip()] = spec
+    cuotas = {}
+    for ruta, spec in specs.items():
+        tasa, capacidad = parse_quota(spec)
+        cuotas[ruta] = (tasa / workers, max(1.0, capacidad / workers))
+    return cuotas
+
+
+def redes_de_confianza(spec: str = RATE_LIMIT_TRUSTED_PROXIES) -> List:
+    return [ipaddress.ip_network(red.strip(), strict=False) for red in spec.split(",") if red.strip()]
+
+
+def _es_proxy(salto: str, redes: Sequence) -> bool:
+    try:
+        direccion = ipaddress.ip_address(salto)
+    except ValueError:
+        return False
+    return any(direccion in red for red in redes)
+
+
+def ip_cliente(scope, trust_proxy: bool = RATE_LIMIT_TRUST_PROXY, proxies: Optional[Sequence] = None) -> str:
+    """IP del cliente del request ASGI
+
+    Detrás de un proxy de confianza (el par directo) vale X-Real-IP, que nginx
+    reescribe; si no viene, el salto de X-Forwarded-For más a la derecha que no
+    es un proxy de confianza. Las entradas de la izquierda las escribe el cliente.
+    """
+    ip = scope["client"][0] if scope.get("client") else "desconocido"
+    if not trust_proxy:
+        return ip
+    real = b""
+    saltos: List[str] = []
+    for nombre, valor in scope.get("headers") or []:
+        if nombre == b"x-real-ip":
+            real = valor.strip()
+        elif nombre == b"x-forwarded-for":
+            saltos.extend(s.strip().decode("latin-1") for s in valor.split(b",") if s.strip())
+    if real:
+        return real.decode("latin-1")
+    proxies = PROXIES_DE_CONFIANZA if proxies is None else proxies
+    for salto in reversed(saltos):
+        if not _es_proxy(salto, proxies):
+            return salto
+    return saltos[0] if saltos else ip
+
+
+PROXIES_DE_CONFIANZA = redes_de_confianza()
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consumir un token; devuelve 0 si hay cupo o los segundos a esperar"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    def __init__(self, quotas: Optional[Dict[str, Tuple[float, float]]] = None, max_buckets: int = 10000):
+        self.quotas = quotas if quotas is not None else load_quotas()
+        # Rutas exactas primero y luego prefijos del más largo al más corto
+        self._prefixes = sorted((r for r in self.quotas if r.endswith("/")), key=len, reverse=True)
+        self.max_buckets = max_buckets
+        self.buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    def route_for(self, path: str) -> Optional[str]:
+        if path in self.quotas:
+            return path
+        for prefix in self._prefixes:
+            if path.startswith(prefix):
+                return prefix
+        return None
+
+    def check(self, path: str, client: str, escala: float = 1.0) -> float:
+        """0 si el request pasa, si no segundos sugeridos para Retry-After; escala multiplica la cuota"""
+        route = self.route_for(path)
+        if route is None:
+            return 0.0
+        key = (route, client)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            tasa, capacidad = self.quotas[route]
+            bucket = self.buckets[key] = TokenBucket(tasa * escala, capacidad * escala)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        wait = bucket.take()
+        if wait:
+            self.rejected += 1
+        return wait
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI que responde 429 cuando se agota el cupo del cliente"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None, trust_proxy: Optional[bool] = None,
+                 key_by: Optional[str] = None, sesiones_por_ip: float = RATE_LIMIT_SESSIONS_PER_IP):
+        self.app = app
+        self.limiter = limiter or RateLimiter()
+        self.trust_proxy = trust_proxy if trust_proxy is not None else RATE_LIMIT_TRUST_PROXY
+        self.proxies = PROXIES_DE_CONFIANZA
+        # "ip" o "session" (cabecera X-Session-ID dentro del cupo de la IP)
+        self.key_by = key_by or os.getenv("RATE_LIMIT_KEY", "ip")
+        self.sesiones_por_ip = sesiones_por_ip
+
+    def client_keys(self, scope) -> List[Tuple[str, float]]:
+        """(clave, escala de la cuota) de cada bucket que debe tener cupo"""
+        ip = ip_cliente(scope, self.trust_proxy, self.proxies)
+        sesion = dict(scope.get("headers") or []).get(b"x-session-id")
+        if self.key_by == "session" and sesion:
+            # La sesión la elige el cliente: rotarla no pasa del cupo ampliado de su IP
+            return [(ip, self.sesiones_por_ip), (f"{ip}|session:{sesion.decode('latin-1')}", 1.0)]
+        return [(ip, 1.0)]
+
+    async def __call__(self, scope, receive, send):
+        if not RATE_LIMIT_ENABLED or scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        wait = max(self.limiter.check(scope["path"], clave, escala) for clave, escala in self.client_keys(scope))
+        if not wait:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps({"detail": "Demasiadas solicitudes, intenta nuevamente en unos segundos"},
+                          ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, round(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class SingleFlight:
+    """Compartir el resultado de una corrutina entre llamadas concurrentes con la misma clave"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.shared += 1
+        else:
+            # En su propio task: si se cancela el request que la inició, los que se sumaron siguen esperando
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda terminado: self._terminar(key, terminado))
+        return await asyncio.shield(future)
+
+    def _terminar(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Marcar la excepción como consumida si nadie más esperaba
+        if not future.cancelled():
+            future.exception()
@@ -0,0 +1,136 @@
+"""
+Respuestas del bot guardadas una sola vez, direccionadas por contenido.
+
+La mayoría de las filas de conversations repiten las mismas respuestas
+(saludo, plantillas del flujo, FAQ, reglas locales) en bot_response/response,
+así que la tabla era casi todo texto duplicado. Cada turno guarda ahora la
+huella del texto (blake2b de 16 bytes, BLOB) en response_hash y el texto queda una
+sola vez en la tabla responses. Las filas viejas conservan el texto en línea
+hasta que `migrar()` las pasa por lotes (corre en segundo plano al arrancar).
+
+Las lecturas reconstruyen el texto con `texto_sql()`:
+COALESCE(bot_response, (SELECT texto FROM responses WHERE hash = response_hash)),
+que sirve igual para filas migradas y sin migrar. El archivo mensual
+(archive.py) guarda el texto ya resuelto y al terminar borra las respuestas
+que ninguna conversación caliente referencia; por eso response_hash no lleva
+índice propio (costaría tanto como la huella en cada fila).
+
+Cada turno ejecuta siempre el INSERT ... ON CONFLICT DO NOTHING (una búsqueda
+por clave primaria en una transacción que ya escribe): una caché de huellas
+en memoria quedaría desfasada tras restaurar un backup o purgar huérfanas.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Filas por transacción de la migración: acota el tiempo que se retiene el escritor
+RESPONSES_MIGRATE_BATCH = int(os.getenv("RESPONSES_MIGRATE_BATCH", "2000"))
+
+TABLA = "conversations"
+COLUMNA_HASH = "response_hash"
+# Columna con el texto de la respuesta según el esquema (main.py / app.py)
+COLUMNAS_RESPUESTA = ("bot_response", "response")
+
+
+def huella(texto: str) -> bytes:
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).digest()
+
+
+def texto_sql(columna: str, tabla: str = TABLA, esquema: str = "") -> str:
+    """Expresión SQL con el texto de la respuesta, en línea o desde responses"""
+    prefijo = f"{esquema}." if esquema else ""
+    return (f'COALESCE({tabla}."{columna}", (SELECT texto FROM {prefijo}responses '
+            f'WHERE hash = {tabla}.{COLUMNA_HASH}))')
+
+
+class AlmacenRespuestas:
+    """Escritura de respuestas deduplicadas y migración de las filas en línea"""
+
+    def __init__(self, base, columna: str, lote: int = RESPONSES_MIGRATE_BATCH):
+        # PoolSQLite o PoolPostgres (database.py)
+        self.base = base
+        self.columna = columna
+        self.lote = lote
+        self._task: Optional[asyncio.Task] = None
+
+    async def init_schema(self, tx):
+        """Tabla responses y columna response_hash; se llama dentro de la transacción del DDL"""
+        await tx.ejecutar("""
+            CREATE TABLE IF NOT EXISTS responses (
+                hash BLOB PRIMARY KEY,
+                texto TEXT NOT NULL,
+                creado DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        if self.base.dialecto == "sqlite":
+            columnas = [fila[1] for fila in await tx.consultar(f"PRAGMA table_info({TABLA})")]
+            if COLUMNA_HASH not in columnas:
+                await tx.ejecutar(f"ALTER TABLE {TABLA} ADD COLUMN {COLUMNA_HASH} BLOB")
+        else:
+            await tx.ejecutar(f"ALTER TABLE {TABLA} ADD COLUMN IF NOT EXISTS {COLUMNA_HASH} BYTEA")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._migrar_en_fondo())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _migrar_en_fondo(self):
+        try:
+            migradas = await self.migrar()
+            if migradas:
+                logger.info(f"Respuestas deduplicadas: {migradas} conversaciones migradas")
+        except Exception as e:
+            logger.error(f"Migración de respuestas falló: {e}")
+
+    async def guardar(self, tx, texto: Optional[str]) -> Optional[bytes]:
+        """Asegurar el texto en responses dentro de `tx`; devuelve su huella"""
+        if texto is None:
+            return None
+        clave = huella(texto)
+        await tx.ejecutar("INSERT INTO responses (hash, texto) VALUES (?, ?) ON CONFLICT (hash) DO NOTHING",
+                          (clave, texto))
+        return clave
+
+    async def migrar(self) -> int:
+        """Pasar a responses las filas que aún tienen el texto en línea; devuelve cuántas"""
+        total, ultimo = 0, 0
+        while True:
+            filas = await self.base.consultar(
+                f'SELECT id, "{self.columna}" FROM {TABLA} WHERE id > ? AND "{self.columna}" IS NOT NULL '
+                f"AND {COLUMNA_HASH} IS NULL ORDER BY id LIMIT ?",
+                (ultimo, self.lote)
+            )
+            if not filas:
+                return total
+            await self.base.transaccion(self._migrar_lote, [(fila[0], fila[1]) for fila in filas])
+            total += len(filas)
+            ultimo = filas[-1][0]
+
+    async def _migrar_lote(self, tx, filas: List[Tuple[int, str]]):
+        huellas = [(huella(texto), texto, id_) for id_, texto in filas]
+        await tx.ejecutar_varios(
+            "INSERT INTO responses (hash, texto) VALUES (?, ?) ON CONFLICT (hash) DO NOTHING",
+            list({clave: (clave, texto) for clave, texto, _ in huellas}.values())
+        )
+        # Condicionado al texto: una fila editada entre la lectura y este lote queda para el próximo arranque
+        await tx.ejecutar_varios(
+            f'UPDATE {TABLA} SET {COLUMNA_HASH} = ?, "{self.columna}" = NULL WHERE id = ? AND "{self.columna}" = ?',
+            [(clave, id_, texto) for clave, texto, id_ in huellas]
+        )
+
+
+def purgar_huerfanas(conn) -> int:
+    """Borrar (sqlite3, en la transacción del llamador) las respuestas que ya nadie referencia"""
+    # NOT IN arma un índice temporal de las huellas en uso: un solo recorrido de cada tabla
+    return conn.execute(
+        f"DELETE FROM main.responses WHERE hash NOT IN "
+        f"(SELECT {COLUMNA_HASH} FROM main.{TABLA} WHERE {COLUMNA_HASH} IS NOT NULL)"
+    ).rowcount
@@ -0,0 +1,269 @@
+"""
+Respuestas de FAQ por recuperación TF-IDF, sin llamar a un LLM.
+
+El corpus (preguntas de ejemplo -> respuesta) se arma al arrancar con la base
+de conocimiento de cada backend más FAQ_GENERALES, y se vectoriza una sola
+vez en una matriz NumPy (filas normalizadas L2, tf sublineal e idf suavizado).
+Cada mensaje se convierte en un vector disperso de pocos términos, así que la
+similitud coseno con todo el corpus es un producto de unas pocas columnas de
+la matriz: bastante menos de un milisegundo.
+
+`MotorFAQ.responder()` devuelve la mejor respuesta solo si su puntaje supera
+FAQ_MIN_SCORE y le saca FAQ_MIN_MARGIN a la segunda; el chat la usa en lugar
+de las reglas o del proveedor de IA.
+Sin NumPy instalado el motor queda deshabilitado (responder() devuelve None).
+"""
+import logging
+import math
+import os
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from tracing import trazar
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.45"))
+# Mensajes con menos términos conocidos quedan para las reglas ("itse", "hola")
+FAQ_MIN_TERMS = int(os.getenv("FAQ_MIN_TERMS", "2"))
+# Ventaja mínima sobre la segunda respuesta; con empate la pregunta es ambigua
+FAQ_MIN_MARGIN = float(os.getenv("FAQ_MIN_MARGIN", "0.05"))
+FAQ_TOP_K = int(os.getenv("FAQ_TOP_K", "3"))
+
+_PALABRA_RE = re.compile(r"[a-z0-9ñ]+")
+
+STOPWORDS = frozenset("""
+a al algo algun alguna ante con como cual cuales de del donde el ella en entre es esa ese esta este
+esto hay la las le les lo los me mi mis muy necesito no nos o para pero por que quiero se si sin
+sobre su sus te tengo tiene tienen tu un una uno unos unas y ya yo hola buenas buenos dias tardes
+gracias favor puedo puede pueden saber quisiera ustedes usted
+""".split())
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes (la ñ se conserva)"""
+    texto = texto.lower().replace("ñ", "\0")
+    sin_tildes = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return sin_tildes.replace("\0", "ñ")
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Unigramas sin stopwords con plural recortado, más bigramas consecutivos"""
+    palabras = []
+    for palabra in _PALABRA_RE.findall(normalizar(texto)):
+        if palabra in STOPWORDS:
+            continue
+        if len(palabra) > 4 and palabra.endswith("es") and palabra[-3] not in "aeiou":
+            palabra = palabra[:-2]
+        elif len(palabra) > 3 and palabra.endswith("s"):
+            palabra = palabra[:-1]
+        palabras.append(palabra)
+    return palabras + [f"{a} {b}" for a, b in zip(palabras, palabras[1:])]
+
+
+class EntradaFAQ(NamedTuple):
+    id: str
+    preguntas: Sequence[str]
+    respuesta: str
+    servicio: Optional[str] = None
+
+
+class ResultadoFAQ(NamedTuple):
+    entrada: EntradaFAQ
+    score: float
+    # Distancia al segundo candidato: poca margen = pregunta ambigua
+    margen: float
+
+
+# Preguntas generales válidas para los dos backends
+FAQ_GENERALES = [
+    EntradaFAQ("visita_tecnica",
+               ["la visita técnica tiene costo", "cobran por la visita técnica", "visita técnica gratuita",
+                "pueden venir a evaluar mi local"],
+               "🚀 La visita técnica de evaluación es GRATUITA. Déjanos tu nombre y teléfono y "
+               "coordinamos el día y la hora que te acomode."),
+    EntradaFAQ("zona_atencion",
+               ["dónde están ubicados", "atienden en huancayo", "en qué ciudad trabajan",
+                "hacen servicios fuera de huancayo"],
+               "📍 Somos Tesla Electricidad y Automatización, con base en Huancayo (Junín). "
+               "Para trabajos fuera de la ciudad coordinamos la visita según el proyecto."),
+    EntradaFAQ("tiempo_respuesta",
+               ["en cuánto tiempo responden", "cuánto demoran en contestar", "cuándo me llaman"],
+               "⚡ Respondemos en máximo 30 minutos en horario de atención. Si nos dejas tu "
+               "teléfono te contactamos por WhatsApp."),
+    EntradaFAQ("cotizacion",
+               ["cómo pido una cotización", "quiero una cotización formal", "me pueden cotizar",
+                "necesito un presupuesto"],
+               "📋 Para una cotización exacta necesitamos el tipo de servicio, el tipo de local y "
+               "el área aproximada en m². Con esos datos te enviamos una cotización preliminar y "
+               "agendamos la visita técnica gratuita."),
+]
+
+
+def entradas_conocimiento(conocimiento: Dict) -> List[EntradaFAQ]:
+    """Preguntas y respuestas derivadas de KNOWLEDGE_BASE (app.py)"""
+    servicios = conocimiento["servicios"]
+    entradas = []
+
+    itse = servicios["itse"]
+    for sector, info in itse["sectores"].items():
+        entradas.append(EntradaFAQ(
+            f"itse_{sector}",
+            [f"cuánto cuesta el ITSE para {sector}", f"precio certificado ITSE {sector}",
+             f"necesito ITSE para mi {sector}", f"costo inspección de seguridad {sector}",
+             f"cuánto sale el ITSE de un {sector}"],
+            f"📋 ITSE para {sector}: S/ {info['precio_min']} - S/ {info['precio_max']}, "
+            f"trámite en {info['tiempo']} (riesgo {info['riesgo']}).\n\n"
+            "¿Cuál es el área de tu local en m²? Con eso te doy un precio exacto.",
+            "itse"))
+    entradas.append(EntradaFAQ(
+        "itse_documentos",
+        ["qué documentos necesito para el ITSE", "requisitos del certificado ITSE",
+         "qué documentos piden para el certificado", "qué piden para la inspección técnica"],
+        "📄 Para el ITSE se necesitan: " + ", ".join(itse["documentos"]) + ".\n"
+        "Normativa aplicable: " + ", ".join(itse["normativas"]) + ".",
+        "itse"))
+    entradas.append(EntradaFAQ(
+        "itse_plazos",
+        ["cuánto demora el ITSE", "en cuánto tiempo sale el certificado ITSE", "plazo del trámite ITSE"],
+        "⏱️ Plazos del ITSE: " + ", ".join(f"{sector} {info['tiempo']}" for sector, info in itse["sectores"].items())
+        + ".\n\n¿Qué tipo de local tienes?",
+        "itse"))
+    entradas.append(EntradaFAQ(
+        "itse_tipos",
+        ["qué es el ITSE", "qué tipos de ITSE hay", "diferencia entre ITSE básica y de detalle"],
+        f"📋 {itse['descripcion']}. Tipos: " + ", ".join(itse["tipos"]) + ".",
+        "itse"))
+
+    instalaciones = servicios["instalaciones"]
+    precios = instalaciones["precios"]
+    for tipo in instalaciones["tipos"]:
+        clave = f"punto_{normalizar(tipo)}"
+        if clave in precios:
+            entradas.append(EntradaFAQ(
+                f"instalacion_{normalizar(tipo)}",
+                [f"precio por punto eléctrico {tipo}", f"cuánto cobran por punto de instalación {tipo}",
+                 f"instalación eléctrica {tipo} precio"],
+                f"⚡ Instalación {tipo.lower()}: S/ {precios[clave]} por punto. Tablero principal "
+                f"S/ {precios['tablero_principal']}, acometida S/ {precios['acometida']}.",
+                "instalaciones"))
+
+    automatizacion = servicios["automatizacion"]
+    for nombre, paquete in automatizacion["paquetes"].items():
+        entradas.append(EntradaFAQ(
+            f"domotica_{nombre}",
+            [f"paquete {nombre} de domótica", f"precio automatización paquete {nombre}",
+             f"qué incluye el paquete {nombre}"],
+            f"🏠 Paquete {nombre}: S/ {paquete['precio']}, incluye " + ", ".join(paquete["incluye"]) + ".",
+            "automatizacion"))
+    for nombre, sistema in automatizacion["sistemas"].items():
+        entradas.append(EntradaFAQ(
+            f"domotica_{nombre}",
+            [f"precio {nombre} inteligentes", f"cuánto cuesta instalar {nombre}", sistema["descripcion"]],
+            f"🏠 {sistema['descripcion']}: desde S/ {sistema['precio']}.",
+            "automatizacion"))
+
+    for nombre, plan in servicios["mantenimiento"]["planes"].items():
+        entradas.append(EntradaFAQ(
+            f"mantenimiento_{nombre}",
+            [f"plan de mantenimiento {nombre}", f"precio mantenimiento {nombre}",
+             f"mantenimiento eléctrico {nombre} cuánto cuesta"],
+            f"🔧 Plan {nombre}: S/ {plan['precio']} ({plan['visitas']} visitas), incluye "
+            + ", ".join(plan["incluye"]) + ".",
+            "mantenimiento"))
+    return entradas
+
+
+class MotorFAQ:
+    """Índice TF-IDF en memoria sobre las preguntas de ejemplo del corpus"""
+
+    def __init__(self, entradas: Sequence[EntradaFAQ], min_score: float = FAQ_MIN_SCORE,
+                 min_margen: float = FAQ_MIN_MARGIN, min_terminos: int = FAQ_MIN_TERMS):
+        self.entradas = list(entradas)
+        self.min_score = min_score
+        self.min_margen = min_margen
+        self.min_terminos = min_terminos
+        self.vocabulario: Dict[str, int] = {}
+        self.matriz = None
+        if np is None:
+            logger.warning("NumPy no está instalado: respuestas de FAQ deshabilitadas")
+            return
+        self._indexar()
+
+    @property
+    def disponible(self) -> bool:
+        return self.matriz is not None
+
+    def _indexar(self):
+        documentos, inicios = [], []
+        for entrada in self.entradas:
+            # Las preguntas de cada entrada quedan en filas contiguas (reduceat por entrada)
+            inicios.append(len(documentos))
+            documentos.extend(tokenizar(pregunta) for pregunta in entrada.preguntas)
+        df: Dict[str, int] = {}
+        for tokens in documentos:
+            for token in set(tokens):
+                df[token] = df.get(token, 0) + 1
+        terminos = sorted(df)
+        self.vocabulario = {token: j for j, token in enumerate(terminos)}
+        n = len(documentos)
+        self.idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in terminos], dtype=np.float32)
+
+        matriz = np.zeros((n, len(terminos)), dtype=np.float32)
+        for fila, tokens in enumerate(documentos):
+            for token in set(tokens):
+                matriz[fila, self.vocabulario[token]] = 1 + math.log(tokens.count(token))
+        matriz *= self.idf
+        matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-9)
+        # Columnas contiguas: la consulta lee solo las columnas de sus términos
+        self.matriz = np.asfortranarray(matriz)
+        self._inicios = np.array(inicios, dtype=np.intp)
+        logger.info(f"FAQ indexadas: {len(self.entradas)} respuestas, {n} preguntas, {len(terminos)} términos")
+
+    def buscar(self, mensaje: str, k: int = FAQ_TOP_K) -> List[ResultadoFAQ]:
+        """Las k respuestas más parecidas (una por entrada), de mayor a menor puntaje"""
+        if self.matriz is None:
+            return []
+        conteo: Dict[int, int] = {}
+        unigramas = 0
+        for token in tokenizar(mensaje):
+            j = self.vocabulario.get(token)
+            if j is not None:
+                unigramas += conteo.get(j) is None and " " not in token
+                conteo[j] = conteo.get(j, 0) + 1
+        if unigramas < self.min_terminos:
+            return []
+
+        columnas = np.fromiter(conteo, dtype=np.intp, count=len(conteo))
+        tf = np.fromiter(conteo.values(), dtype=np.float32, count=len(conteo))
+        pesos = (1 + np.log(tf)) * self.idf[columnas]
+        pesos /= np.linalg.norm(pesos)
+        # Coseno contra todas las preguntas y el máximo por entrada
+        por_entrada = np.maximum.reduceat(self.matriz[:, columnas] @ pesos, self._inicios)
+
+        n = min(k + 1, len(por_entrada))
+        orden = np.argpartition(-por_entrada, n - 1)[:n]
+        orden = orden[np.argsort(-por_entrada[orden])]
+        puntajes = por_entrada[orden]
+        resultados = []
+        for pos in range(min(k, n)):
+            score = float(puntajes[pos])
+            if score <= 0:
+                break
+            siguiente = float(puntajes[pos + 1]) if pos + 1 < n else 0.0
+            resultados.append(ResultadoFAQ(self.entradas[orden[pos]], round(score, 4), round(score - siguiente, 4)))
+        return resultados
+
+    @trazar("ai.faq")
+    def responder(self, mensaje: str) -> Optional[ResultadoFAQ]:
+        """La mejor respuesta si es confiable (puntaje y margen mínimos), si no None"""
+        resultados = self.buscar(mensaje, 1)
+        if resultados and resultados[0].score >= self.min_score and resultados[0].margen >= self.min_margen:
+            return resultados[0]
+        return None
@@ -0,0 +1,160 @@
+"""
+Enrutador por confianza entre la respuesta local y el proveedor de IA.
+
+Con OPENAI_API_KEY o GEMINI_API_KEY configurada, `AIService.get_ai_response`
+llamaba al proveedor en todos los turnos, aun para "precio itse restaurante",
+que la regla local responde con los precios de KNOWLEDGE_BASE. El enrutador
+puntúa la respuesta local con tres señales antes de pagar el round-trip:
+
+- intención: una sola intención por palabras clave (1.0); dos servicios
+  distintos en el mismo mensaje son ambiguos (0.5)
+- datos: fracción de los datos que usa la regla de esa intención presentes
+  en el mensaje (slots.py)
+- recuperación: puntaje TF-IDF de la FAQ más parecida si es del mismo servicio
+
+La suma ponderada se multiplica por la cobertura: la fracción de palabras
+del mensaje que el índice conoce. "¿puedo conectar un generador si tengo
+paneles solares?" no tiene cobertura y va al proveedor. Sobre
+ROUTER_MIN_CONFIDENCE se responde localmente; debajo se escala.
+
+`metricas()` cuenta los turnos locales, por FAQ y escalados, y estima el
+ahorro con la latencia y los tokens medidos en las llamadas reales al
+proveedor (costo por modelo con `ContadorUso.costo`, PRECIOS_MODELO de
+usage.py); `familias()` lo expone en /metrics.
+"""
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from prometheus import familia
+from retrieval import MotorFAQ, tokenizar
+from slots import ALIAS_DISTRITOS, DIAS_SEMANA, DISTRITOS, SECTORES, TERRENOS
+
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.6"))
+
+PESO_INTENCION = 0.5
+PESO_DATOS = 0.2
+PESO_RECUPERACION = 0.3
+
+ORIGENES = ("local", "faq", "proveedor", "respaldo", "presupuesto")
+
+# Palabras que lee slots.py: un mensaje con área, local o distrito no es desconocido
+_PALABRAS_SLOTS = (
+    [palabra for grupo in (SECTORES, TERRENOS) for palabras in grupo.values() for palabra in palabras]
+    + DISTRITOS + list(ALIAS_DISTRITOS) + DIAS_SEMANA
+    + "m2 mt2 mts2 mts metro metros cuadrado cuadrados mañana hoy llamo nombre".split()
+)
+
+
+class Decision(NamedTuple):
+    local: bool
+    confianza: float
+    intencion: Optional[str]
+    senales: Dict[str, float]
+
+
+class EnrutadorConfianza:
+    """Decide por turno si la respuesta local alcanza o hay que escalar al proveedor"""
+
+    def __init__(self, faq: MotorFAQ, palabras: Dict[str, Sequence[str]],
+                 requeridos: Dict[str, Tuple[str, ...]], servicios_faq: Dict[str, str],
+                 umbral: float = ROUTER_MIN_CONFIDENCE,
+                 costo: Optional[Callable[[str, int, int], float]] = None,
+                 sin_servicio: Sequence[str] = ()):
+        self.faq = faq
+        self.palabras = palabras
+        self.requeridos = requeridos
+        self.servicios_faq = servicios_faq
+        # Intenciones que acompañan a un servicio ("precio itse") sin hacerlo ambiguo
+        self.sin_servicio = frozenset(sin_servicio)
+        self.umbral = umbral
+        # USD de una llamada (modelo, tokens de prompt, tokens de respuesta): ContadorUso.costo
+        self.costo = costo
+        self.conocidas = {token for token in faq.vocabulario if " " not in token}
+        for palabra in [palabra for lista in palabras.values() for palabra in lista] + _PALABRAS_SLOTS:
+            self.conocidas.update(token for token in tokenizar(palabra) if " " not in token)
+        self._lock = threading.Lock()
+        self.turnos: Counter = Counter()
+        self.proveedor = {"llamadas": 0, "segundos": 0.0, "tokens": 0, "costo": 0.0}
+
+    def decidir(self, texto: str, slots: Dict[str, Any]) -> Decision:
+        """Confianza en la respuesta local para el texto ya corregido"""
+        intenciones = [nombre for nombre, lista in self.palabras.items() if any(word in texto for word in lista)]
+        if not intenciones:
+            return Decision(False, 0.0, None, {})
+        intencion = intenciones[0]
+        servicios = [nombre for nombre in intenciones if nombre not in self.sin_servicio]
+
+        requeridos = self.requeridos.get(intencion, ())
+        recuperacion = 0.0
+        mejores = self.faq.buscar(texto, 1)
+        if mejores and mejores[0].entrada.servicio == self.servicios_faq.get(intencion):
+            recuperacion = mejores[0].score
+        unigramas = [token for token in tokenizar(texto) if " " not in token and not token.isdigit()]
+        senales = {
+            "intencion": 1.0 if len(servicios) <= 1 else 0.5,
+            "datos": sum(slot in slots for slot in requeridos) / len(requeridos) if requeridos else 1.0,
+            "recuperacion": recuperacion,
+            "cobertura": sum(token in self.conocidas for token in unigramas) / len(unigramas) if unigramas else 1.0,
+        }
+        confianza = (PESO_INTENCION * senales["intencion"] + PESO_DATOS * senales["datos"]
+                     + PESO_RECUPERACION * senales["recuperacion"]) * senales["cobertura"]
+        return Decision(confianza >= self.umbral, round(confianza, 3), intencion, senales)
+
+    def registrar(self, origen: str):
+        """Contar quién respondió: local, faq, respaldo (regla tras fallar el proveedor) o presupuesto"""
+        with self._lock:
+            self.turnos[origen] += 1
+
+    def registrar_proveedor(self, segundos: float, modelo: str, prompt: int, respuesta: int):
+        """Latencia, tokens y costo de una llamada real al proveedor, base de la estimación de ahorro"""
+        costo = self.costo(modelo, prompt, respuesta) if self.costo else 0.0
+        with self._lock:
+            self.turnos["proveedor"] += 1
+            self.proveedor["llamadas"] += 1
+            self.proveedor["segundos"] += segundos
+            self.proveedor["tokens"] += prompt + respuesta
+            self.proveedor["costo"] += costo
+
+    def metricas(self) -> Dict[str, Any]:
+        with self._lock:
+            turnos = {origen: self.turnos[origen] for origen in ORIGENES}
+            proveedor = dict(self.proveedor)
+        total = sum(turnos.values())
+        evitadas = turnos["local"] + turnos["faq"]
+        llamadas = proveedor["llamadas"]
+        latencia = proveedor["segundos"] / llamadas if llamadas else None
+        tokens = proveedor["tokens"] / llamadas if llamadas else None
+        costo = proveedor["costo"] / llamadas if llamadas and self.costo else None
+        return {
+            "umbral": self.umbral,
+            "turnos": total,
+            "por_origen": turnos,
+            "locales_pct": round(100 * evitadas / total, 1) if total else None,
+            "proveedor": {
+                "llamadas": llamadas,
+                "latencia_media_ms": round(latencia * 1000, 1) if latencia is not None else None,
+                "tokens_medios": round(tokens) if tokens is not None else None,
+                "costo_medio_usd": round(costo, 6) if costo is not None else None,
+            },
+            # Sin llamadas medidas todavía no hay base para estimar
+            "ahorro_estimado": {
+                "llamadas": evitadas,
+                "segundos": round(evitadas * latencia, 2) if latencia is not None else None,
+                "tokens": round(evitadas * tokens) if tokens is not None else None,
+                "costo_usd": round(evitadas * costo, 4) if costo is not None else None,
+            },
+        }
+
+    def familias(self) -> List[str]:
+        metricas = self.metricas()
+        ahorro = metricas["ahorro_estimado"]
+        return [
+            familia("tesla_router_turnos_total", "counter", "Turnos por origen de la respuesta",
+                    [({"origen": origen}, n) for origen, n in metricas["por_origen"].items()]),
+            familia("tesla_router_ahorro_segundos", "gauge", "Latencia de proveedor evitada (estimada)",
+                    [({}, ahorro["segundos"] or 0.0)]),
+            familia("tesla_router_ahorro_usd", "gauge", "Costo de proveedor evitado (estimado)",
+                    [({}, ahorro["costo_usd"] or 0.0)]),
+        ]
@@ -1,17 +1,58 @@
 import os
 import sqlite3
+import sys
 from pathlib import Path
 
+from backup import crear_backup
+from database import DATABASE_URL, ruta_sqlite
+from image_manifest import ImageManifest
+
+# None cuando DATABASE_URL apunta a PostgreSQL: ahí la API crea sus tablas al arrancar
+DB_PATH = ruta_sqlite(DATABASE_URL, str(Path(__file__).resolve().parent / "data" / "tesla.db"))
+
+# Columnas de marcador por foto, calculadas una vez por optimizar_imagenes.py
+COLUMNAS_PLACEHOLDER = (("ancho", "INTEGER", "width"), ("alto", "INTEGER", "height"),
+                        ("blurhash", "TEXT", "blurhash"), ("lqip", "TEXT", "lqip"))
+
+
+def actualizar_placeholders_servicios(conn, manifest=None):
+    """Copiar dimensiones, BlurHash y LQIP del manifiesto de imágenes a servicios"""
+    manifest = manifest or ImageManifest()
+    cursor = conn.cursor()
+    existentes = {row[1] for row in cursor.execute("PRAGMA table_info(servicios)")}
+    for i in (1, 2, 3):
+        for nombre, tipo, _ in COLUMNAS_PLACEHOLDER:
+            if f"foto{i}_{nombre}" not in existentes:
+                cursor.execute(f"ALTER TABLE servicios ADD COLUMN foto{i}_{nombre} {tipo}")
+
+    actualizadas = 0
+    filas = cursor.execute("SELECT id, foto1_url, foto2_url, foto3_url FROM servicios").fetchall()
+    for servicio_id, *urls in filas:
+        for i, url in enumerate(urls, start=1):
+            if not url:
+                continue
+            responsive = manifest.responsive(url)
+            if not responsive["srcset"]:
+                continue
+            asignaciones = ", ".join(f"foto{i}_{nombre} = ?" for nombre, _, _ in COLUMNAS_PLACEHOLDER)
+            cursor.execute(f"UPDATE servicios SET {asignaciones} WHERE id = ?",
+                           [responsive[clave] for _, _, clave in COLUMNAS_PLACEHOLDER] + [servicio_id])
+            actualizadas += 1
+    conn.commit()
+    cursor.close()
+    return actualizadas
+
+
 def setup_database():
     # Create data directory if it doesn't exist
-    data_dir = Path("e:/WEB_TESLA_ITSE0003/tesla_complete/backend/data")
-    data_dir.mkdir(parents=True, exist_ok=True)
-    
-    db_path = data_dir / "tesla.db"
+    db_path = Path(DB_PATH)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
     
-    # Remove existing database if it exists
+    # Remove existing database if it exists (after taking a verified snapshot)
     if db_path.exists():
         try:
+            snapshot = crear_backup(str(db_path), etiqueta="-presetup")
+            print(f"💾 Backup saved to {snapshot['ruta']}")
             os.remove(db_path)
             print("ℹ️  Existing database removed.")
         except Exception as e:
@@ -70,6 +111,18 @@ def setup_database():
         foto1_url TEXT,
         foto2_url TEXT,
         foto3_url TEXT,
+        foto1_ancho INTEGER,
+        foto1_alto INTEGER,
+        foto1_blurhash TEXT,
+        foto1_lqip TEXT,
+        foto2_ancho INTEGER,
+        foto2_alto INTEGER,
+        foto2_blurhash TEXT,
+        foto2_lqip TEXT,
+        foto3_ancho INTEGER,
+        foto3_alto INTEGER,
+        foto3_blurhash TEXT,
+        foto3_lqip TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
 
@@ -117,10 +170,12 @@ def setup_database():
         
         cursor.execute("SELECT COUNT(*) FROM servicios")
         service_count = cursor.fetchone()[0]
+        placeholder_count = actualizar_placeholders_servicios(conn)
         
         print("✅ Database setup completed successfully!")
         print(f"📊 Tables created: {', '.join(tables)}")
         print(f"🛠️  {service_count} services inserted")
+        print(f"🖼️  {placeholder_count} photos with BlurHash/LQIP placeholders")
         
         return True
         
@@ -132,4 +187,15 @@ def setup_database():
             conn.close()
 
 if __name__ == "__main__":
-    setup_database()
+    if DB_PATH is None:
+        print("❌ DATABASE_URL is not SQLite; the API creates its PostgreSQL tables on startup")
+        sys.exit(1)
+    if "--placeholders" in sys.argv:
+        # Solo refrescar los marcadores de imagen sin recrear la base de datos
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            print(f"🖼️  {actualizar_placeholders_servicios(conn)} photos updated")
+        finally:
+            conn.close()
+    else:
+        setup_database()
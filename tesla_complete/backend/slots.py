@@ -0,0 +1,187 @@
+"""
+Extracción de datos de cotización de los mensajes del chat.
+
+El bot pide "área total del local en m²", tipo de negocio, tipo de terreno o
+distrito, pero las respuestas no se leían: `calcular_cotizacion` dependía de
+un /api/lead aparte. `extraer()` saca en una sola pasada de una expresión
+regular compilada (un grupo con nombre por dato):
+
+- metraje: número con m2, m², mts, metros ("80 m2", "1,200 metros")
+- sector: restaurante, comercio, oficina, industria o vivienda, y el
+  tipo_negocio que usa calcular_cotizacion (comercial, industrial, ...)
+- terreno: arcilloso, arenoso o rocoso
+- distrito: distritos de Huancayo y del resto de Junín, donde está la
+  empresa, y de Lima y Callao (con alias: "san agustin", "surco", "sjl")
+- telefono y nombre ("me llamo Ana", "987 654 321"), para registrar el lead
+- fecha y hora de la visita ("mañana a las 10", "el lunes", "25/10 3pm")
+
+Solo se devuelven los datos encontrados; el primero de cada tipo gana. El
+chat los acumula en el contexto de la conversación para cotizar en cuanto
+estén completos.
+"""
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from retrieval import normalizar
+
+SECTORES = {
+    "restaurante": ["restaurante", "restaurant", "restobar", "bar", "cevicheria", "polleria", "pizzeria",
+                    "cafeteria", "discoteca"],
+    "comercio": ["comercio", "comercial", "tienda", "bodega", "minimarket", "farmacia", "botica", "galeria"],
+    "oficina": ["oficina", "consultorio"],
+    "industria": ["industria", "industrial", "fabrica", "almacen", "taller", "planta industrial"],
+    "vivienda": ["vivienda", "residencial", "casa", "departamento", "depa", "residencia", "hogar", "domicilio"],
+}
+# Factores de calcular_cotizacion (main.py)
+TIPO_NEGOCIO = {
+    "restaurante": "comercial",
+    "comercio": "comercial",
+    "oficina": "oficina",
+    "industria": "industrial",
+    "vivienda": "residencial",
+}
+TERRENOS = {
+    "arcilloso": ["arcilloso", "arcillosa", "arcilla"],
+    "arenoso": ["arenoso", "arenosa", "arena"],
+    "rocoso": ["rocoso", "rocosa", "roca", "pedregoso", "pedregosa"],
+}
+# Provincia de Huancayo y capitales de las otras provincias de Junín
+DISTRITOS_JUNIN = [
+    "Huancayo", "El Tambo", "Chilca", "Pilcomayo", "San Agustín de Cajas", "Sapallanga", "Huancán", "Huayucachi",
+    "San Jerónimo de Tunán", "Sicaya", "Hualhuas", "Quilcas", "Saño", "Viques", "Chupuro", "Cullhuas",
+    "Huacrapuquio", "Pucará", "Chongos Alto", "Pariahuanca", "Santo Domingo de Acobamba", "Quichuay",
+    "Concepción", "Jauja", "Chupaca", "Tarma", "La Oroya", "Satipo", "Chanchamayo", "San Ramón", "Pichanaqui",
+    "Perené", "Junín",
+]
+DISTRITOS_LIMA = [
+    "Ancón", "Ate", "Barranco", "Breña", "Carabayllo", "Chaclacayo", "Chorrillos", "Cieneguilla", "Comas",
+    "El Agustino", "Independencia", "Jesús María", "La Molina", "La Victoria", "Lince", "Los Olivos",
+    "Lurigancho", "Lurín", "Magdalena del Mar", "Miraflores", "Pachacámac", "Pucusana", "Pueblo Libre",
+    "Puente Piedra", "Punta Hermosa", "Punta Negra", "Rímac", "San Bartolo", "San Borja", "San Isidro",
+    "San Juan de Lurigancho", "San Juan de Miraflores", "San Luis", "San Martín de Porres", "San Miguel",
+    "Santa Anita", "Santa María del Mar", "Santa Rosa", "Santiago de Surco", "Surquillo", "Villa El Salvador",
+    "Villa María del Triunfo", "Cercado de Lima", "Callao", "Bellavista", "Carmen de la Legua", "La Perla",
+    "Ventanilla", "Mi Perú",
+]
+DISTRITOS = DISTRITOS_JUNIN + DISTRITOS_LIMA
+ALIAS_DISTRITOS = {
+    "san agustin": "San Agustín de Cajas",
+    "san jeronimo": "San Jerónimo de Tunán",
+    "la merced": "Chanchamayo",
+    "pichanaki": "Pichanaqui",
+    "surco": "Santiago de Surco",
+    "sjl": "San Juan de Lurigancho",
+    "sjm": "San Juan de Miraflores",
+    "smp": "San Martín de Porres",
+    "ves": "Villa El Salvador",
+    "vmt": "Villa María del Triunfo",
+    "magdalena": "Magdalena del Mar",
+    "chosica": "Lurigancho",
+    "cercado": "Cercado de Lima",
+}
+DIAS_SEMANA = ["lunes", "martes", "miercoles", "jueves", "viernes", "sabado", "domingo"]
+
+
+def _invertir(grupos: Dict[str, list]) -> Dict[str, str]:
+    return {normalizar(palabra): nombre for nombre, palabras in grupos.items() for palabra in palabras}
+
+
+_SECTOR = _invertir(SECTORES)
+_TERRENO = _invertir(TERRENOS)
+_DISTRITO = {normalizar(d): d for d in DISTRITOS}
+_DISTRITO.update(ALIAS_DISTRITOS)
+
+
+def _alternativas(palabras) -> str:
+    # Las más largas primero: "san juan de miraflores" antes que "miraflores"
+    return "|".join(re.escape(p).replace(r"\ ", r"\s+") for p in sorted(palabras, key=len, reverse=True))
+
+
+_SLOTS_RE = re.compile(
+    r"(?P<telefono>(?:\+?51\s*)?9\d{2}[\s-]?\d{3}[\s-]?\d{3})\b"
+    r"|\b(?:me llamo|mi nombre es)\s+(?P<nombre>[a-zñ]+(?:\s+(?!y\b|de\b|mi\b)[a-zñ]+)?)"
+    r"|\b(?P<fecha>pasado\s+mañana|(?<!la\s)mañana|hoy|" + "|".join(DIAS_SEMANA) + r"|\d{1,2}/\d{1,2})\b"
+    r"|\b(?:a\s+las\s+)?(?P<hora>\d{1,2}(?::\d{2})?)\s*(?P<meridiano>am|pm|hrs|h)\b"
+    r"|\ba\s+las\s+(?P<hora_sola>\d{1,2}(?::\d{2})?)\b"
+    r"|(?P<metraje>\d{1,3}(?:[.,]\d{3})+|\d+(?:[.,]\d+)?)\s*(?:m2|mt2|mts2|metros?(?:\s+cuadrados?)?|mts?|m)\b"
+    rf"|\b(?P<sector>{_alternativas(_SECTOR)})(?:es|s)?\b"
+    rf"|\b(?P<terreno>{_alternativas(_TERRENO)})s?\b"
+    rf"|\b(?P<distrito>{_alternativas(_DISTRITO)})\b"
+)
+
+
+def _numero(texto: str) -> float:
+    """80 -> 80.0; 1,200 / 1.200 -> 1200.0 (miles); 80,5 -> 80.5"""
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", texto):
+        return float(re.sub(r"[.,]", "", texto))
+    return float(texto.replace(",", "."))
+
+
+def _fecha(texto: str, hoy: date) -> Optional[str]:
+    """Fecha ISO de "hoy", "mañana", un día de la semana (el próximo) o dd/mm"""
+    if texto == "hoy":
+        return hoy.isoformat()
+    if texto == "mañana":
+        return (hoy + timedelta(days=1)).isoformat()
+    if texto.startswith("pasado"):
+        return (hoy + timedelta(days=2)).isoformat()
+    if texto in DIAS_SEMANA:
+        dias = (DIAS_SEMANA.index(texto) - hoy.weekday()) % 7 or 7
+        return (hoy + timedelta(days=dias)).isoformat()
+    dia, mes = (int(parte) for parte in texto.split("/"))
+    try:
+        fecha = date(hoy.year, mes, dia)
+    except ValueError:
+        return None
+    # Sin año: una fecha ya pasada es del año siguiente
+    return (fecha if fecha >= hoy else fecha.replace(year=hoy.year + 1)).isoformat()
+
+
+def _hora(texto: str, meridiano: Optional[str] = None) -> Optional[str]:
+    hora, _, minutos = texto.partition(":")
+    hora, minutos = int(hora), int(minutos or 0)
+    if meridiano == "pm" and hora < 12:
+        hora += 12
+    elif meridiano == "am" and hora == 12:
+        hora = 0  # "12am": medianoche
+    elif meridiano is None and 1 <= hora <= 7:
+        hora += 12  # "a las 3": horario de visitas, no de madrugada
+    return f"{hora:02d}:{minutos:02d}" if hora < 24 and minutos < 60 else None
+
+
+def extraer(texto: str, hoy: Optional[date] = None) -> Dict[str, Any]:
+    """Datos de cotización presentes en el mensaje (una pasada de la expresión regular)"""
+    slots: Dict[str, Any] = {}
+    normalizado = normalizar(texto)
+    # Los nombres se toman del texto original (con tildes) si la normalización no cambió los largos
+    original = texto if len(texto) == len(normalizado) else normalizado
+    for coincidencia in _SLOTS_RE.finditer(normalizado):
+        nombre = coincidencia.lastgroup
+        if nombre in ("meridiano", "hora_sola"):
+            nombre = "hora"
+        if nombre in slots:
+            continue
+        valor = coincidencia.group(nombre) if nombre != "hora" else None
+        if nombre == "telefono":
+            slots["telefono"] = re.sub(r"\D", "", valor)[-9:]
+        elif nombre == "nombre":
+            slots["nombre"] = original[coincidencia.start("nombre"):coincidencia.end("nombre")].title()
+        elif nombre == "fecha":
+            fecha = _fecha(re.sub(r"\s+", " ", valor), hoy or date.today())
+            if fecha:
+                slots["fecha"] = fecha
+        elif nombre == "hora":
+            hora = _hora(coincidencia.group("hora") or coincidencia.group("hora_sola"), coincidencia.group("meridiano"))
+            if hora:
+                slots["hora"] = hora
+        elif nombre == "metraje":
+            slots["metraje"] = _numero(valor)
+        elif nombre == "sector":
+            slots["sector"] = _SECTOR[re.sub(r"\s+", " ", valor)]
+            slots["tipo_negocio"] = TIPO_NEGOCIO[slots["sector"]]
+        elif nombre == "terreno":
+            slots["terreno"] = _TERRENO[valor]
+        else:
+            slots["distrito"] = _DISTRITO[re.sub(r"\s+", " ", valor)]
+    return slots
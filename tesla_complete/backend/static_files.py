@@ -0,0 +1,312 @@
+"""
+Servidor de archivos estáticos para cuando el backend corre sin nginx.
+
+- El índice (tamaño, tipo, ETag y variantes .br/.gz) se arma una sola vez
+  al arrancar; por request solo se hace un stat para detectar cambios.
+- Los archivos con hash en el nombre (foto1-640.3f2a9c1e.webp) se sirven
+  como immutable y su ETag es ese hash, sin leer el archivo.
+- Respeta If-None-Match / If-Modified-Since (304) y Range / If-Range (206).
+- Si existe una variante precomprimida (.br o .gz) y el cliente la acepta,
+  se envía tal cual, sin comprimir en cada request.
+- Solo se sirven archivos cuyo realpath queda dentro del directorio: un
+  symlink hacia afuera (/etc/passwd) no se indexa ni se precomprime.
+- El cuerpo se envía con la extensión ASGI zerocopy (sendfile) o pathsend
+  cuando el servidor la ofrece; si no, en bloques leídos en un hilo.
+
+Las variantes se generan con:
+    python static_files.py --precompress [directorio]
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from compression import COMPRESSIBLE_TYPES, accepted_encodings, brotli
+from image_manifest import STATIC_ROOT
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+CHUNK_SIZE = 64 * 1024
+PRECOMPRESS_MIN_SIZE = int(os.getenv("STATIC_PRECOMPRESS_MIN_SIZE", "1024"))
+CACHE_IMMUTABLE = b"public, max-age=31536000, immutable"
+# Nombres sin hash: se pueden cachear pero hay que revalidar con el ETag
+CACHE_REVALIDATE = os.getenv("STATIC_CACHE_CONTROL", "public, max-age=0, must-revalidate").encode()
+
+HASHED_NAME = re.compile(r"\.([0-9a-f]{8,})\.[A-Za-z0-9]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+VARIANTES = (("br", ".br"), ("gzip", ".gz"))
+
+
+class StaticEntry:
+    __slots__ = ("path", "size", "mtime", "etag", "content_type", "last_modified", "immutable", "variants")
+
+    def __init__(self, path: str, size: int, mtime: float, etag: str, content_type: str,
+                 immutable: bool, variants: Dict[str, Tuple[str, int]]):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.etag = etag
+        self.content_type = content_type
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.immutable = immutable
+        self.variants = variants
+
+
+def _hash_archivo(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(bloque)
+    return digest.hexdigest()[:16]
+
+
+def _dentro(ruta: str, raiz: str) -> bool:
+    """El archivo real (resueltos los symlinks) está dentro de raiz, que ya es un realpath"""
+    return os.path.commonpath([os.path.realpath(ruta), raiz]) == raiz
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(inicio, fin inclusivo) de un rango simple; None si no es satisfacible"""
+    match = RANGE_RE.match(header.strip())
+    if not match or not size:
+        return None
+    inicio, fin = match.groups()
+    if not inicio:
+        if not fin or int(fin) == 0:
+            return None
+        return max(0, size - int(fin)), size - 1
+    inicio = int(inicio)
+    fin = min(int(fin), size - 1) if fin else size - 1
+    if inicio > fin:
+        return None
+    return inicio, fin
+
+
+class StaticFiles:
+    """Aplicación ASGI para montar con app.mount("/static", StaticFiles())"""
+
+    def __init__(self, directory: Path = STATIC_ROOT):
+        self.directory = os.path.realpath(directory)
+        self.index: Dict[str, StaticEntry] = {}
+        self.scan()
+
+    def scan(self):
+        """Indexar todo el directorio (se llama una vez al arrancar)"""
+        self.index.clear()
+        if not os.path.isdir(self.directory):
+            logger.warning(f"Directorio de estáticos no encontrado: {self.directory}")
+            return
+        for raiz, _, archivos in os.walk(self.directory):
+            for archivo in archivos:
+                if archivo.endswith((".br", ".gz", ".tmp")):
+                    continue
+                ruta = os.path.join(raiz, archivo)
+                if not _dentro(ruta, self.directory):
+                    logger.warning(f"Estático fuera del directorio ignorado: {ruta}")
+                    continue
+                relativa = os.path.relpath(ruta, self.directory).replace(os.sep, "/")
+                self.index[relativa] = self._build_entry(ruta)
+        logger.info(f"Estáticos indexados: {len(self.index)} archivos en {self.directory}")
+
+    def _build_entry(self, ruta: str, st: Optional[os.stat_result] = None) -> StaticEntry:
+        st = st or os.stat(ruta)
+        hashed = HASHED_NAME.search(os.path.basename(ruta))
+        etag = hashed.group(1) if hashed else _hash_archivo(ruta)
+        content_type = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+
+        variants = {}
+        for encoding, sufijo in VARIANTES:
+            try:
+                vst = os.stat(ruta + sufijo)
+            except OSError:
+                continue
+            if not _dentro(ruta + sufijo, self.directory):
+                continue
+            # Una variante más vieja que el original quedó desactualizada
+            if vst.st_mtime >= st.st_mtime:
+                variants[encoding] = (ruta + sufijo, vst.st_size)
+        return StaticEntry(ruta, st.st_size, st.st_mtime, f'"{etag}"', content_type, bool(hashed), variants)
+
+    def lookup(self, path: str) -> Optional[StaticEntry]:
+        relativa = path.lstrip("/")
+        if not relativa or "\x00" in relativa or any(p in ("..", ".") for p in relativa.split("/")):
+            return None
+        ruta = os.path.join(self.directory, *relativa.split("/"))
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            self.index.pop(relativa, None)
+            return None
+        if not os.path.isfile(ruta):
+            return None
+
+        entry = self.index.get(relativa)
+        if entry is None or entry.size != st.st_size or entry.mtime != st.st_mtime:
+            # Archivo nuevo o modificado desde el arranque
+            if not _dentro(ruta, self.directory):
+                return None
+            entry = self.index[relativa] = self._build_entry(ruta, st)
+        return entry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["method"] not in ("GET", "HEAD"):
+            return await self._send_status(send, 405, [(b"allow", b"GET, HEAD")])
+
+        entry = self.lookup(self._route_path(scope))
+        if entry is None:
+            return await self._send_status(send, 404)
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers") or []}
+        response_headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", entry.content_type.encode()),
+            (b"last-modified", entry.last_modified.encode()),
+            (b"cache-control", CACHE_IMMUTABLE if entry.immutable else CACHE_REVALIDATE),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if entry.variants:
+            response_headers.append((b"vary", b"Accept-Encoding"))
+
+        # Variante precomprimida (no aplica a requests con Range)
+        ruta, tamano, etag = entry.path, entry.size, entry.etag
+        if entry.variants and "range" not in headers:
+            aceptadas = accepted_encodings(headers.get("accept-encoding", ""))
+            # El archivo ya está comprimido: no hace falta el módulo brotli para enviarlo
+            encoding = next((e for e, _ in VARIANTES if e in entry.variants and aceptadas.get(e, 0) > 0), "")
+            if encoding:
+                ruta, tamano = entry.variants[encoding]
+                etag = f'{entry.etag[:-1]}-{encoding}"'
+                response_headers.append((b"content-encoding", encoding.encode()))
+        response_headers.append((b"etag", etag.encode()))
+
+        if self._not_modified(headers, entry, etag):
+            return await self._send_status(send, 304, [h for h in response_headers if h[0] != b"content-type"])
+
+        status, inicio, fin = 200, 0, tamano - 1
+        rango = headers.get("range")
+        if rango and (headers.get("if-range") in (None, entry.etag, entry.last_modified)):
+            limites = _parse_range(rango, tamano)
+            if limites is None:
+                return await self._send_status(send, 416, [(b"content-range", f"bytes */{tamano}".encode())])
+            status, (inicio, fin) = 206, limites
+            response_headers.append((b"content-range", f"bytes {inicio}-{fin}/{tamano}".encode()))
+
+        longitud = max(0, fin - inicio + 1)
+        response_headers.append((b"content-length", str(longitud).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        if scope["method"] == "HEAD" or not longitud:
+            return await send({"type": "http.response.body", "body": b""})
+        await self._send_file(scope, send, ruta, inicio, longitud, completo=(status == 200))
+
+    @staticmethod
+    def _route_path(scope) -> str:
+        """Ruta dentro del montaje (Starlette puede dejar el prefijo en path)"""
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            return path[len(root_path):]
+        return path
+
+    @staticmethod
+    def _not_modified(headers: Dict[str, str], entry: StaticEntry, etag: str) -> bool:
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            etags = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+            return "*" in etags or etag in etags
+        if_modified_since = headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return int(entry.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    async def _send_status(send, status: int, headers: Optional[List[Tuple[bytes, bytes]]] = None):
+        headers = list(headers or [])
+        if status != 304:
+            headers.append((b"content-length", b"0"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _send_file(scope, send, ruta: str, inicio: int, longitud: int, completo: bool):
+        extensions = scope.get("extensions") or {}
+        if completo and "http.response.pathsend" in extensions:
+            return await send({"type": "http.response.pathsend", "path": ruta})
+
+        with open(ruta, "rb") as f:
+            if "http.response.zerocopy" in extensions:
+                # El servidor usa sendfile() directamente sobre el descriptor
+                return await send({"type": "http.response.zerocopy", "file": f,
+                                   "offset": inicio, "count": longitud})
+            f.seek(inicio)
+            restante = longitud
+            while restante:
+                bloque = await asyncio.to_thread(f.read, min(CHUNK_SIZE, restante))
+                if not bloque:
+                    break
+                restante -= len(bloque)
+                await send({"type": "http.response.body", "body": bloque, "more_body": bool(restante)})
+            if restante:
+                await send({"type": "http.response.body", "body": b""})
+
+
+def precomprimir(directorio: Path = STATIC_ROOT, min_size: int = PRECOMPRESS_MIN_SIZE) -> int:
+    """Generar .gz (y .br si está disponible) para los archivos comprimibles"""
+    generados = 0
+    directorio = os.path.realpath(directorio)
+    for raiz, _, archivos in os.walk(directorio):
+        for archivo in archivos:
+            if archivo.endswith((".br", ".gz", ".tmp")):
+                continue
+            ruta = os.path.join(raiz, archivo)
+            if not _dentro(ruta, directorio):
+                continue
+            tipo = (mimetypes.guess_type(ruta)[0] or "").encode()
+            if not tipo.startswith(COMPRESSIBLE_TYPES) or os.path.getsize(ruta) < min_size:
+                continue
+            mtime = os.path.getmtime(ruta)
+            with open(ruta, "rb") as f:
+                contenido = f.read()
+            compresores = [(".gz", lambda datos: gzip.compress(datos, 9, mtime=0))]
+            if brotli is not None:
+                compresores.append((".br", lambda datos: brotli.compress(datos, quality=11)))
+            for sufijo, comprimir in compresores:
+                destino = ruta + sufijo
+                # Escribir a través de un symlink podría pisar un archivo fuera del directorio
+                if os.path.islink(destino):
+                    continue
+                if os.path.exists(destino) and os.path.getmtime(destino) >= mtime:
+                    continue
+                comprimido = comprimir(contenido)
+                # Solo vale la pena si realmente reduce el tamaño
+                if len(comprimido) < len(contenido) * 0.9:
+                    with open(destino, "wb") as f:
+                        f.write(comprimido)
+                    generados += 1
+    return generados
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Utilidades de archivos estáticos")
+    parser.add_argument("--precompress", action="store_true", help="Generar variantes .gz/.br")
+    parser.add_argument("directorio", nargs="?", default=str(STATIC_ROOT))
+    args = parser.parse_args()
+    if args.precompress:
+        print(f"Variantes generadas: {precomprimir(Path(args.directorio))}")
+    else:
+        parser.print_help()
@@ -0,0 +1,509 @@
+"""
+Bases SQLite sintéticas de gran tamaño para benchmarks.
+
+setup_database.py solo siembra seis servicios e `_insert_demo_data` ocho filas
+de estadísticas, así que preguntas como "¿cómo responde /api/leads con 500k
+leads?" no tenían con qué medirse. Este generador llena cualquiera de los
+esquemas con leads realistas (RUC con dígito verificador válido, celulares
+peruanos, direcciones sobre todo en distritos de Huancayo y Junín), citas en
+horario de atención (lunes a sábado de 8:00 a 18:00), cotizaciones, scores y
+conversaciones de varios turnos que siguen el flujo del chat.
+
+- main / app: las tablas se crean con los handlers de arranque de main.py o
+  app.py (el mismo DDL que en producción, incluidas lead_scores y uso_tokens);
+  las respuestas del chat van una sola vez a responses (response_store.py)
+- setup: el esquema de init_db.sql / setup_database.py
+
+Los datos se generan por lotes de leads con ids explícitos (los hijos no
+consultan nada) y se insertan con executemany en una transacción por lote,
+con las pragmas relajadas (journal en memoria, synchronous=OFF, lock
+exclusivo) y los índices secundarios eliminados durante la carga; al final
+se recrean los índices, se corre ANALYZE y se vuelve a WAL. Con la misma
+semilla el resultado es idéntico. Si la base ya tiene datos se agregan a
+continuación.
+
+Uso:
+    python synthetic_data.py --schema main --leads 100000 --db data/bench.db --reset
+    DATABASE_URL=sqlite:///data/bench.db python benchmarks/load_test.py --app main
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from lead_pipeline import calcular_score
+from response_store import huella
+from retrieval import normalizar
+from slots import DISTRITOS_JUNIN, DISTRITOS_LIMA
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+SYNTH_BATCH = int(os.getenv("SYNTH_BATCH", "20000"))
+
+NOMBRES = """
+Ana Carlos María José Luis Rosa Jorge Carmen Juan Lucía Miguel Elena Pedro Sofía Víctor Patricia Raúl Julia
+Fernando Gabriela Ricardo Diana César Milagros Óscar Verónica Javier Karina Manuel Giovanna Alberto Silvia
+""".split()
+APELLIDOS = """
+Quispe Flores Sánchez Rodríguez García Rojas Huamán Mendoza Torres Vargas Chávez Ramírez Castillo Espinoza
+Díaz Gutiérrez Salazar Paredes Ccori Mamani Condori Ríos Vásquez Morales Cárdenas Palomino Aguilar Poma
+""".split()
+VIAS = ["Av.", "Jr.", "Calle", "Psje.", "Mz. B Lt."]
+NOMBRES_VIA = [
+    "Arequipa", "Brasil", "Javier Prado", "Primavera", "Grau", "Abancay", "Túpac Amaru", "Venezuela", "Colonial",
+    "Angamos", "Benavides", "Larco", "Pardo", "La Marina", "Universitaria", "Los Próceres", "Huaylas", "Canadá",
+    "Aviación", "Salaverry", "Petit Thouars",
+]
+RUBROS = {
+    "restaurante": ["Restaurante", "Pollería", "Cevichería", "Chifa", "Pizzería", "Cafetería"],
+    "comercial": ["Bodega", "Minimarket", "Farmacia", "Ferretería", "Librería", "Boutique"],
+    "oficina": ["Consultorio", "Estudio Contable", "Agencia", "Notaría", "Inmobiliaria"],
+    "industrial": ["Taller", "Almacén", "Fábrica", "Imprenta", "Metalmecánica"],
+    "residencial": [],
+}
+MARCAS = [
+    "El Sabor", "Don Lucho", "La Esquina", "San Martín", "Los Andes", "Santa Rosa", "El Progreso", "Nueva Era",
+    "Virgen de Fátima", "Rímac", "Tradición", "Kallpa", "Inti Raymi", "La Perla", "Sol de Oro", "Mi Tierra",
+]
+SUFIJOS = ["S.A.C.", "E.I.R.L.", "S.R.L.", "S.A."]
+# Peso de cada tipo de negocio en la muestra y rango de metraje (m²)
+TIPOS_NEGOCIO = {
+    "residencial": (0.30, 60, 250),
+    "comercial": (0.30, 30, 400),
+    "restaurante": (0.15, 40, 300),
+    "oficina": (0.15, 40, 600),
+    "industrial": (0.10, 300, 5000),
+}
+ESPECIALISTAS = ["Ing. Rojas", "Ing. Salazar", "Téc. Huamán", "Téc. Mendoza", "Ing. Paredes"]
+TIPOS_VISITA = ["tecnica", "comercial", "seguimiento"]
+URGENCIAS = ["baja", "media", "media", "alta"]
+# Horario de visitas: cada media hora de 8:00 a 17:30
+HORAS_VISITA = [f"{h:02d}:{m:02d}" for h in range(8, 18) for m in (0, 30)]
+PESOS_RUC = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+# Listas con repeticiones según el peso, para elegir con un solo random()
+TIPOS_PONDERADOS = [tipo for tipo, (peso, _, _) in TIPOS_NEGOCIO.items() for _ in range(round(peso * 20))]
+ESTADOS_LEAD = ["nuevo"] * 4 + ["contactado"] * 3 + ["cotizado"] * 2 + ["visitado", "cerrado"]
+ESTADOS_CITA_PASADA = ["completada"] * 4 + ["cancelada"]
+ESTADOS_COTIZACION = ["pendiente"] * 3 + ["aprobada"] * 2 + ["rechazada"]
+HORAS_DIA = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+
+# Servicios, textos del chat y precios (S/) por esquema
+SERVICIOS = {
+    "main": {
+        "itse": ("certificado ITSE", 500, 2500),
+        "pozo_tierra": ("pozo a tierra", 1200, 5000),
+        "mantenimiento": ("mantenimiento eléctrico", 300, 1500),
+        "incendios": ("sistema contra incendios", 2000, 10000),
+        "tableros": ("tablero eléctrico", 1500, 8000),
+        "suministros": ("materiales eléctricos", 200, 3000),
+    },
+    "app": {
+        "itse": ("certificado ITSE", 500, 2500),
+        "instalaciones": ("instalación eléctrica", 800, 6000),
+        "automatizacion": ("automatización del hogar", 2500, 12000),
+        "mantenimiento": ("mantenimiento eléctrico", 300, 1500),
+    },
+}
+SERVICIOS["setup"] = SERVICIOS["main"]
+
+
+def ruc(prefijo: int, numero: int) -> str:
+    """RUC de 11 dígitos con dígito verificador módulo 11 (10 persona natural, 20 empresa)"""
+    cuerpo = f"{prefijo}{numero:08d}"
+    digito = 11 - sum(int(d) * p for d, p in zip(cuerpo, PESOS_RUC)) % 11
+    return cuerpo + str(digito % 10)
+
+
+class GeneradorSintetico:
+    """Registros reproducibles (misma semilla, mismos datos) para un esquema"""
+
+    def __init__(self, esquema: str, semilla: int = 42, dias: int = 365, hoy: Optional[date] = None):
+        self.esquema = esquema
+        self.r = random.Random(semilla)
+        self.servicios = SERVICIOS[esquema]
+        self.claves_servicio = list(self.servicios)
+        hoy = hoy or date.today()
+        self.dias = dias
+        inicio = hoy - timedelta(days=dias)
+        # Fechas como texto precalculado; las citas llegan hasta 30 días en el futuro
+        self.fechas = [(inicio + timedelta(days=d)).isoformat() for d in range(dias + 31)]
+        self.indice_hoy = dias
+        # Próximo día hábil (lunes a sábado) desde cada día
+        self.habil = []
+        for d in range(dias + 31):
+            self.habil.append(d + 1 if (inicio + timedelta(days=d)).weekday() == 6 else d)
+        self.tipos = list(TIPOS_NEGOCIO)
+        # La empresa está en Huancayo: la mayoría de los clientes son de Junín
+        self.distritos = DISTRITOS_JUNIN * 4 + DISTRITOS_LIMA
+        # Huellas de las respuestas ya emitidas a la tabla responses
+        self.respuestas = set()
+        self._aleatorio = self.r.random
+
+    # random() indexado: varias veces más rápido que choice()/randrange() por millones de filas
+    def _elegir(self, opciones):
+        return opciones[int(self._aleatorio() * len(opciones))]
+
+    def _entre(self, minimo: int, maximo: int) -> int:
+        """Entero en [minimo, maximo)"""
+        return minimo + int(self._aleatorio() * (maximo - minimo))
+
+    def momento(self, dia: int, segundos: int) -> str:
+        """'YYYY-MM-DD HH:MM:SS' del día (índice) y segundos desde medianoche"""
+        return f"{self.fechas[dia + segundos // 86400]} {HORAS_DIA[segundos % 86400]}"
+
+    def lead(self, lead_id: int) -> Dict:
+        r, elegir, entre = self.r, self._elegir, self._entre
+        tipo = elegir(TIPOS_PONDERADOS)
+        _, minimo, maximo = TIPOS_NEGOCIO[tipo]
+        persona = f"{elegir(NOMBRES)} {elegir(APELLIDOS)} {elegir(APELLIDOS)}"
+        if RUBROS[tipo]:
+            nombre = f"{elegir(RUBROS[tipo])} {elegir(MARCAS)} {elegir(SUFIJOS)}"
+            prefijo = 20
+        else:
+            nombre, prefijo = persona, 10
+        usuario = normalizar(persona.split()[0][0] + persona.split()[1]).replace("ñ", "n")
+        dia = entre(0, self.dias)
+        # Más registros en horario de oficina (8:00-20:00)
+        segundos = entre(8 * 3600, 20 * 3600) if r.random() < 0.85 else entre(0, 86400)
+        return {
+            "id": lead_id,
+            "nombre": nombre,
+            "contacto": persona,
+            # Número único por id: 7919 es coprimo con 10^8
+            "ruc": ruc(prefijo, (lead_id * 7919 + 1357) % 10 ** 8),
+            "telefono": f"9{entre(0, 10 ** 8):08d}",
+            "email": f"{usuario}{lead_id}@{elegir(('gmail.com', 'hotmail.com', 'outlook.com'))}",
+            "tipo_negocio": tipo,
+            "direccion": f"{elegir(VIAS)} {elegir(NOMBRES_VIA)} {entre(100, 3000)}, {elegir(self.distritos)}",
+            "metraje": round(min(maximo, minimo * r.lognormvariate(0.4, 0.5))),
+            "licencia_funcionamiento": r.random() < 0.6,
+            "servicio_interes": elegir(self.claves_servicio),
+            "dia": dia,
+            "segundos": segundos,
+            "creado": self.momento(dia, segundos),
+            "estado": elegir(ESTADOS_LEAD),
+        }
+
+    def cita(self, lead: Dict) -> Dict:
+        elegir, entre = self._elegir, self._entre
+        dia = self.habil[min(lead["dia"] + entre(1, 21), len(self.habil) - 2)]
+        estado = elegir(ESTADOS_CITA_PASADA) if dia < self.indice_hoy else "pendiente"
+        return {
+            "lead_id": lead["id"],
+            "fecha": self.fechas[dia],
+            "hora": elegir(HORAS_VISITA),
+            "tipo_visita": elegir(TIPOS_VISITA),
+            "urgencia": elegir(URGENCIAS),
+            "especialista": elegir(ESPECIALISTAS),
+            "estado": estado,
+            "notas": elegir((None, "Llamar antes de llegar", "Ingreso por la puerta lateral", "Traer planos")),
+            "creado": self.momento(lead["dia"], lead["segundos"] + entre(60, 3600)),
+        }
+
+    def cotizacion(self, lead: Dict, monto: Optional[float] = None) -> Dict:
+        r, elegir, entre = self.r, self._elegir, self._entre
+        _, minimo, maximo = self.servicios[lead["servicio_interes"]]
+        if monto is None:
+            monto = round(r.uniform(minimo, maximo), 2)
+        dia = min(lead["dia"] + entre(0, 8), len(self.fechas) - 31)
+        return {
+            "lead_id": lead["id"],
+            "servicio": lead["servicio_interes"],
+            "metraje": lead["metraje"],
+            "monto_total": monto,
+            "estado": elegir(ESTADOS_COTIZACION),
+            "valido_hasta": self.fechas[dia + 30],
+            "creado": self.momento(dia, entre(8 * 3600, 19 * 3600)),
+        }
+
+    def sesion(self, lead: Optional[Dict], session_id: str) -> Tuple[str, str, List[Tuple[str, str, str, str]]]:
+        """(session_id, servicio, turnos) con turnos (mensaje, respuesta, estado del flujo, momento)"""
+        r, elegir, entre = self.r, self._elegir, self._entre
+        if lead is None:
+            dia, segundos = entre(0, self.dias), entre(7 * 3600, 23 * 3600)
+            servicio = elegir(self.claves_servicio)
+            metraje, tipo = entre(30, 400), elegir(self.tipos)
+        else:
+            dia, segundos = lead["dia"], max(0, lead["segundos"] - entre(60, 1800))
+            servicio, metraje, tipo = lead["servicio_interes"], lead["metraje"], lead["tipo_negocio"]
+        texto, minimo, maximo = self.servicios[servicio]
+        guion = [
+            (elegir(("hola", "buenas tardes", "hola, una consulta")),
+             "¡Hola! Soy TeslaBot. ¿En qué servicio puedo ayudarte?", "service_identification"),
+            (f"necesito {texto} para mi {tipo}",
+             f"Para {texto} trabajamos desde S/{minimo}. ¿Cuál es el área de tu local en m²?",
+             "specification_gathering"),
+            (f"son {metraje} m2 en {elegir(self.distritos)}",
+             f"Con {metraje} m² tu cotización referencial es S/{entre(minimo, maximo)}. "
+             "¿Agendamos una visita técnica GRATUITA?", "data_collection"),
+            (elegir(("cuanto demora?", "incluye materiales?", "trabajan los sabados?")),
+             "Sí, lo coordinamos con el especialista en la visita técnica.", "conversation"),
+        ]
+        if lead is not None:
+            guion.append((f"me llamo {lead['contacto'].split()[0]}, mi numero es {lead['telefono']}",
+                          "✅ ¡Gracias! Registramos tu solicitud y te escribiremos por WhatsApp.", "lead_registered"))
+            guion.append((f"el {elegir(('lunes', 'martes', 'jueves', 'sabado'))} a las {entre(9, 17)}",
+                          "📅 Visita técnica agendada. ¡Gracias!", "scheduled"))
+        # Las sesiones sin lead se cortan antes de dejar datos
+        largo = len(guion) if lead is not None else entre(1, len(guion) + 1)
+        turnos = []
+        for mensaje, respuesta, estado in guion[:largo]:
+            segundos += entre(5, 120)
+            turnos.append((mensaje, respuesta, estado, self.momento(dia, segundos)))
+        return session_id, servicio, turnos
+
+
+# Filas por esquema: tabla -> (columnas, función que arma las filas de un lote)
+def _respuesta(gen: GeneradorSintetico, filas: Dict[str, List[tuple]], texto: str) -> str:
+    """Huella de la respuesta (response_store.py); el texto va a responses la primera vez"""
+    clave = huella(texto)
+    if clave not in gen.respuestas:
+        gen.respuestas.add(clave)
+        filas["responses"].append((clave, texto))
+    return clave
+
+
+def _filas_main(gen: GeneradorSintetico, lote: Dict) -> Dict[str, List[tuple]]:
+    filas = {"leads": [], "citas": [], "cotizaciones": [], "responses": [], "conversations": [],
+             "chat_context": [], "lead_scores": []}
+    for lead in lote["leads"]:
+        filas["leads"].append((lead["id"], lead["nombre"], lead["ruc"], lead["telefono"], lead["email"],
+                               lead["tipo_negocio"], lead["direccion"], lead["metraje"],
+                               lead["licencia_funcionamiento"], lead["servicio_interes"], lead["creado"]))
+    for cita in lote["citas"]:
+        filas["citas"].append((cita["lead_id"], cita["fecha"], cita["hora"], cita["tipo_visita"], cita["urgencia"],
+                               cita["notas"], cita["estado"], cita["creado"]))
+    for c in lote["cotizaciones"]:
+        filas["cotizaciones"].append((c["lead_id"], c["servicio"], c["metraje"], c["monto_total"],
+                                      json.dumps({"origen": "sintetico"}), c["creado"]))
+    for session_id, servicio, turnos in lote["sesiones"]:
+        for mensaje, respuesta, _, momento in turnos:
+            filas["conversations"].append((session_id, mensaje, _respuesta(gen, filas, respuesta), servicio,
+                                           momento))
+        filas["chat_context"].append((session_id, turnos[-1][2], servicio, "{}", turnos[-1][3]))
+    filas["lead_scores"] = lote["scores"]
+    return filas
+
+
+def _filas_app(gen: GeneradorSintetico, lote: Dict) -> Dict[str, List[tuple]]:
+    filas = {"leads": [], "citas": [], "responses": [], "conversations": [], "lead_scores": lote["scores"]}
+    citas = {cita["lead_id"]: cita for cita in lote["citas"]}
+    for lead in lote["leads"]:
+        cita = citas.get(lead["id"])
+        filas["leads"].append((
+            lead["id"], lead["contacto"], lead["telefono"], lead["email"], lead["servicio_interes"],
+            None, f"{cita['fecha']} {cita['hora']}" if cita else None, lead["estado"],
+            json.dumps({"tipo_negocio": lead["tipo_negocio"], "metraje": lead["metraje"]}), lead["creado"],
+            lead["creado"],
+        ))
+    for cita in lote["citas"]:
+        filas["citas"].append((cita["lead_id"], f"{cita['fecha']} {cita['hora']}:00", cita["especialista"],
+                               "programada" if cita["estado"] == "pendiente" else cita["estado"], cita["notas"],
+                               cita["creado"]))
+    for session_id, servicio, turnos in lote["sesiones"]:
+        for mensaje, respuesta, estado, momento in turnos:
+            filas["conversations"].append((session_id, mensaje, _respuesta(gen, filas, respuesta), estado, servicio,
+                                           momento))
+    return filas
+
+
+def _filas_setup(gen: GeneradorSintetico, lote: Dict) -> Dict[str, List[tuple]]:
+    filas = {"leads": [], "citas": [], "cotizaciones": [], "conversaciones": []}
+    servicio_id = {clave: i for i, clave in enumerate(gen.claves_servicio, start=1)}
+    for lead in lote["leads"]:
+        filas["leads"].append((lead["id"], lead["nombre"], lead["ruc"], lead["telefono"], lead["email"],
+                               lead["tipo_negocio"], lead["direccion"], lead["metraje"],
+                               lead["licencia_funcionamiento"], lead["estado"], lead["servicio_interes"],
+                               lead["creado"]))
+    for cita in lote["citas"]:
+        filas["citas"].append((cita["lead_id"], cita["fecha"], cita["hora"], cita["especialista"],
+                               cita["tipo_visita"], "programada" if cita["estado"] == "pendiente" else "realizada"
+                               if cita["estado"] == "completada" else "cancelada", cita["notas"], cita["creado"]))
+    for c in lote["cotizaciones"]:
+        filas["cotizaciones"].append((c["lead_id"], servicio_id[c["servicio"]], c["monto_total"], None,
+                                      c["estado"], c["valido_hasta"], c["creado"]))
+    for lead_id, (_, servicio, turnos) in zip(lote["sesion_lead"], lote["sesiones"]):
+        for mensaje, respuesta, _, momento in turnos:
+            filas["conversaciones"].append((lead_id, mensaje, respuesta, servicio, momento))
+    return filas
+
+
+COLUMNAS = {
+    "main": {
+        "leads": "id, nombre, ruc, telefono, email, tipo_negocio, direccion, metraje, licencia_funcionamiento, "
+                 "servicio_interes, fecha_registro",
+        "citas": "lead_id, fecha, hora, tipo_visita, urgencia, notas, estado, fecha_creacion",
+        "cotizaciones": "lead_id, servicio, metraje, monto_total, detalles, fecha_creacion",
+        "responses": "hash, texto",
+        "conversations": "session_id, user_message, response_hash, servicio_interes, timestamp",
+        "chat_context": "session_id, estado, servicio_interes, slots, actualizado_at",
+        "lead_scores": "lead_id, score, categoria, monto_estimado, cotizacion, session_id, procesado_at",
+    },
+    "app": {
+        "leads": "id, nombre, telefono, email, servicio, presupuesto, fecha_cita, estado, notas, created_at, "
+                 "updated_at",
+        "citas": "lead_id, fecha_hora, especialista, estado, notas, created_at",
+        "responses": "hash, texto",
+        "conversations": "user_id, message, response_hash, stage, context, timestamp",
+        "lead_scores": "lead_id, score, categoria, monto_estimado, cotizacion, session_id, procesado_at",
+    },
+    "setup": {
+        "leads": "id, nombre, ruc, telefono, email, tipo_negocio, direccion, metraje, tiene_licencia, estado, "
+                 "servicio_interes, created_at",
+        "citas": "lead_id, fecha_cita, hora_cita, especialista, tipo_visita, estado, notas, created_at",
+        "cotizaciones": "lead_id, servicio_id, monto_total, detalles, estado, valido_hasta, created_at",
+        "conversaciones": "lead_id, mensaje, respuesta, contexto, timestamp",
+    },
+}
+FILAS = {"main": _filas_main, "app": _filas_app, "setup": _filas_setup}
+
+
+def crear_esquema(esquema: str, ruta: str) -> Optional[Callable[[Dict], Optional[Dict]]]:
+    """Crear las tablas del esquema en `ruta`; devuelve la función de pre-cotización del backend, si tiene"""
+    Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+    if esquema == "setup":
+        conn = sqlite3.connect(ruta)
+        try:
+            existe = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'leads'").fetchone()
+            if not existe:
+                conn.executescript((BACKEND_DIR / "init_db.sql").read_text(encoding="utf-8"))
+        finally:
+            conn.close()
+        return None
+
+    # Los handlers de arranque del backend crean sus tablas (y las de lead_pipeline, uso_tokens...)
+    os.environ["DATABASE_URL"] = f"sqlite:///{Path(ruta).resolve()}"
+    for variable in ("BACKUP_INTERVAL_MINUTES", "ARCHIVE_INTERVAL_HOURS", "USAGE_FLUSH_SECONDS"):
+        os.environ[variable] = "0"
+    sys.path.insert(0, str(BACKEND_DIR))
+    modulo = importlib.import_module(esquema)
+
+    async def arrancar():
+        await modulo.app.router.startup()
+        await modulo.app.router.shutdown()
+    asyncio.run(arrancar())
+    return modulo.lead_pipeline.quote_fn
+
+
+def generar_lote(gen: GeneradorSintetico, desde: int, hasta: int, citas: float, cotizaciones: float,
+                 sesiones: float, cotizar: Optional[Callable]) -> Dict:
+    r = gen.r
+    lote = {"leads": [], "citas": [], "cotizaciones": [], "sesiones": [], "sesion_lead": [], "scores": []}
+    for lead_id in range(desde, hasta):
+        lead = gen.lead(lead_id)
+        lote["leads"].append(lead)
+        # Una sesión con el lead (la que terminó en el registro) y otras anónimas
+        session_id, servicio, turnos = gen.sesion(lead, f"sim-{lead_id:x}")
+        lote["sesiones"].append((session_id, servicio, turnos))
+        lote["sesion_lead"].append(lead_id)
+        anonimas = int(sesiones) + (r.random() < sesiones - int(sesiones))
+        for k in range(1, anonimas + 1):
+            lote["sesiones"].append(gen.sesion(None, f"sim-{lead_id:x}-{k}"))
+            lote["sesion_lead"].append(None)
+        if r.random() < citas:
+            lote["citas"].append(gen.cita(lead))
+        precotizacion = cotizar(lead) if cotizar is not None else None
+        if r.random() < cotizaciones:
+            monto = precotizacion["monto_total"] if precotizacion else None
+            lote["cotizaciones"].append(gen.cotizacion(lead, monto))
+        score, categoria = calcular_score(lead, [turno[0] for turno in turnos])
+        lote["scores"].append((
+            lead_id, score, categoria, precotizacion["monto_total"] if precotizacion else None,
+            json.dumps(precotizacion, ensure_ascii=False) if precotizacion else None, session_id, lead["creado"],
+        ))
+    return lote
+
+
+def _relajar(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode=MEMORY")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256 MB
+
+
+def _restaurar(conn: sqlite3.Connection):
+    conn.execute("PRAGMA locking_mode=NORMAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+
+
+def poblar(esquema: str, ruta: str, leads: int, citas: float = 0.4, cotizaciones: float = 0.6,
+           sesiones: float = 0.5, semilla: int = 42, dias: int = 365, lote: int = SYNTH_BATCH) -> Dict[str, int]:
+    """Agregar `leads` leads con sus citas, cotizaciones y conversaciones; devuelve filas por tabla"""
+    cotizar = crear_esquema(esquema, ruta)
+    columnas = COLUMNAS[esquema]
+    gen = GeneradorSintetico(esquema, semilla, dias)
+
+    conn = sqlite3.connect(ruta, isolation_level=None)
+    try:
+        _relajar(conn)
+        tablas = [tabla for tabla in columnas if conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()]
+        # Índices secundarios fuera durante la carga (los UNIQUE/PK automáticos no se pueden quitar)
+        indices = conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            f"AND tbl_name IN ({','.join('?' * len(tablas))})", tablas
+        ).fetchall()
+        for nombre, _ in indices:
+            conn.execute(f'DROP INDEX "{nombre}"')
+
+        inicio_id = (conn.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0]) + 1
+        # responses puede tener ya esas huellas si la base tenía datos
+        verbos = {"responses": "INSERT OR IGNORE"}
+        sentencias = {tabla: f"{verbos.get(tabla, 'INSERT')} INTO {tabla} ({columnas[tabla]}) VALUES "
+                             f"({','.join('?' * len(columnas[tabla].split(',')))})" for tabla in tablas}
+        totales = dict.fromkeys(tablas, 0)
+        for desde in range(inicio_id, inicio_id + leads, lote):
+            hasta = min(desde + lote, inicio_id + leads)
+            filas = FILAS[esquema](gen, generar_lote(gen, desde, hasta, citas, cotizaciones, sesiones, cotizar))
+            conn.execute("BEGIN")
+            for tabla in tablas:
+                conn.executemany(sentencias[tabla], filas[tabla])
+                totales[tabla] += len(filas[tabla])
+            conn.execute("COMMIT")
+
+        for _, sql in indices:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+        _restaurar(conn)
+    finally:
+        conn.close()
+    return totales
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Llenar una base SQLite con datos sintéticos realistas")
+    parser.add_argument("--schema", choices=("main", "app", "setup"), default="main")
+    parser.add_argument("--db", default="data/bench.db", help="Archivo SQLite destino")
+    parser.add_argument("--leads", type=int, default=100000)
+    parser.add_argument("--citas", type=float, default=0.4, help="Citas por lead (fracción)")
+    parser.add_argument("--cotizaciones", type=float, default=0.6, help="Cotizaciones por lead (fracción)")
+    parser.add_argument("--sesiones", type=float, default=0.5,
+                        help="Sesiones de chat anónimas (sin lead) por lead, además de la del lead")
+    parser.add_argument("--dias", type=int, default=365, help="Antigüedad máxima de los registros")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="Borrar la base antes de generar")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.db):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + sufijo):
+                os.remove(args.db + sufijo)
+    inicio = time.perf_counter()
+    totales = poblar(args.schema, args.db, args.leads, args.citas, args.cotizaciones, args.sesiones,
+                     args.seed, args.dias)
+    segundos = time.perf_counter() - inicio
+    for tabla, filas in totales.items():
+        print(f"📊 {tabla}: {filas:,} filas")
+    total = sum(totales.values())
+    print(f"✅ {total:,} filas en {segundos:.1f} s ({total / segundos:,.0f} filas/s) -> {args.db} "
+          f"({os.path.getsize(args.db) / 1e6:.0f} MB)")
@@ -0,0 +1,310 @@
+"""
+Trazas por request: en qué se fue el tiempo de un /api/chat lento.
+
+- span("db.write") / @trazar("ai.openai"): registran la duración de una etapa
+  en la traza del request actual (contextvar). Sin traza activa no hacen nada
+  más que leer la contextvar, así que se pueden dejar en el camino caliente.
+- TracingMiddleware: muestrea TRACE_SAMPLE_RATE de los requests (o los que
+  traen "X-Trace: 1" o un traceparent muestreado) y responde con la cabecera
+  Server-Timing agregada por etapa.
+- ExportadorTrazas: con TRACE_EXPORT_PATH y/o TRACE_EXPORT_URL escribe las
+  trazas muestreadas en formato OTLP/JSON (una línea por lote) o las envía a
+  un colector OpenTelemetry por HTTP (.../v1/traces), en segundo plano.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import time
+import urllib.request
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+# La cabecera expone tiempos internos: se puede apagar si la API es pública
+TRACE_SERVER_TIMING = os.getenv("TRACE_SERVER_TIMING", "1") != "0"
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "5"))
+TRACE_EXPORT_MAX_QUEUE = int(os.getenv("TRACE_EXPORT_MAX_QUEUE", "2000"))
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "tesla-api")
+
+
+class Traza:
+    """Spans de un request: (nombre, inicio_ns, fin_ns, atributos, error)"""
+    __slots__ = ("trace_id", "parent_id", "span_id", "nombre", "inicio_ns", "fin_ns", "spans", "atributos")
+
+    def __init__(self, nombre: str, trace_id: Optional[str] = None, parent_id: Optional[str] = None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.parent_id = parent_id
+        self.span_id = os.urandom(8).hex()
+        self.nombre = nombre
+        self.inicio_ns = time.time_ns()
+        self.fin_ns = None
+        self.spans: List[tuple] = []
+        self.atributos: Dict = {}
+
+    def server_timing(self) -> str:
+        """Duraciones sumadas por etapa, más el total hasta el inicio de la respuesta"""
+        etapas: Dict[str, List[float]] = {}
+        for nombre, inicio, fin, _, _ in self.spans:
+            etapa = etapas.setdefault(nombre, [0, 0.0])
+            etapa[0] += 1
+            etapa[1] += (fin - inicio) / 1e6
+        partes = [f'{nombre};desc="{n}x";dur={ms:.2f}' if n > 1 else f"{nombre};dur={ms:.2f}"
+                  for nombre, (n, ms) in etapas.items()]
+        partes.append(f"total;dur={(time.time_ns() - self.inicio_ns) / 1e6:.2f}")
+        return ", ".join(partes)
+
+
+_traza_actual: ContextVar[Optional[Traza]] = ContextVar("traza_actual", default=None)
+
+
+def traza_actual() -> Optional[Traza]:
+    return _traza_actual.get()
+
+
+class _Span:
+    __slots__ = ("traza", "nombre", "atributos", "inicio")
+
+    def __init__(self, traza: Traza, nombre: str, atributos: Dict):
+        self.traza, self.nombre, self.atributos = traza, nombre, atributos
+
+    def __enter__(self):
+        self.inicio = time.time_ns()
+        return self
+
+    def __exit__(self, tipo, *_):
+        self.traza.spans.append((self.nombre, self.inicio, time.time_ns(), self.atributos, tipo is not None))
+        return False
+
+
+# Sin traza activa todos los spans comparten este contexto vacío: ni asignaciones ni relojes
+_SIN_TRAZA = nullcontext()
+
+
+def span(nombre: str, **atributos):
+    """Medir un bloque dentro de la traza del request (no-op si no está muestreado)"""
+    traza = _traza_actual.get()
+    if traza is None:
+        return _SIN_TRAZA
+    return _Span(traza, nombre, atributos)
+
+
+def trazar(nombre: str):
+    """Decorador de span para funciones y corrutinas"""
+    def decorador(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def envoltura_async(*args, **kwargs):
+                if _traza_actual.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(nombre):
+                    return await fn(*args, **kwargs)
+            return envoltura_async
+
+        @functools.wraps(fn)
+        def envoltura(*args, **kwargs):
+            if _traza_actual.get() is None:
+                return fn(*args, **kwargs)
+            with span(nombre):
+                return fn(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _traceparent(valor: bytes):
+    """(trace_id, parent_id, muestreado) de una cabecera W3C traceparent válida"""
+    partes = valor.decode("latin-1").strip().split("-")
+    if len(partes) != 4 or len(partes[1]) != 32 or len(partes[2]) != 16:
+        return None
+    try:
+        muestreado = bool(int(partes[3], 16) & 1)
+    except ValueError:
+        return None
+    return partes[1], partes[2], muestreado
+
+
+def _atributos_otlp(atributos: Dict) -> List[Dict]:
+    salida = []
+    for clave, valor in atributos.items():
+        if isinstance(valor, bool):
+            salida.append({"key": clave, "value": {"boolValue": valor}})
+        elif isinstance(valor, int):
+            salida.append({"key": clave, "value": {"intValue": str(valor)}})
+        elif isinstance(valor, float):
+            salida.append({"key": clave, "value": {"doubleValue": valor}})
+        else:
+            salida.append({"key": clave, "value": {"stringValue": str(valor)}})
+    return salida
+
+
+def spans_otlp(traza: Traza) -> List[Dict]:
+    """Span raíz (SERVER) y spans hijos (INTERNAL) en el formato JSON de OTLP"""
+    raiz = {
+        "traceId": traza.trace_id,
+        "spanId": traza.span_id,
+        "name": traza.nombre,
+        "kind": 2,
+        "startTimeUnixNano": str(traza.inicio_ns),
+        "endTimeUnixNano": str(traza.fin_ns or time.time_ns()),
+        "attributes": _atributos_otlp(traza.atributos),
+    }
+    if traza.parent_id:
+        raiz["parentSpanId"] = traza.parent_id
+    if traza.atributos.get("http.status_code", 0) >= 500:
+        raiz["status"] = {"code": 2}
+
+    spans = [raiz]
+    for nombre, inicio, fin, atributos, error in traza.spans:
+        hijo = {
+            "traceId": traza.trace_id,
+            "spanId": os.urandom(8).hex(),
+            "parentSpanId": traza.span_id,
+            "name": nombre,
+            "kind": 1,
+            "startTimeUnixNano": str(inicio),
+            "endTimeUnixNano": str(fin),
+            "attributes": _atributos_otlp(atributos),
+        }
+        if error:
+            hijo["status"] = {"code": 2}
+        spans.append(hijo)
+    return spans
+
+
+class ExportadorTrazas:
+    """Exporta en lotes las trazas terminadas a un archivo y/o un colector OTLP/HTTP"""
+
+    def __init__(self, path: Optional[str] = TRACE_EXPORT_PATH, url: Optional[str] = TRACE_EXPORT_URL,
+                 interval: float = TRACE_EXPORT_INTERVAL, max_queue: int = TRACE_EXPORT_MAX_QUEUE):
+        self.path = path
+        self.url = url
+        self.interval = interval
+        # Si el exportador se atrasa se pierden las trazas más viejas, nunca se bloquea un request
+        self.pendientes: deque = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.exportadas = 0
+        self.fallidos = 0
+
+    @property
+    def activo(self) -> bool:
+        return bool(self.path or self.url)
+
+    def agregar(self, traza: Traza):
+        if self.activo:
+            self.pendientes.append(traza)
+
+    async def start(self):
+        if not self.activo or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Trazas OTLP cada {self.interval:g}s hacia {self.path or ''} {self.url or ''}".rstrip())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.flush()
+
+    def _documento(self, trazas: List[Traza]) -> bytes:
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _atributos_otlp({"service.name": TRACE_SERVICE_NAME})},
+            "scopeSpans": [{
+                "scope": {"name": "tesla.tracing"},
+                "spans": [s for traza in trazas for s in spans_otlp(traza)],
+            }],
+        }]}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _escribir(self, documento: bytes):
+        if self.path:
+            with open(self.path, "ab") as f:
+                f.write(documento + b"\n")
+        if self.url:
+            request = urllib.request.Request(self.url, data=documento, method="POST",
+                                             headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(request, timeout=5) as respuesta:
+                respuesta.read()
+
+    async def flush(self) -> int:
+        """Exportar lo pendiente; devuelve cuántas trazas salieron"""
+        if not self.pendientes:
+            return 0
+        trazas = list(self.pendientes)
+        self.pendientes.clear()
+        try:
+            await asyncio.to_thread(self._escribir, self._documento(trazas))
+        except Exception as e:
+            self.fallidos += 1
+            logger.error(f"Exportación de trazas falló: {e}")
+            return 0
+        self.exportadas += len(trazas)
+        return len(trazas)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+exportador_trazas = ExportadorTrazas()
+
+
+class TracingMiddleware:
+    """Middleware ASGI: abre la traza de los requests muestreados y agrega Server-Timing"""
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE, exportador: Optional[ExportadorTrazas] = None,
+                 server_timing: bool = TRACE_SERVER_TIMING):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exportador = exportador or exportador_trazas
+        self.server_timing = server_timing
+
+    def _iniciar(self, scope) -> Optional[Traza]:
+        trace_id = parent_id = None
+        muestreado = random.random() < self.sample_rate
+        for clave, valor in scope.get("headers") or ():
+            if clave == b"x-trace":
+                muestreado = muestreado or valor == b"1"
+            elif clave == b"traceparent":
+                padre = _traceparent(valor)
+                if padre:
+                    trace_id, parent_id, muestreado_padre = padre
+                    muestreado = muestreado or muestreado_padre
+        if not muestreado:
+            return None
+        traza = Traza(f"{scope['method']} {scope['path']}", trace_id, parent_id)
+        traza.atributos.update({"http.method": scope["method"], "http.target": scope["path"]})
+        return traza
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traza = self._iniciar(scope)
+        if traza is None:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                traza.atributos["http.status_code"] = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers") or [])
+                    headers.append((b"server-timing", traza.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        token = _traza_actual.set(traza)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _traza_actual.reset(token)
+            # Incluye las tareas en segundo plano (p. ej. el WhatsApp de bienvenida)
+            traza.fin_ns = time.time_ns()
+            self.exportador.agregar(traza)
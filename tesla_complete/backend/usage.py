@@ -0,0 +1,258 @@
+"""
+Contabilidad de tokens y costo de los proveedores de IA por cliente y día.
+
+Las respuestas de OpenAI (`usage`) y Gemini (`usageMetadata`) traen los
+tokens reales de cada llamada y se descartaban. `ContadorUso.registrar()`
+los suma en memoria por (día, sesión, proveedor, modelo), con el costo según
+PRECIOS_MODELO, y un task los vuelca cada USAGE_FLUSH_SECONDS a la tabla
+uso_tokens con un upsert por fila (una transacción por volcado).
+
+La sesión es `clave(ip, session_id)`: el session_id lo elige el cliente, así
+que el presupuesto de la sesión va dentro de uno de su IP
+(USAGE_IP_DAILY_TOKENS) y rotar session_id no da tokens nuevos. Cada worker
+de uvicorn tiene su contador; tras cada volcado se releen los totales del
+día de uso_tokens (más lo aún no volcado), así los presupuestos ven el uso
+de todos los workers con a lo sumo USAGE_FLUSH_SECONDS de atraso y
+sobreviven a un reinicio.
+
+`excedido()` compara la sesión con USAGE_SESSION_DAILY_TOKENS y
+USAGE_SESSION_DAILY_USD, su IP con USAGE_IP_DAILY_TOKENS y el total del día
+con USAGE_DAILY_USD (0 = sin límite); el chat responde con el motor local a
+las sesiones que lo superan. `familias()` expone los contadores para /metrics.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from prometheus import familia
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "60"))
+USAGE_SESSION_DAILY_TOKENS = int(os.getenv("USAGE_SESSION_DAILY_TOKENS", "20000"))
+USAGE_SESSION_DAILY_USD = float(os.getenv("USAGE_SESSION_DAILY_USD", "0"))
+USAGE_IP_DAILY_TOKENS = int(os.getenv("USAGE_IP_DAILY_TOKENS", "100000"))
+USAGE_DAILY_USD = float(os.getenv("USAGE_DAILY_USD", "5"))
+
+# USD por 1000 tokens: (prompt, respuesta)
+PRECIOS_MODELO = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gemini-pro": (0.000125, 0.000375),
+}
+
+# llamadas, tokens de prompt, tokens de respuesta, costo
+_CAMPOS = 4
+
+
+def clave(ip: str, sesion: str) -> str:
+    """Sesión de uso_tokens: la IP del cliente más el session_id que envía"""
+    return f"{ip}|{sesion}"
+
+
+def _ip(sesion: str) -> str:
+    return sesion.split("|", 1)[0]
+
+
+class ContadorUso:
+    """Uso por sesión y día en memoria, volcado periódico a uso_tokens"""
+
+    def __init__(self, base, precios: Dict[str, Tuple[float, float]] = PRECIOS_MODELO,
+                 tokens_sesion: int = USAGE_SESSION_DAILY_TOKENS, usd_sesion: float = USAGE_SESSION_DAILY_USD,
+                 tokens_ip: int = USAGE_IP_DAILY_TOKENS, usd_diario: float = USAGE_DAILY_USD,
+                 intervalo: float = USAGE_FLUSH_SECONDS):
+        # PoolSQLite o PoolPostgres (database.py)
+        self.base = base
+        self.precios = precios
+        self.tokens_sesion = tokens_sesion
+        self.usd_sesion = usd_sesion
+        self.tokens_ip = tokens_ip
+        self.usd_diario = usd_diario
+        self.intervalo = intervalo
+        self._lock = threading.Lock()
+        # Deltas aún no volcados: (día, sesión, proveedor, modelo) -> [llamadas, prompt, respuesta, costo]
+        self.pendiente: Dict[Tuple[str, str, str, str], List[float]] = {}
+        # Totales del día para los presupuestos: sesión -> [tokens, costo], IP -> tokens
+        self.dia = date.today().isoformat()
+        self.sesiones: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.ips: Counter = Counter()
+        self.costo_dia = 0.0
+        # Contadores monótonos desde el arranque, para Prometheus
+        self.totales: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0] * _CAMPOS)
+        self.limitadas: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    async def init_schema(self):
+        await self.base.ejecutar("""
+            CREATE TABLE IF NOT EXISTS uso_tokens (
+                dia TEXT NOT NULL,
+                sesion TEXT NOT NULL,
+                proveedor TEXT NOT NULL,
+                modelo TEXT NOT NULL,
+                llamadas INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                respuesta_tokens INTEGER NOT NULL DEFAULT 0,
+                costo_usd REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, sesion, proveedor, modelo)
+            )
+        """)
+
+    async def start(self):
+        await self.init_schema()
+        await self.recargar()
+        if self.intervalo > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.volcar()
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                await self.volcar()
+            except Exception as e:
+                logger.error(f"Volcado de uso de tokens falló: {e}")
+
+    def costo(self, modelo: str, prompt: int, respuesta: int) -> float:
+        precio_prompt, precio_respuesta = self.precios.get(modelo, (0.0, 0.0))
+        return (prompt * precio_prompt + respuesta * precio_respuesta) / 1000
+
+    def _rotar(self):
+        """Los presupuestos son diarios: al cambiar el día se reinician"""
+        hoy = date.today().isoformat()
+        if hoy != self.dia:
+            self.dia = hoy
+            self.sesiones.clear()
+            self.ips.clear()
+            self.costo_dia = 0.0
+
+    def registrar(self, sesion: str, proveedor: str, modelo: str, prompt: int, respuesta: int) -> float:
+        """Sumar una llamada al proveedor; devuelve su costo en USD"""
+        costo = self.costo(modelo, prompt, respuesta)
+        with self._lock:
+            self._rotar()
+            fila = self.pendiente.setdefault((self.dia, sesion, proveedor, modelo), [0] * _CAMPOS)
+            total = self.totales[(proveedor, modelo)]
+            for acumulado in (fila, total):
+                acumulado[0] += 1
+                acumulado[1] += prompt
+                acumulado[2] += respuesta
+                acumulado[3] += costo
+            uso = self.sesiones[sesion]
+            uso[0] += prompt + respuesta
+            uso[1] += costo
+            self.ips[_ip(sesion)] += prompt + respuesta
+            self.costo_dia += costo
+        return costo
+
+    def excedido(self, sesion: str) -> Optional[str]:
+        """Motivo si la sesión ya no debe llamar al proveedor hoy, si no None"""
+        with self._lock:
+            self._rotar()
+            tokens, costo = self.sesiones.get(sesion, (0, 0.0))
+            motivo = None
+            if self.usd_diario and self.costo_dia >= self.usd_diario:
+                motivo = "costo_diario"
+            elif self.tokens_sesion and tokens >= self.tokens_sesion:
+                motivo = "tokens_sesion"
+            elif self.usd_sesion and costo >= self.usd_sesion:
+                motivo = "costo_sesion"
+            elif self.tokens_ip and self.ips.get(_ip(sesion), 0) >= self.tokens_ip:
+                motivo = "tokens_ip"
+            if motivo:
+                self.limitadas[motivo] += 1
+            return motivo
+
+    def sesion(self, sesion: str) -> Dict[str, float]:
+        with self._lock:
+            tokens, costo = self.sesiones.get(sesion, (0, 0.0))
+        return {"tokens": tokens, "costo_usd": round(costo, 6)}
+
+    async def volcar(self) -> int:
+        """Escribir los deltas pendientes en uso_tokens; devuelve las filas escritas"""
+        with self._lock:
+            pendiente, self.pendiente = self.pendiente, {}
+        if pendiente:
+            try:
+                await self.base.transaccion(self._upsert, pendiente)
+            except Exception:
+                # Se reintenta en el próximo volcado
+                with self._lock:
+                    for llave, delta in pendiente.items():
+                        fila = self.pendiente.setdefault(llave, [0] * _CAMPOS)
+                        for i in range(_CAMPOS):
+                            fila[i] += delta[i]
+                raise
+        # Aunque no haya nada propio: los otros workers también vuelcan
+        await self.recargar()
+        return len(pendiente)
+
+    async def recargar(self):
+        """Totales del día desde uso_tokens más los deltas de este worker aún no volcados"""
+        dia = self.dia
+        filas = await self.base.consultar(
+            "SELECT sesion, SUM(prompt_tokens + respuesta_tokens), SUM(costo_usd) FROM uso_tokens "
+            "WHERE dia = ? GROUP BY sesion",
+            (dia,)
+        )
+        with self._lock:
+            self._rotar()
+            if self.dia != dia:
+                return
+            sesiones: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+            for sesion, tokens, costo in filas:
+                sesiones[sesion] = [int(tokens), float(costo)]
+            # Lo registrado mientras corría la consulta sigue en pendiente, no en la tabla
+            for (dia_fila, sesion, _, _), delta in self.pendiente.items():
+                if dia_fila == dia:
+                    uso = sesiones[sesion]
+                    uso[0] += int(delta[1] + delta[2])
+                    uso[1] += delta[3]
+            self.sesiones = sesiones
+            self.ips = Counter()
+            for sesion, (tokens, _) in sesiones.items():
+                self.ips[_ip(sesion)] += tokens
+            self.costo_dia = sum(costo for _, costo in sesiones.values())
+
+    @staticmethod
+    async def _upsert(tx, pendiente: Dict[Tuple[str, str, str, str], List[float]]):
+        await tx.ejecutar_varios(
+            """
+            INSERT INTO uso_tokens (dia, sesion, proveedor, modelo, llamadas, prompt_tokens, respuesta_tokens,
+                                    costo_usd)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dia, sesion, proveedor, modelo) DO UPDATE SET
+                llamadas = uso_tokens.llamadas + excluded.llamadas,
+                prompt_tokens = uso_tokens.prompt_tokens + excluded.prompt_tokens,
+                respuesta_tokens = uso_tokens.respuesta_tokens + excluded.respuesta_tokens,
+                costo_usd = uso_tokens.costo_usd + excluded.costo_usd
+            """,
+            [(*clave, int(delta[0]), int(delta[1]), int(delta[2]), delta[3]) for clave, delta in pendiente.items()]
+        )
+
+    def familias(self) -> List[str]:
+        with self._lock:
+            totales = {clave: list(valores) for clave, valores in self.totales.items()}
+            limitadas = dict(self.limitadas)
+            costo_dia, sesiones = self.costo_dia, len(self.sesiones)
+        return [
+            familia("tesla_llm_llamadas_total", "counter", "Llamadas a proveedores de IA",
+                    [({"proveedor": p, "modelo": m}, v[0]) for (p, m), v in totales.items()]),
+            familia("tesla_llm_tokens_total", "counter", "Tokens consumidos por tipo",
+                    [({"proveedor": p, "modelo": m, "tipo": tipo}, v[i]) for (p, m), v in totales.items()
+                     for i, tipo in ((1, "prompt"), (2, "respuesta"))]),
+            familia("tesla_llm_costo_usd_total", "counter", "Costo estimado en USD",
+                    [({"proveedor": p, "modelo": m}, v[3]) for (p, m), v in totales.items()]),
+            familia("tesla_llm_costo_hoy_usd", "gauge", "Costo del día en USD", [({}, costo_dia)]),
+            familia("tesla_llm_sesiones_hoy", "gauge", "Sesiones con uso del proveedor hoy", [({}, sesiones)]),
+            familia("tesla_llm_limitadas_total", "counter", "Turnos respondidos localmente por presupuesto",
+                    [({"motivo": motivo}, n) for motivo, n in limitadas.items()]),
+        ]